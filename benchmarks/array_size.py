@@ -0,0 +1,66 @@
+# Array encoding size benchmark
+#
+# Compares the sizes the compiler estimates for fixed-size data declared as a
+# List with an exact `len` validator, as Bin where it applies, and as an
+# Array, which carries no length prefix. The last rows compare a telemetry
+# entity made mostly of small vectors.
+#
+#   $ python benchmarks/array_size.py
+
+import sys
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(__file__), ".."))
+from susc import File
+from susc.things import *
+from susc.exceptions import DiagLevel
+from susc.wire import SizeAnalyzer
+
+SHAPES = {
+    # name: declarations to compare
+    "3D vector of Int(4)": ["List(Int(4), 1)[len: 3..3]", "Array(Int(4), 3)"],
+    "16-byte hash": ["List(Int(1), 1)[len: 16..16]", "Bin[len: 16..16]", "Array(Int(1), 16)"],
+    "4x4 matrix of Int(2)": ["List(List(Int(2), 1)[len: 4..4], 1)[len: 4..4]", "Array(Array(Int(2), 4), 4)"],
+    "RGB color": ["List(Int(1), 1)[len: 3..3]", "Array(Int(1), 3)"],
+}
+
+TELEMETRY = """
+entity Sample(0) {{
+    id: Int(8);
+    position: {vector};
+    velocity: {vector};
+    acceleration: {vector};
+    orientation: {quaternion};
+}}
+"""
+TELEMETRY_TYPES = {
+    "List": {"vector": "List(Int(4), 1)[len: 3..3]", "quaternion": "List(Int(4), 1)[len: 4..4]"},
+    "Array": {"vector": "Array(Int(4), 3)", "quaternion": "Array(Int(4), 4)"},
+}
+
+def size_of(source: str, name: str):
+    file = File()
+    file.load_from_text(source)
+    _, diag = file.parse()
+    errors = [d for d in diag if d.level == DiagLevel.ERROR]
+    if errors:
+        raise Exception(errors[0].message)
+    return SizeAnalyzer(file.index).named_size(file.index.find(name))
+
+def compare_shapes():
+    print(f"{'shape':<24} {'declaration':<48} {'bytes':>6}")
+    for shape, declarations in SHAPES.items():
+        for declaration in declarations:
+            size = size_of(f"compound Shape {{\n    value: {declaration};\n}}", "Shape")
+            print(f"{shape:<24} {declaration:<48} {size.max:>6}")
+            shape = ""
+
+def compare_entities():
+    print(f"\n{'telemetry entity with':<24} {'bytes':>6}")
+    for kind, types in TELEMETRY_TYPES.items():
+        size = size_of(TELEMETRY.format(**types), "Sample")
+        print(f"{kind:<24} {size.max:>6}")
+
+if __name__ == "__main__":
+    compare_shapes()
+    compare_entities()
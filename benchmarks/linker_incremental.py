@@ -0,0 +1,85 @@
+# Incremental linker benchmark
+#
+# Links a synthetic project (see linker_scale.py) with the incremental linker,
+# then repeatedly replaces, removes or inserts a few definitions and relinks.
+# After every edit the result is checked against a full linker.run() over
+# freshly generated copies of the same definitions; any difference aborts the
+# benchmark.
+#
+#   $ python benchmarks/linker_incremental.py [size] [edits]
+
+import sys
+from os import path
+from time import time
+from random import Random
+
+sys.path.insert(0, path.dirname(__file__))
+from linker_scale import make_thing, make_entity, make_error_codes, make_file, digest, LINES_PER_DEFINITION
+from susc import linker
+from susc.incremental import IncrementalLinker
+
+ENTITY_FIELDS = 1000
+
+def build(file, recipes, size):
+    things = []
+    for recipe in recipes:
+        if recipe[0] == "errors":
+            things += make_error_codes(file)[recipe[1]:recipe[1] + 1]
+        elif recipe[0] == "entity":
+            things.append(make_entity(file, recipe[1], recipe[2], size, ENTITY_FIELDS))
+        else:
+            things.append(make_thing(file, recipe[1], recipe[2], size))
+    return things
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    edits = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    rng = Random(0)
+    file = make_file(f"<bench {size}>")
+
+    recipes = [("errors", 0), ("errors", 1)]
+    recipes += [("thing", n, 2 + n * LINES_PER_DEFINITION) for n in range(size)]
+    line = 2 + size * LINES_PER_DEFINITION
+    recipes += [("entity", n, line + n * (ENTITY_FIELDS + 1)) for n in range(max(1, size // 10000))]
+    things = build(file, recipes, size)
+
+    incremental = IncrementalLinker()
+    start = time()
+    incremental.run(things)
+    print(f"initial link of {size} definitions: {(time() - start) * 1000:.0f}ms")
+
+    full_time, incremental_time = 0, 0
+    for edit in range(edits):
+        # replace, remove or insert a few definitions
+        for _ in range(rng.randrange(1, 4)):
+            i = rng.randrange(2, len(recipes))
+            action = rng.randrange(3)
+            new = ("thing", rng.randrange(0, size * 2), recipes[i][-1])
+            if action == 0 and recipes[i][0] == "thing":
+                recipes[i] = new
+                things[i] = build(file, [new], size)[0]
+            elif action == 1 and recipes[i][0] == "thing":
+                del recipes[i]
+                del things[i]
+            else:
+                recipes.insert(i, new)
+                things.insert(i, build(file, [new], size)[0])
+
+        start = time()
+        inc_things, inc_diag, _ = incremental.run(things)
+        incremental_time += time() - start
+
+        fresh = build(file, recipes, size)
+        start = time()
+        full_things, full_diag, _ = linker.run(fresh)
+        full_time += time() - start
+
+        if digest(inc_diag) != digest(full_diag) or repr(inc_things) != repr(full_things):
+            print(f"edit {edit}: incremental result differs from a full run")
+            sys.exit(1)
+
+    print(f"{edits} edits: {full_time / edits * 1000:.1f}ms per full link, "
+          f"{incremental_time / edits * 1000:.1f}ms per incremental link, results identical")
+
+if __name__ == "__main__":
+    main()
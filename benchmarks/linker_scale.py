@@ -0,0 +1,135 @@
+# Linker scale benchmark
+#
+# Generates synthetic projects (10k/100k definitions, entities with 1k fields)
+# with a sprinkling of mistakes, runs the linker over them and prints the time
+# it took along with a digest of the diagnostics. Diagnostics must not depend
+# on how the linker is implemented, so the digests of the sizes in EXPECTED
+# have to match; the script exits with status 1 if one doesn't. Other
+# revisions of the compiler can be compared by hand:
+#
+#   $ python benchmarks/linker_scale.py
+#   $ git checkout <other revision> && python benchmarks/linker_scale.py
+#
+# Pass the sizes to run as arguments to override the default set, e.g.
+# `python benchmarks/linker_scale.py 10000`
+
+import sys
+from os import path
+from time import time
+from random import Random
+from hashlib import sha256
+
+sys.path.insert(0, path.join(path.dirname(__file__), ".."))
+from susc import File, linker
+from susc.things import *
+from susc.exceptions import Location
+
+LINES_PER_DEFINITION = 16
+
+# size -> digest of the diagnostics; the first one was also produced by the
+# quadratic linker this one replaced, which takes too long for the second
+EXPECTED = {
+    10_000: "493fc8a5541fb49a",
+    100_000: "87e34b6486a9db0f",
+}
+
+def type_name(n: int) -> str:
+    # name of the n-th definition if it can be used as a type
+    return {0: f"Bf{n}" if n % 2 else f"En{n}", 1: f"Cmp{n}"}.get(n % 5)
+
+def make_type(file, rng: Random, line: int, size: int) -> SusType:
+    loc = Location(file, line, 1, 1)
+    roll = rng.random()
+    if roll < 0.3: return SusType(loc, None, "Int", [rng.choice([1, 2, 4, 8])], [])
+    if roll < 0.5: return SusType(loc, None, "Str", [], [SusValidator(loc, None, "len", range(0, 64))])
+    if roll < 0.6: return SusType(loc, None, "Bool", [], [])
+    if roll < 0.7: return SusType(loc, None, "List", [make_type(file, rng, line, size), 2], [])
+    if roll < 0.995: return SusType(loc, None, type_name(rng.randrange(0, size // 5) * 5 + rng.randrange(0, 2)), [], [])
+    return SusType(loc, None, "Nope", [], []) # unknown type
+
+def make_fields(file, rng: Random, line: int, count: int, size: int) -> List[SusField]:
+    fields = []
+    for i in range(count):
+        name = f"field_{i}" if rng.random() > 0.001 else "field_0" # name collision
+        opt = None
+        if rng.random() < 0.2:
+            opt = rng.randrange(0, 300) # some of them collide and some overflow
+        fields.append(SusField(Location(file, line + i, 1, 1), None, name, make_type(file, rng, line + i, size), opt))
+    return fields
+
+def make_thing(file, n: int, line: int, size: int) -> SusThing:
+    # generates the n-th definition of a project; the same arguments always
+    # produce an equal thing
+    rng = Random(n)
+    loc = Location(file, line, 1, 1)
+    kind = n % 5
+    if kind == 0:
+        members = [SusEnumMember(Location(file, line, j + 2, 1), None, f"m_{j}", j) for j in range(8)]
+        return (SusBitfield if n % 2 else SusEnum)(loc, None, type_name(n), 1, members)
+    if kind == 1:
+        return SusCompound(loc, None, type_name(n), make_fields(file, rng, line, 8, size))
+    if kind == 2:
+        return SusConfirmation(loc, None, f"Conf{n}", rng.randrange(0, 16),
+            make_fields(file, rng, line, 2, size), make_fields(file, rng, line + 2, 2, size))
+    errs = [f"error_{rng.randrange(0, 70)}" for _ in range(2)] # some are undefined
+    confs = [f"Conf{n - 1}"] if kind == 3 else []
+    return SusMethod(loc, None, False, f"method_{n}", rng.randrange(0, 128),
+        make_fields(file, rng, line, 4, size), make_fields(file, rng, line + 4, 2, size),
+        errs, confs, None)
+
+def make_entity(file, n: int, line: int, size: int, entity_fields: int) -> SusEntity:
+    rng = Random(-n)
+    loc = Location(file, line, 1, 1)
+    fields = make_fields(file, rng, line, entity_fields, size)
+    fields.insert(0, SusField(loc, None, "id", SusType(loc, None, "Int", [8], []), None))
+    methods = [SusMethod(Location(file, line, 2, 1), None, j % 2 == 0, f"method_{j}", rng.randrange(0, 128),
+        [], [], [], [], None) for j in range(64)]
+    return SusEntity(loc, None, f"Entity{n}", n, fields, methods)
+
+def make_error_codes(file) -> List[SusThing]:
+    # split in two halves to exercise combination
+    errors = [SusEnumMember(Location(file, 1, 1, 1), None, f"error_{i}", i) for i in range(64)]
+    return [SusEnum(Location(file, 1, 1, 1), None, "ErrorCode", 2, errors[:32]),
+            SusEnum(Location(file, 1, 2, 1), None, "ErrorCode", 2, errors[32:])]
+
+def make_file(name: str) -> File:
+    file = File()
+    file.load_from_text("", name)
+    return file
+
+def make_project(size: int, entity_fields: int) -> List[SusThing]:
+    file = make_file(f"<bench {size}>")
+    things = make_error_codes(file)
+    for n in range(size):
+        things.append(make_thing(file, n, 2 + n * LINES_PER_DEFINITION, size))
+    # a few large entities
+    line = 2 + size * LINES_PER_DEFINITION
+    for n in range(max(1, size // 10000)):
+        things.append(make_entity(file, n, line + n * (entity_fields + 1), size, entity_fields))
+    return things
+
+def digest(diagnostics) -> str:
+    h = sha256()
+    for d in diagnostics:
+        locs = ",".join(f"{l.line}:{l.col}" for l in d.locations)
+        h.update(f"{d.level.value}|{d.code}|{d.message}|{locs}\n".encode())
+    return h.hexdigest()[:16]
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000]
+    mismatched = False
+    for size in sizes:
+        things = make_project(size, 1000)
+        start = time()
+        result = linker.run(things)
+        took = time() - start
+        diagnostics = result[1]
+        print(f"{size:>7} definitions: {took * 1000:8.0f}ms, {len(diagnostics):>6} diagnostics, digest {digest(diagnostics)}")
+        if size in EXPECTED and digest(diagnostics) != EXPECTED[size]:
+            print(f"        digest mismatch, expected {EXPECTED[size]}")
+            mismatched = True
+    if mismatched:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# TypeScript codec check
+#
+# Compiles a schema that covers every shape of field the codecs handle with
+# `set ts_codecs true`, then runs the generated codecs.test.ts with Node.js.
+# The test vectors in it are encoded by wire.Encoder on the Python side, so
+# this checks the straight-line codecs against the reference encoder rather
+# than against themselves. Exits with status 1 if any vector fails.
+#
+# Needs Node.js 22.6 or newer, which can run TypeScript by stripping types:
+#
+#   $ python benchmarks/ts_codecs.py [node]
+
+import sys
+import subprocess
+from os import path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, path.join(path.dirname(__file__), ".."))
+from susc import File
+
+SCHEMA = """
+include impostor.sus
+set ts_codecs true
+
+compound Point {
+    x: Int(2);
+    y: Int(2);
+    label: opt(0) Str[len: 1..8];
+}
+
+enum(1) Color { red(0), green(1) }
+enum(3) Wide { a(0), b(70000) }
+bitfield(2) Perms { read(0), write(9) }
+
+entity Shape(0) {
+    id: Int(8);
+    color: Color;
+    wide: Wide;
+    perms: Perms;
+    big: Int(16);
+    odd: Int(3)[val: 5..100000];
+    flag: Bool;
+    points: List(Point, 1)[len: 0..5];
+    nested: List(List(Int(1), 1), 1);
+    wide_list: List(Int(1), 8);
+    names: List(Str, 3);
+    code: Str[match: /^[a-z]{2,4}$/];
+    blob: opt(3) Bin[len: 0..16];
+    any: opt(9) Entity;
+    ref: opt(12) Point;
+    method rename(0) {
+        name: Str[len: 1..32];
+        color: opt(0) Color;
+        returns { ok: Bool; }
+    }
+    generate get_many, patch, get_fields;
+    subscribe;
+}
+
+entity Tag(1) {
+    id: Int(8);
+    name: Str;
+}
+
+globalmethod ping(0) {
+    x: Int(1)[val: 1..10];
+    returns { y: opt(0) Int(4); }
+    confirmations { Sure }
+}
+
+confirmation Sure(0) {
+    request { question: Str; }
+    response { ok: Bool; }
+}
+"""
+
+MAIN = """
+import { runCodecTests } from "./codecs.test.mts";
+const { total, failures } = runCodecTests();
+console.log(`${total} vectors, ${failures.length} failures`);
+for(const failure of failures)
+    console.log(failure);
+process.exit(failures.length ? 1 : 0);
+"""
+
+def main():
+    node = sys.argv[1] if len(sys.argv) > 1 else "node"
+    with TemporaryDirectory() as target:
+        file = File()
+        file.load_from_text(SCHEMA, path.join(target, "codecs.sus"))
+        _, diagnostics = file.parse()
+        for diag in diagnostics:
+            print(diag.message)
+        file.write_output("ts", path.join(target, "ts"))
+
+        # Node.js only strips the types of .mts files imported by their full name
+        with open(path.join(target, "ts", "codecs.ts")) as f:
+            codecs = f.read()
+        with open(path.join(target, "ts", "codecs.test.ts")) as f:
+            tests = f.read().replace("\"./codecs\"", "\"./codecs.mts\"")
+        for name, source in (("codecs.mts", codecs), ("codecs.test.mts", tests), ("main.mts", MAIN)):
+            with open(path.join(target, "ts", name), "w") as f:
+                f.write(source)
+
+        result = subprocess.run([node, "--experimental-strip-types", "--no-warnings", path.join(target, "ts", "main.mts")])
+        sys.exit(result.returncode)
+
+if __name__ == "__main__":
+    main()
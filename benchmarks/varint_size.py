@@ -0,0 +1,59 @@
+# VarInt encoding size benchmark
+#
+# Compares how many bytes integers take on the wire as fixed-width Int(n) and
+# as VarInt(n) for a few value distributions that are typical of IDs and
+# counters, then compares the sizes the compiler estimates for a message
+# declared with each of them.
+#
+#   $ python benchmarks/varint_size.py [samples]
+
+import sys
+from os import path
+from random import Random
+
+sys.path.insert(0, path.join(path.dirname(__file__), ".."))
+from susc import File
+from susc.things import *
+from susc.wire import SizeAnalyzer, varint_length
+
+DISTRIBUTIONS = {
+    # name: (size of the Int that holds all values, value generator)
+    "counters (geometric, mean 20)": (4, lambda rng: int(rng.expovariate(1 / 20))),
+    "sequential IDs up to 1M": (4, lambda rng: rng.randrange(1, 1_000_000)),
+    "timestamps in seconds": (8, lambda rng: rng.randrange(1_600_000_000, 1_800_000_000)),
+    "uniform 32-bit": (4, lambda rng: rng.randrange(0, 2 ** 32)),
+    "uniform 64-bit": (8, lambda rng: rng.randrange(0, 2 ** 64)),
+}
+
+SCHEMA = """
+compound Presence {{
+    user: {int}(8);
+    status: {int}(1);
+    last_seen: {int}(8);
+    unread: {int}(4)[val: 0..9999];
+}}
+"""
+
+def compare_values(samples: int):
+    print(f"{'distribution':<32} {'Int':>8} {'VarInt':>8} {'saved':>7}")
+    for name, (size, generate) in DISTRIBUTIONS.items():
+        rng = Random(name)
+        values = [generate(rng) for _ in range(samples)]
+        varint = sum(varint_length(v) for v in values) / samples
+        print(f"{name:<32} {size:>8.2f} {varint:>8.2f} {(1 - varint / size) * 100:>6.1f}%")
+
+def message_size(int_type: str):
+    file = File()
+    file.load_from_text(SCHEMA.format(int=int_type))
+    file.parse()
+    return SizeAnalyzer(file.index).named_size(file.index.find("Presence"))
+
+def compare_messages():
+    print(f"\n{'Presence declared with':<32} {'min':>8} {'max':>8} {'typical':>8}")
+    for int_type in ("Int", "VarInt"):
+        size = message_size(int_type)
+        print(f"{int_type:<32} {size.min:>8} {size.max:>8} {size.typical:>8.1f}")
+
+if __name__ == "__main__":
+    compare_values(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
+    compare_messages()
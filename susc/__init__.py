@@ -6,17 +6,29 @@ from lark.exceptions import UnexpectedInput
 from os import path, makedirs
 from importlib import import_module
 from re import fullmatch
+from time import perf_counter
 
 from .things import *
 from . import log
 from . import linker
+from . import lint
+from . import redos
+from . import layout
+from . import compression
+from .stats import add_time
+from .index import ProjectIndex
+from .incremental import IncrementalLinker
 from .exceptions import DiagLevel, Diagnostic, OutputError, SearchError, SourceError
 
-KNOWN_SETTINGS = ["output", "html_topbar_logo", "html_topbar_title"]
+# maximum number of IDs in a call to the generated `get_many` method
+GET_MANY_LIMIT = 64
+
+KNOWN_SETTINGS = ["output", "html_topbar_logo", "html_topbar_title", "lint", "lint_level", "lint_get_size", "opt_baseline",
+    "compression", "compression_threshold", "ts_modules", "ts_codecs", "ts_dispatch"]
 
 # read the description file
 with open(path.join(path.dirname(__file__), "sus.lark")) as f:
-    lark_parser = lark.Lark(f.read(), parser="lalr")
+    lark_parser = lark.Lark(f.read(), parser="lalr", propagate_positions=True)
 
 def token_to_str(token: str):
     return {
@@ -39,19 +51,31 @@ def token_to_str(token: str):
         "RANGE": "range",
         "PARAMETER": "parameter",
         "VALUE": "value",
+        "CACHE_MODE": "cache mode ('hard' or 'soft')",
+        "TIMEOUT": "duration (e.g. '10s')",
+        "COMPRESSION_MODE": "compression mode ('none' or 'deflate')",
+        "GENERATED_METHOD": "generated method ('get_many', 'patch' or 'get_fields')",
     # if none matched, turn TOKEN into 'token'
     }.get(token, "'" + token.lower() + "'")
 
 class File():
-    def __init__(self, parent=None, root=None):
+    # incremental files keep the things of definitions that didn't change
+    # between calls to parse() and relink only what changed
+    def __init__(self, parent=None, root=None, incremental=False):
         self.parent = parent
         self.root = root or self
         self.settings = {}
+        self.setting_locations = {}
         self.dependencies = []
         self.things = []
         self.diagnostics = []
+        self.index = None
+        self.definitions = {}
         if self.parent is None:
             self.all_loaded = set()
+            self.timings = {} # phase -> seconds spent in the last parse()
+            self.incremental = incremental
+            self.linker = IncrementalLinker() if incremental else None
 
     def load_from_text(self, source, file_path=None):
         self.source = source
@@ -231,10 +255,17 @@ class File():
 
     def parse(self) -> Tuple[list[SusThing], list[Diagnostic]]:
         log.verbose(f"Parsing {Fore.WHITE}{self.path}", "parser")
+        previous_deps = {d.path: d for d in self.dependencies}
+        previous_defs = self.definitions
         self.things = []
         self.dependencies = []
         self.diagnostics = []
+        self.definitions = {}
+        if self.parent is None:
+            self.all_loaded = {self.path}
+            self.timings = {}
 
+        start = perf_counter()
         try:
             self.tree = lark_parser.parse(self.source, on_error=self.__parsing_error)
             log.verbose(f"AST constructed", "parser")
@@ -246,8 +277,10 @@ class File():
             log.verbose(f"Expected: {', '.join(e.expected)}", "corr_fail")
             # parsing can't continue any further, just return
             return [], self.diagnostics
+        add_time(self.root.timings, "parse", start)
 
         # deconstruct the syntax tree
+        start = perf_counter()
         for thing in self.tree.children:
             if thing.data == "inclusion":
                 name = thing.children[0]
@@ -261,7 +294,7 @@ class File():
 
                 # load it
                 if source.name not in self.root.all_loaded:
-                    dependency = File(self, self.root)
+                    dependency = previous_deps.get(path.abspath(source.name)) or File(self, self.root)
                     dependency.load_from_file(source)
                     self.dependencies.append(dependency)
                     self.root.all_loaded.add(source.name)
@@ -278,14 +311,29 @@ class File():
                     self.diagnostics.append(Diagnostic([Location(self, name.line, name.column, len(name))],
                         DiagLevel.WARN, 7, "Unknown setting"))
                 self.settings[name.value] = value.value
+                self.setting_locations[name.value] = Location(self, value.line, value.column, len(value))
 
             else:
                 if thing.data == "definition":
                     thing = thing.children[0]
+
+                # reuse the thing if the definition hasn't changed since the last time
+                key = None
+                if self.root.incremental and not thing.meta.empty:
+                    key = (thing.meta.line, thing.meta.column,
+                        self.source[thing.meta.start_pos:thing.meta.end_pos], str(thing))
+                    if key in previous_defs:
+                        self.definitions[key] = previous_defs[key]
+                        self.things += previous_defs[key]
+                        continue
+
                 log.verbose(f"AST subtree: {log.highlight_ast(thing)}", "parser")
                 thing = convert_ast(thing, self)
                 log.verbose(f"Converted AST subtree: {Fore.WHITE}{log.highlight_thing(thing)}", "parser")
                 self.things.append(thing)
+                if key is not None:
+                    # along with the things generated for it
+                    self.definitions[key] = [thing]
 
                 # generate standard methods for entities
                 if isinstance(thing, SusEntity):
@@ -296,11 +344,30 @@ class File():
                             f"Gets {thing.name} by ID",
                             True,
                             "get",
-                            127,
+                            STANDARD_METHODS["get"][1],
                             [SusField(thing.location, "ID of the entity to get", "id", id_field[0].type_, None)],
                             [SusField(thing.location, "Entity with that ID", "entity", SusType(thing.location, None, thing.name, [], []), None)],
                             ["invalid_id"],
                             [],
+                            None,
+                            thing.cache
+                        ))
+                    if id_field and "get_many" in thing.generated:
+                        id_list = SusType(thing.location, None, "List", [id_field[0].type_, 1], [])
+                        thing.methods.append(SusMethod(
+                            thing.location,
+                            f"Gets up to {GET_MANY_LIMIT} {thing.name} entities by their IDs",
+                            True,
+                            "get_many",
+                            GENERATED_METHODS["get_many"][1],
+                            [SusField(thing.location, "IDs of the entities to get", "ids",
+                                SusType(thing.location, None, id_list.name, id_list.args,
+                                    [SusValidator(thing.location, None, "len", range(1, GET_MANY_LIMIT + 1))]), None)],
+                            [SusField(thing.location, "Entities that were found, in the order of their IDs", "entities",
+                                SusType(thing.location, None, "List", [SusType(thing.location, None, thing.name, [], []), 1], []), None),
+                             SusField(thing.location, "IDs that no entity has", "missing", id_list, None)],
+                            [],
+                            [],
                             None
                         ))
                     thing.methods.append(SusMethod(
@@ -308,13 +375,92 @@ class File():
                         f"Updates {thing.name}",
                         False,
                         "update",
-                        127,
+                        STANDARD_METHODS["update"][1],
                         [SusField(thing.location, "The values to update", "entity", SusType(thing.location, None, thing.name, [], []), None)],
                         [],
                         ["invalid_entity"],
                         [],
                         None
                     ))
+                    # every field but the ID becomes optional, so that only the
+                    # fields that changed are sent
+                    patch_fields = {f.name: f for f in thing.fields if f.name != "id"}
+                    if id_field and patch_fields and "patch" in thing.generated:
+                        thing.methods.append(SusMethod(
+                            thing.location,
+                            f"Updates the given fields of {thing.name}, leaving the other ones as they are",
+                            False,
+                            "patch",
+                            GENERATED_METHODS["patch"][1],
+                            [SusField(thing.location, f.docstring, f.name, f.type_, i) for i, f in enumerate(patch_fields.values())],
+                            [],
+                            ["invalid_entity"],
+                            [],
+                            None
+                        ))
+
+                    # bit N of the projection selects the field at opt(N); it's only
+                    # generated on request, as it takes a name that a type could have
+                    projection = None
+                    if id_field and patch_fields and ("get_fields" in thing.generated or thing.subscription):
+                        projection = SusBitfield(thing.location, f"Fields of {thing.name} to select in generated methods",
+                            f"{thing.name}Fields", (len(patch_fields) + 7) // 8,
+                            [SusEnumMember(thing.location, None, name, i) for i, name in enumerate(patch_fields)])
+                        self.things.append(projection)
+                        if key is not None:
+                            self.definitions[key].append(projection)
+
+                    if projection and "get_fields" in thing.generated:
+                        thing.methods.append(SusMethod(
+                            thing.location,
+                            f"Gets the selected fields of {thing.name} by ID",
+                            True,
+                            "get_fields",
+                            GENERATED_METHODS["get_fields"][1],
+                            [SusField(thing.location, "ID of the entity to get", "id", id_field[0].type_, None),
+                             SusField(thing.location, "Fields to get", "fields", SusType(thing.location, None, projection.name, [], []), None)],
+                            [SusField(thing.location, f.docstring, f.name, f.type_, i) for i, f in enumerate(patch_fields.values())],
+                            ["invalid_id"],
+                            [],
+                            None
+                        ))
+
+                    # subscribers call `subscribe` again as soon as it returns, so
+                    # that the server always has a call to answer when the entity
+                    # changes; the cursor makes sure no change falls in between
+                    if projection and thing.subscription:
+                        params = [SusField(thing.location, "Fields to watch; all of them if absent", "fields",
+                            SusType(thing.location, None, projection.name, [], []), 0)]
+                        returns = [SusField(thing.location, f.docstring, f.name, f.type_, i) for i, f in enumerate(patch_fields.values())]
+                        cursors = stream_cursors(thing.location, params, returns)
+                        thing.methods.append(SusMethod(
+                            thing.location,
+                            f"Waits for the watched fields of {thing.name} to change and returns the ones that did",
+                            False,
+                            "subscribe",
+                            SUBSCRIPTION_METHODS["subscribe"],
+                            params + [cursors[0]],
+                            returns + [cursors[1]],
+                            ["invalid_entity"],
+                            [],
+                            None,
+                            None,
+                            True
+                        ))
+                        thing.methods.append(SusMethod(
+                            thing.location,
+                            f"Ends the subscriptions of this session to {thing.name}, making pending 'subscribe' calls return",
+                            False,
+                            "unsubscribe",
+                            SUBSCRIPTION_METHODS["unsubscribe"],
+                            [],
+                            [],
+                            [],
+                            [],
+                            None
+                        ))
+
+        add_time(self.root.timings, "convert", start)
 
         log.verbose(f"Parsing dependencies for {Fore.WHITE}{self.path}", "deps")
         # parse dependencies
@@ -325,8 +471,22 @@ class File():
 
         # run linker
         if not self.parent:
-            things, diag = linker.run(things)
+            start = perf_counter()
+            if self.incremental:
+                things, diag, self.index = self.linker.run(things)
+            else:
+                things, diag, self.index = linker.run(things)
             self.diagnostics += diag
+            add_time(self.timings, "link", start)
+
+            start = perf_counter()
+            self.diagnostics += redos.run(self.index)
+            self.diagnostics += compression.run(self.index, self.settings, self.setting_locations.get("compression"))
+            lints, lint_diag = lint.enabled_lints(self.settings, self.setting_locations.get("lint"))
+            self.diagnostics += lint_diag
+            baseline = layout.load_baseline(self) if "opt_layout" in lints else None
+            self.diagnostics += lint.run(self.index, self.settings, lints, baseline)
+            add_time(self.timings, "analysis", start)
 
         self.things = things
         return things, self.diagnostics
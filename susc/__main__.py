@@ -1,12 +1,20 @@
 import argparse
-from os import path
+import sys
+import json
+from os import path, makedirs
 from colorama import Fore
-from time import time
+from time import time, perf_counter
 
 from . import File
 from . import exceptions
 from . import log
 from . import lang_server
+from . import linker
+from . import redos
+from . import layout
+from . import stats
+from . import compat
+from . import dictionary
 from .explain import explain
 
 def highlight(file):
@@ -24,10 +32,21 @@ def main():
     parser.add_argument("-s", "--language-server", help="run as a language server", action="store_true")
     parser.add_argument("-i", "--ls-stdio", help="run LS in stdio mode", action="store_true")
     parser.add_argument("-x", "--explain", help="explain an error code")
+    parser.add_argument("-j", "--jobs", help="number of processes to validate large projects with", type=int)
+    parser.add_argument("--compat", help="check whether a project is wire-compatible with an older revision of it (a project or an IR snapshot)", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument("--stats", help="print statistics about the project and write them to stats.json in the output dir", action="store_true")
+    parser.add_argument("--fix-opt-layout", help="rewrite wrapped opt() values in the source files and move deployed optional fields back to their values", action="store_true")
+    parser.add_argument("--train-dicts", help="train zlib preset dictionaries for every entity and method from the encoded samples in this dir (or synthetic ones) and write them to dicts/ in the output dir", nargs="?", const="", metavar="SAMPLES")
+    parser.add_argument("-r", "--redos-budget", help="run Str match regexes against adversarial inputs, failing the ones that take longer than this many milliseconds", type=int)
     args = parser.parse_args()
 
     exceptions.SINGLE_LINE_ERRORS = args.single_line_errors
     log.VERBOSE = args.verbose
+    linker.WORKERS = args.jobs
+    redos.BUDGET = args.redos_budget
+    if redos.BUDGET is not None and not redos.can_benchmark():
+        log.warn("This platform can't fork processes, --redos-budget is ignored")
+        redos.BUDGET = None
     if log.VERBOSE:
         log.verbose("Verbose mode enabled")
 
@@ -42,6 +61,23 @@ def main():
         log.error("--ls-stdio can only be used with --language-server")
         return
 
+    if args.compat:
+        start = time()
+        try:
+            changes = compat.check(*(compat.load_project(p) for p in args.compat))
+        except exceptions.SusError as ex:
+            log.error(str(ex))
+            sys.exit(2)
+        breaking = [c for c in changes if c.breaking]
+        for change in changes:
+            (log.error if change.breaking else log.info)(str(change))
+        took = int((time() - start) * 1000)
+        if breaking:
+            log.error(f"{len(breaking)} breaking change{'s' if len(breaking) != 1 else ''} found in {took}ms")
+            sys.exit(1)
+        log.done(f"No breaking changes ({len(changes)} compatible) found in {took}ms")
+        return
+
     if args.highlight:
         for file in args.source:
             log.info(file.name)
@@ -75,27 +111,54 @@ def main():
                 has_error = True
         if has_error:
             continue
+
+        if args.fix_opt_layout:
+            fields, files = layout.fix(sus_file)
+            log.done(f"Renumbered {fields} optional field{'s' if fields != 1 else ''} in {files} file{'s' if files != 1 else ''}")
+            successful += 1
+            continue
         
         langs = args.lang or sus_file.settings.get("output", None)
         if not langs:
             log.error(f"{Fore.RED}No output languages specified. Use the 'set output <language list>' directive in the root file or pass '-l <language list>' to the compiler")
             continue
 
+        output = args.output
+        if len(args.source) > 1 or output is None:
+            output = path.join(path.dirname(source.name), path.splitext(path.basename(source.name))[0] + "_output")
+
         langs = langs.split()
         for lang in langs:
-            output = args.output
-            if len(args.source) > 1 or output is None:
-                output = path.join(path.dirname(source.name), path.splitext(path.basename(source.name))[0] + "_output")
-                
+            start = perf_counter()
             try:
                 sus_file.write_output(lang, path.join(output, lang))
             except exceptions.OutputError as ex:
                 log.error(str(ex))
                 continue
+            finally:
+                stats.add_time(sus_file.timings, f"output:{lang}", start)
+
+        if args.train_dicts is not None:
+            start = perf_counter()
+            report = dictionary.build(sus_file.index, args.train_dicts or None, path.join(output, "dicts"))
+            stats.add_time(sus_file.timings, "dicts", start)
+            raw = sum(r["raw"] for r in report)
+            if raw:
+                plain, with_dict = sum(r["deflate"] for r in report), sum(r["deflate_dict"] for r in report)
+                log.info(f"Trained {len(report)} dictionar{'ies' if len(report) != 1 else 'y'}: held-out samples compress to {plain / raw * 100:.1f}% without and {with_dict / raw * 100:.1f}% with them")
 
         proj_end = time()
         successful += 1
         took = int((proj_end - proj_start) * 1000)
+
+        if args.stats:
+            sus_file.timings["total"] = proj_end - proj_start
+            project_stats = stats.collect(sus_file.index, sus_file.timings)
+            for line in stats.format_report(project_stats):
+                log.info(line)
+            makedirs(output, exist_ok=True)
+            with open(path.join(output, "stats.json"), "w") as f:
+                json.dump(project_stats, f, indent=4)
         log.done(f"Compiled project into {len(langs)} language{'s' if len(langs) > 1 else ''} in {took}ms")
 
     global_end = time()
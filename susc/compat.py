@@ -0,0 +1,242 @@
+from .things import *
+from . import log
+from . import ir
+from .exceptions import *
+from .index import ProjectIndex
+
+# Compares two revisions of a project and reports the changes that affect the
+# wire format. Things are matched by name; names themselves never go over the
+# wire, but numeric values, field order, field types, opt() values and enum
+# members do. Validators don't change the encoding, so changing them is not
+# considered breaking.
+
+@dataclass
+class Change():
+    breaking: bool
+    location: Location
+    message: str
+
+    def __str__(self):
+        loc = f"{self.location.file.path}:{self.location.line}:{self.location.col}"
+        return f"{loc}: {self.message}"
+
+def wire_type(type_: SusTypeBase) -> str:
+    # the part of a type that determines its encoding
+    if not isinstance(type_, SusType):
+        return str(type_)
+    if not type_.args:
+        return type_.name
+    return f"{type_.name}({', '.join(wire_type(a) for a in type_.args)})"
+
+def compare_types(old: SusTypeBase, new: SusTypeBase) -> Tuple[bool, bool]:
+    # whether two types are encoded the same way and whether they're also
+    # validated the same way
+    if not isinstance(old, SusType) or not isinstance(new, SusType):
+        return old == new, True
+    if old.name != new.name or len(old.args) != len(new.args):
+        return False, False
+    same_validators = len(old.validators) == len(new.validators) and \
+        all(a.param == b.param and a.restriction == b.restriction for a, b in zip(old.validators, new.validators))
+    for a, b in zip(old.args, new.args):
+        same_wire, same_args = compare_types(a, b)
+        if not same_wire:
+            return False, False
+        same_validators &= same_args
+    return True, same_validators
+
+def compression_policy(compression: SusCompression) -> Optional[Tuple[str, int]]:
+    return (compression.mode, compression.threshold) if compression else None
+
+def cache_policy(cache: SusCache) -> Optional[Tuple[str, int]]:
+    return (cache.mode, cache.ttl) if cache else None
+
+class CompatChecker():
+    def __init__(self, old: ProjectIndex, new: ProjectIndex):
+        self.old = old
+        self.new = new
+        self.changes: List[Change] = []
+
+    def breaking(self, location: Location, message: str):
+        self.changes.append(Change(True, location, message))
+
+    def compatible(self, location: Location, message: str):
+        self.changes.append(Change(False, location, message))
+
+    def check(self) -> List[Change]:
+        for kind in (SusEntity, SusMethod, SusConfirmation, SusCompound, SusEnum, SusBitfield):
+            for old in self.old.of_kind(kind):
+                new = self.new.find(old.name, kind)
+                if new is None:
+                    self.breaking(old.location, f"'{old.name}' was removed")
+                    continue
+                self.check_thing(old, new)
+            for new in self.new.of_kind(kind):
+                if self.old.find(new.name, kind) is None:
+                    self.added(new)
+        return self.changes
+
+    def added(self, new: SusThing):
+        # a new thing can't take the value of an old one
+        if isinstance(new, (SusEntity, SusMethod, SusConfirmation)):
+            old = self.old.by_value(type(new), new.value)
+            if old is not None:
+                self.breaking(new.location, f"'{new.name}' reuses value {new.value} of '{old.name}'")
+                return
+        self.compatible(new.location, f"'{new.name}' was added")
+
+    def check_thing(self, old: SusThing, new: SusThing):
+        if isinstance(old, (SusEntity, SusConfirmation)) and old.value != new.value:
+            self.breaking(new.location, f"Value of '{new.name}' changed from {old.value} to {new.value}")
+
+        if isinstance(old, SusEntity):
+            self.check_fields(new.location, new.name, old.fields, new.fields)
+            if compression_policy(old.compression) != compression_policy(new.compression):
+                self.breaking(new.location, f"Compression of '{new.name}' changed")
+            # the methods it generates are compared along with the other ones
+            if old.subscription and new.subscription and old.subscription.interval != new.subscription.interval:
+                self.compatible(new.location, f"Subscription interval of '{new.name}' changed")
+            for old_method in old.methods:
+                new_method = self.new.method(new.name, old_method.name)
+                if new_method is None:
+                    self.breaking(old_method.location, f"'{old.name}.{old_method.name}' was removed")
+                else:
+                    self.check_method(f"{new.name}.{new_method.name}", old_method, new_method)
+            for new_method in new.methods:
+                if self.old.method(old.name, new_method.name) is None:
+                    self.added_method(old, new, new_method)
+        elif isinstance(old, SusMethod):
+            self.check_method(new.name, old, new)
+        elif isinstance(old, SusConfirmation):
+            self.check_fields(new.location, f"{new.name} request", old.req_parameters, new.req_parameters)
+            self.check_fields(new.location, f"{new.name} response", old.resp_parameters, new.resp_parameters)
+        elif isinstance(old, SusCompound):
+            self.check_fields(new.location, new.name, old.fields, new.fields)
+        elif isinstance(old, (SusEnum, SusBitfield)):
+            self.check_members(old, new)
+
+    def added_method(self, old_entity: SusEntity, new_entity: SusEntity, method: SusMethod):
+        clash = [m for m in old_entity.methods if m.static == method.static and m.value == method.value]
+        if clash:
+            self.breaking(method.location, f"'{new_entity.name}.{method.name}' reuses value {method.value} of '{clash[0].name}'")
+        else:
+            self.compatible(method.location, f"'{new_entity.name}.{method.name}' was added")
+
+    def check_method(self, name: str, old: SusMethod, new: SusMethod):
+        if old.static != new.static:
+            self.breaking(new.location, f"'{name}' changed from {'static' if old.static else 'dynamic'} to {'static' if new.static else 'dynamic'}")
+        if old.value != new.value:
+            self.breaking(new.location, f"Value of '{name}' changed from {old.value} to {new.value}")
+        if old.stream != new.stream:
+            self.breaking(new.location, f"'{name}' {'now streams' if new.stream else 'no longer streams'} its return values")
+        self.check_fields(new.location, f"{name} parameters", old.parameters, new.parameters)
+        self.check_fields(new.location, f"{name} returns", old.returns, new.returns)
+
+        # clients have to be able to respond to new confirmations
+        for conf in new.confirmations:
+            if conf not in old.confirmations:
+                self.breaking(new.location, f"'{name}' now requires confirmation '{conf}'")
+        for conf in old.confirmations:
+            if conf not in new.confirmations:
+                self.compatible(new.location, f"'{name}' no longer requires confirmation '{conf}'")
+        for error in set(new.errors) ^ set(old.errors):
+            self.compatible(new.location, f"'{name}' {'may now' if error in new.errors else 'no longer'} fail with '{error}'")
+        if old.rate_limit != new.rate_limit:
+            self.compatible(new.location, f"Rate limit of '{name}' changed")
+        if cache_policy(old.cache) != cache_policy(new.cache):
+            self.compatible(new.location, f"Cache policy of '{name}' changed")
+        # peers have to agree on which payloads are compressed
+        if compression_policy(old.compression) != compression_policy(new.compression):
+            self.breaking(new.location, f"Compression of '{name}' changed")
+
+    def check_fields(self, location: Location, name: str, old: List[SusField], new: List[SusField]):
+        # required fields are matched by position
+        old_required = [f for f in old if f.optional is None]
+        new_required = [f for f in new if f.optional is None]
+        if len(old_required) != len(new_required):
+            self.breaking(location, f"Number of required fields in '{name}' changed from {len(old_required)} to {len(new_required)}")
+        for old_field, new_field in zip(old_required, new_required):
+            self.check_field(name, old_field, new_field)
+
+        # optional fields are matched by name, as the opt() value is what
+        # identifies them on the wire; a new name at the opt() value of a
+        # field that's gone with the same type is only a rename
+        old_names = {f.name: f for f in reversed(old)}
+        new_names = {f.name: f for f in reversed(new)}
+        old_optional = {f.optional: f for f in old if f.optional is not None}
+        for old_field in old:
+            if old_field.optional is None:
+                continue
+            opt = old_field.optional
+            new_field = new_names.get(old_field.name)
+            if new_field is None:
+                successor = next((f for f in new if f.optional == opt), None)
+                if successor is None or successor.name in old_names:
+                    self.breaking(location, f"Optional field '{name}.{old_field.name}' (opt({opt})) was removed")
+            elif new_field.optional != opt:
+                where = "required" if new_field.optional is None else f"opt({new_field.optional})"
+                self.breaking(new_field.location, f"'{name}.{old_field.name}' moved from opt({opt}) to {where}")
+            else:
+                self.check_field(name, old_field, new_field)
+
+        for new_field in new:
+            if new_field.optional is None or new_field.name in old_names:
+                continue
+            opt = new_field.optional
+            previous = old_optional.get(opt)
+            if previous is None:
+                self.compatible(new_field.location, f"Optional field '{name}.{new_field.name}' (opt({opt})) was added")
+            elif previous.name in new_names or not compare_types(previous.type_, new_field.type_)[0]:
+                self.breaking(new_field.location, f"'{name}.{new_field.name}' reuses opt({opt}) of '{previous.name}'")
+            else:
+                self.check_field(name, previous, new_field)
+
+    def check_field(self, name: str, old: SusField, new: SusField):
+        same_wire, same_validators = compare_types(old.type_, new.type_)
+        if not same_wire:
+            self.breaking(new.location, f"Type of '{name}.{new.name}' changed from '{wire_type(old.type_)}' to '{wire_type(new.type_)}'")
+        elif not same_validators:
+            self.compatible(new.location, f"Validators of '{name}.{new.name}' changed")
+        if old.name != new.name:
+            self.compatible(new.location, f"'{name}.{old.name}' was renamed to '{new.name}'")
+
+    def check_members(self, old: SusEnum, new: SusEnum):
+        if old.size != new.size:
+            self.breaking(new.location, f"Size of '{new.name}' changed from {old.size} to {new.size}")
+        new_members = {m.name: m for m in new.members}
+        old_members = {m.name: m for m in old.members}
+        for member in old.members:
+            if member.name not in new_members:
+                self.breaking(new.location, f"Member '{new.name}.{member.name}' was removed")
+            elif new_members[member.name].value != member.value:
+                self.breaking(new_members[member.name].location,
+                    f"Value of '{new.name}.{member.name}' changed from {member.value} to {new_members[member.name].value}")
+        old_values = {m.value: m for m in old.members}
+        for member in new.members:
+            if member.name in old_members:
+                continue
+            if member.value in old_values:
+                self.breaking(member.location, f"'{new.name}.{member.name}' reuses value {member.value} of '{old_values[member.value].name}'")
+            else:
+                self.compatible(member.location, f"Member '{new.name}.{member.name}' was added")
+
+def load_project(file_path: str) -> ProjectIndex:
+    # loads a snapshot or compiles a project
+    if ir.is_snapshot(file_path):
+        return ProjectIndex(ir.load_file(file_path))
+
+    from . import File
+    file = File()
+    try:
+        file.load_from_file(file_path)
+    except OSError as ex:
+        raise OutputError(f"Could not read '{file_path}': {ex}")
+    _, diagnostics = file.parse()
+    errors = [d for d in diagnostics if d.level == DiagLevel.ERROR]
+    for diag in errors:
+        SourceError(diag).print()
+    if errors:
+        raise OutputError(f"'{file_path}' has errors")
+    return file.index
+
+def check(old: ProjectIndex, new: ProjectIndex) -> List[Change]:
+    return CompatChecker(old, new).check()
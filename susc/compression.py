@@ -0,0 +1,90 @@
+from .things import *
+from . import log
+from .exceptions import *
+from .index import ProjectIndex
+from .wire import SizeAnalyzer, WireSize
+
+# Compression policies. `compress deflate 256;` in an entity or a method
+# compresses its payloads of 256 bytes or more, `compress deflate;` compresses
+# all of them and `compress none;` none. Methods without a directive of their
+# own follow the policy of their entity, and everything else follows the
+# project default set with
+#   set compression deflate
+#   set compression_threshold 256
+MODES = ["none", "deflate"]
+# deflate adds a header and a checksum, so shorter payloads usually grow
+MIN_DEFLATE_SIZE = 64
+
+def default_policy(settings: Dict[str, str], location: Location=None) -> Optional[SusCompression]:
+    # `location` is where the `compression` setting is, for diagnostics
+    mode = settings.get("compression")
+    if mode is None:
+        return None
+    if mode not in MODES:
+        log.warn(f"Unknown compression '{mode}' (expected one of: {', '.join(MODES)})")
+        return None
+    try: threshold = int(settings.get("compression_threshold", 0))
+    except ValueError:
+        log.warn("'compression_threshold' is not a number")
+        threshold = 0
+    if threshold < 0:
+        log.warn("'compression_threshold' can't be negative")
+        threshold = 0
+    return SusCompression(location, None, mode, threshold)
+
+def effective_policy(method: SusMethod, entity: Optional[SusEntity], default: Optional[SusCompression]) -> Optional[SusCompression]:
+    if method.compression is not None:
+        return method.compression
+    if entity is not None and entity.compression is not None:
+        return entity.compression
+    return default
+
+def check(policy: SusCompression, sizes: List[WireSize], what: str, location: Location=None) -> List[Diagnostic]:
+    # `location` is where the policy applies if it's inherited from the default
+    locations = [location or policy.location]
+    if policy.mode == "none":
+        if policy.threshold:
+            return [Diagnostic(locations, DiagLevel.WARN, 31,
+                "A threshold has no effect without compression")]
+        return []
+
+    maxima = [s.max for s in sizes]
+    if None not in maxima and policy.threshold and max(maxima) < policy.threshold:
+        return [Diagnostic(locations, DiagLevel.WARN, 32,
+            f"{what} never reaches the threshold of {policy.threshold} bytes (it takes at most {max(maxima)}), so it's never compressed")]
+    if policy.threshold < MIN_DEFLATE_SIZE and min(s.min for s in sizes) < MIN_DEFLATE_SIZE:
+        return [Diagnostic(locations, DiagLevel.WARN, 33,
+            f"Payloads shorter than {MIN_DEFLATE_SIZE} bytes usually grow when compressed, and {what} may be as short as {min(s.min for s in sizes)} bytes\n" +\
+            f"Note: 'compress deflate {MIN_DEFLATE_SIZE};' leaves them uncompressed")]
+    return []
+
+def run(index: ProjectIndex, settings: Dict[str, str], location: Location=None) -> List[Diagnostic]:
+    default = default_policy(settings, location)
+    analyzer = SizeAnalyzer(index)
+    diag = []
+
+    # the default is checked where it's set and against every method that
+    # follows it
+    if default is not None and default.mode == "none" and default.location is not None:
+        diag += check(default, [], "")
+    if default is not None and default.mode != "none":
+        inheriting = [(m, None) for m in index.of_kind(SusMethod)]
+        inheriting += [(m, e) for e in index.of_kind(SusEntity) for m in e.methods]
+        for method, entity in inheriting:
+            if effective_policy(method, entity, default) is not default:
+                continue
+            name = f"'{entity.name}.{method.name}'" if entity else f"'{method.name}'"
+            diag += check(default, list(analyzer.method_sizes(method, entity)),
+                f"{name} (compressed by 'set compression')", method.location)
+
+    for entity in index.of_kind(SusEntity):
+        if entity.compression is not None:
+            diag += check(entity.compression, [analyzer.named_size(entity)], f"'{entity.name}'")
+        for method in entity.methods:
+            if method.compression is not None:
+                diag += check(method.compression, list(analyzer.method_sizes(method, entity)), f"'{entity.name}.{method.name}'")
+    for method in index.of_kind(SusMethod):
+        if method.compression is not None:
+            diag += check(method.compression, list(analyzer.method_sizes(method)), f"'{method.name}'")
+
+    return diag
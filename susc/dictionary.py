@@ -0,0 +1,234 @@
+import zlib
+import json
+from os import path, listdir, makedirs
+from random import Random
+from collections import Counter
+
+from .things import *
+from . import log
+from . import redos
+from .exceptions import *
+from .index import ProjectIndex
+from .wire import Encoder, ENTITY_PREFIX, TYPICAL_STR_LEN, TYPICAL_BIN_LEN, TYPICAL_LIST_LEN, TYPICAL_OPT_PRESENCE
+
+# Trains zlib preset dictionaries (see `zdict` in the zlib docs) for every
+# entity and every method request and response. Deflate can refer back to the
+# dictionary as if it preceded the payload, which makes small payloads that
+# share their structure compress a lot better.
+#
+# Samples are read from <samples dir>/<message>/*, one encoded payload per
+# file, where <message> is an entity name (`User`) or a method name followed
+# by the part (`User.get.request`, `ping.returns`). Messages without samples
+# get synthetic ones generated from their field types and validators.
+DICT_SIZE = 4096
+SYNTHETIC_SAMPLES = 200
+MAX_SAMPLES = 2000
+MAX_SAMPLE_LEN = 1024 # only the beginning of longer samples is used for training
+SEGMENT_LENS = [4, 8, 16, 32]
+HOLDOUT_EVERY = 5 # every fifth sample is used to measure the dictionary
+MAX_DEPTH = 4 # of synthetic values of recursive types
+
+WORDS = ["the", "user", "name", "id", "status", "message", "error", "value",
+    "data", "true", "false", "none", "hello", "world", "test", "item"]
+
+@dataclass
+class Message():
+    name: str
+    fields: List[SusField]
+    entity: Optional[SusEntity] = None # prefixes the payload with its value
+    id_field: Optional[SusField] = None # prefixes the payload with an ID
+
+class SampleGenerator():
+    # generates values that pass the validators of their types
+    def __init__(self, index: ProjectIndex, rng: Random):
+        self.index = index
+        self.rng = rng
+
+    def length(self, type_: SusType, param: str, typical: int) -> int:
+        for v in type_.validators:
+            if v.param == param and isinstance(v.restriction, range) and len(v.restriction):
+                low, high = v.restriction[0], min(v.restriction[-1], max(v.restriction[0], typical) * 2)
+                return self.rng.randint(low, high)
+        return self.rng.randint(0, typical * 2)
+
+    def integer(self, type_: SusType) -> int:
+        high = 256 ** type_.args[0] - 1
+        for v in type_.validators:
+            if v.param == "val" and isinstance(v.restriction, range) and len(v.restriction):
+                return self.rng.randint(max(v.restriction[0], 0), min(v.restriction[-1], high))
+        # small values are a lot more common than large ones
+        if self.rng.random() < 0.5:
+            return self.rng.randint(0, min(high, 255))
+        return self.rng.randint(0, high)
+
+    def string(self, type_: SusType) -> str:
+        for v in type_.validators:
+            if v.param == "match":
+                analyzer = redos.Analyzer(v.restriction)
+                return analyzer.sample(redos.parse(v.restriction))
+        length = self.length(type_, "len", TYPICAL_STR_LEN)
+        text = ""
+        while len(text) < length:
+            text += self.rng.choice(WORDS) + " "
+        return text[:length]
+
+    def value(self, type_: SusType, depth: int=0) -> Any:
+        if depth > MAX_DEPTH:
+            raise OutputError(f"Can't generate values of '{type_.name}', it nests too deeply")
+        name = type_.name
+        if name in ("Int", "VarInt"):
+            return self.integer(type_)
+        if name == "Bool":
+            return self.rng.random() < 0.5
+        if name == "Str":
+            return self.string(type_)
+        if name == "Bin":
+            return self.rng.randbytes(self.length(type_, "len", TYPICAL_BIN_LEN))
+        if name == "List":
+            # nested lists shrink to keep recursive structures finite
+            count = self.length(type_, "len", TYPICAL_LIST_LEN >> depth)
+            return [self.value(type_.args[0], depth + 1) for _ in range(count)]
+        if name == "Array":
+            return [self.value(type_.args[0], depth + 1) for _ in range(type_.args[1])]
+        if name == "Entity":
+            entity = self.rng.choice(self.index.of_kind(SusEntity))
+            return {"$entity": entity.name, **self.fields(entity.fields, depth + 1)}
+        thing = self.index.find(name)
+        if isinstance(thing, SusEnum):
+            return self.rng.choice(thing.members).value
+        if isinstance(thing, SusBitfield):
+            return sum(1 << m.value for m in thing.members if self.rng.random() < 0.5)
+        return self.fields(thing.fields, depth + 1)
+
+    def fields(self, fields: List[SusField], depth: int=0) -> Dict[str, Any]:
+        return {f.name: self.value(f.type_, depth) for f in fields
+            if f.optional is None or self.rng.random() < TYPICAL_OPT_PRESENCE}
+
+def messages(index: ProjectIndex) -> List[Message]:
+    result = []
+    for entity in index.of_kind(SusEntity):
+        result.append(Message(entity.name, entity.fields, entity=entity))
+    for method in index.of_kind(SusMethod):
+        result.append(Message(f"{method.name}.request", method.parameters))
+        result.append(Message(f"{method.name}.returns", method.returns))
+    for entity in index.of_kind(SusEntity):
+        id_field = index.id_field(entity.name)
+        for method in entity.methods:
+            name = f"{entity.name}.{method.name}"
+            result.append(Message(f"{name}.request", method.parameters,
+                id_field=None if method.static else id_field))
+            result.append(Message(f"{name}.returns", method.returns))
+    # there's nothing to compress in empty messages
+    return [m for m in result if m.fields or m.entity or m.id_field]
+
+def synthetic_samples(index: ProjectIndex, message: Message, count: int) -> List[bytes]:
+    # seeded by the name so that the dictionaries are reproducible
+    generator = SampleGenerator(index, Random(message.name))
+    encoder = Encoder(index)
+    samples = []
+    for _ in range(count):
+        data = encoder.encode_fields(message.fields, generator.fields(message.fields))
+        if message.entity is not None:
+            data = message.entity.value.to_bytes(ENTITY_PREFIX, "big") + data
+        if message.id_field is not None:
+            data = encoder.encode(message.id_field.type_, generator.value(message.id_field.type_)) + data
+        samples.append(data)
+    return samples
+
+def load_samples(directory: str) -> List[bytes]:
+    samples = []
+    for name in sorted(listdir(directory))[:MAX_SAMPLES]:
+        with open(path.join(directory, name), "rb") as f:
+            samples.append(f.read())
+    return samples
+
+def train(samples: List[bytes], size: int=DICT_SIZE) -> bytes:
+    # counts in how many samples every segment occurs and picks the ones that
+    # save the most, skipping those contained in the ones already picked.
+    # Deflate encodes closer matches with fewer bits, so the most valuable
+    # segments go at the end of the dictionary
+    counts = Counter()
+    for sample in samples:
+        sample = sample[:MAX_SAMPLE_LEN]
+        counts.update({sample[i:i + n] for n in SEGMENT_LENS for i in range(len(sample) - n + 1)})
+
+    candidates = sorted(((c - 1) * len(s), s) for s, c in counts.items() if c > 1)
+    picked, total = [], 0
+    for _, segment in reversed(candidates):
+        if total >= size:
+            break
+        if total + len(segment) > size:
+            continue
+        if any(segment in p for p in picked):
+            continue
+        picked.append(segment)
+        total += len(segment)
+    return b"".join(reversed(picked))
+
+def deflated_size(data: bytes, zdict: Optional[bytes]=None) -> int:
+    # raw deflate, without the zlib header and checksum
+    options = {"zdict": zdict} if zdict else {}
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS, **options)
+    return len(compressor.compress(data) + compressor.flush())
+
+def evaluate(samples: List[bytes], zdict: bytes) -> dict:
+    raw = sum(len(s) for s in samples)
+    plain = sum(deflated_size(s) for s in samples)
+    with_dict = sum(deflated_size(s, zdict) for s in samples)
+    return {"samples": len(samples), "raw": raw, "deflate": plain, "deflate_dict": with_dict,
+        "ratio": round(plain / raw, 3) if raw else None,
+        "ratio_dict": round(with_dict / raw, 3) if raw else None}
+
+def build(index: ProjectIndex, samples_dir: Optional[str], target_dir: str, size: int=DICT_SIZE) -> List[dict]:
+    # trains and writes a dictionary for every message, returning the report
+    makedirs(target_dir, exist_ok=True)
+    report = []
+    for message in messages(index):
+        source = "synthetic"
+        samples_path = path.join(samples_dir, message.name) if samples_dir else None
+        if samples_path and path.isdir(samples_path):
+            samples = load_samples(samples_path)
+            source = "samples"
+        else:
+            try:
+                samples = synthetic_samples(index, message, SYNTHETIC_SAMPLES)
+            except OutputError as ex:
+                log.warn(f"Skipping '{message.name}': {ex}")
+                continue
+        if not samples:
+            log.warn(f"No samples of '{message.name}' in '{samples_path}'")
+            continue
+
+        holdout = samples[::HOLDOUT_EVERY] if len(samples) >= HOLDOUT_EVERY else samples
+        training = [s for i, s in enumerate(samples) if i % HOLDOUT_EVERY] if len(samples) >= HOLDOUT_EVERY else samples
+        zdict = train(training, size)
+        if not zdict:
+            log.verbose(f"'{message.name}' has nothing in common between its samples", "dicts")
+            continue
+        with open(path.join(target_dir, f"{message.name}.zdict"), "wb") as f:
+            f.write(zdict)
+        report.append({"message": message.name, "source": source, "dict_size": len(zdict), **evaluate(holdout, zdict)})
+        log.verbose(f"Trained a {len(zdict)}-byte dictionary for '{message.name}' on {len(training)} samples", "dicts")
+
+    with open(path.join(target_dir, "report.json"), "w") as f:
+        json.dump({"unit": "bytes", "messages": report}, f, indent=4)
+    with open(path.join(target_dir, "report.txt"), "w") as f:
+        f.write("Total sizes of held-out samples in bytes, compressed with raw deflate at level 9\n\n")
+        f.write(format_report(report))
+    return report
+
+REPORT_COLUMNS = [("message", "Message"), ("source", "Source"), ("dict_size", "Dict"), ("samples", "Samples"),
+    ("raw", "Raw"), ("deflate", "Deflate"), ("deflate_dict", "With dict"), ("ratio", "Ratio"), ("ratio_dict", "With dict")]
+
+def format_report(rows: List[dict]) -> str:
+    cells = [[title for _, title in REPORT_COLUMNS]]
+    for row in rows:
+        cells.append([("-" if row[key] is None else str(row[key])) for key, _ in REPORT_COLUMNS])
+    widths = [max(len(line[i]) for line in cells) for i in range(len(REPORT_COLUMNS))]
+
+    lines = []
+    for line in cells:
+        lines.append("  ".join(c.ljust(w) if i < 2 else c.rjust(w)
+            for i, (c, w) in enumerate(zip(line, widths))).rstrip())
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines) + "\n"
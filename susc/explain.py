@@ -417,6 +417,483 @@ EXPLANATIONS = {
         ```
         """
     ),
+
+    #
+    # LINTING
+    #
+
+    19: Explanation(
+        stage="linting",
+        level=DiagLevel.WARN,
+        explanation="""
+        Enabled with `set lint unbounded` or `set lint all`.
+
+        A `Str`, `Bin` or `List` did not have a `len` validator. Values of such
+        types may be arbitrarily large, so every peer has to be ready to
+        receive and buffer huge payloads.
+
+        WRONG:
+        ```
+        set lint unbounded
+        compound Example {
+            name: Str;
+        }
+        ```
+        RIGHT:
+        ```
+        set lint unbounded
+        compound Example {
+            name: Str[len: 1..64];
+        }
+        ```
+        """
+    ),
+    20: Explanation(
+        stage="linting",
+        level=DiagLevel.WARN,
+        explanation="""
+        Enabled with `set lint wide_int` or `set lint all`.
+
+        An `Int` or `VarInt` wider than 4 bytes was used. The TypeScript
+        backend represents such integers as `BigInteger`s, which are a lot
+        slower to encode, decode and do arithmetic on than regular numbers.
+        If most values are small, `VarInt` with a `val` validator at least
+        keeps them short on the wire.
+
+        ```
+        set lint wide_int
+        compound Example {
+            counter: Int(8);
+        }
+        ```
+        """
+    ),
+    21: Explanation(
+        stage="linting",
+        level=DiagLevel.WARN,
+        explanation="""
+        Enabled with `set lint nested_list` or `set lint all`.
+
+        A `List` of `List`s was used. Every level of nesting multiplies the
+        number of elements that may be sent and adds a length prefix to every
+        inner list. Consider flattening the data or putting it in a compound.
+
+        ```
+        set lint nested_list
+        compound Example {
+            grid: List(List(Int(1), 1), 1);
+        }
+        ```
+        """
+    ),
+    22: Explanation(
+        stage="linting",
+        level=DiagLevel.WARN,
+        explanation="""
+        Enabled with `set lint get_size` or `set lint all`.
+
+        The automatically generated `get` method of an entity returns the whole
+        entity, and the entity may be larger than `lint_get_size` bytes (16384
+        by default) or arbitrarily large. Consider limiting the length of its
+        fields or moving large data to separate methods.
+
+        ```
+        set lint get_size
+        entity Example(0) {
+            id: Int(4);
+            data: Bin;
+        }
+        ```
+        """
+    ),
+    23: Explanation(
+        stage="linting",
+        level=DiagLevel.WARN,
+        explanation="""
+        Enabled with `set lint rate_limit` or `set lint all`.
+
+        A method did not have a `ratelimit` directive, so clients can invoke it
+        as often as they wish.
+
+        WRONG:
+        ```
+        set lint rate_limit
+        globalmethod example(0) { }
+        ```
+        RIGHT:
+        ```
+        set lint rate_limit
+        globalmethod example(0) {
+            ratelimit 10 every 1s;
+        }
+        ```
+        """
+    ),
+    24: Explanation(
+        stage="validation",
+        level=DiagLevel.WARN,
+        explanation="""
+        A `match` validator used a regular expression that may take exponential
+        time to match some inputs ("catastrophic backtracking" or ReDoS). Every
+        server and client validates strings with it, so a single malicious
+        string may keep a CPU busy for minutes.
+
+        The compiler looks for quantifiers nested in other quantifiers that
+        compete for the same characters, for repeated alternations whose
+        branches start with the same characters (like `(a|aa)+`), and for
+        optional parts of a repetition that could be matched by what follows
+        them (like `(aa?)+`). Rewrite the expression so that there's only one
+        way to match any given string. Pass `--redos-budget <ms>` to the
+        compiler to also run the expressions against generated inputs; this
+        is skipped on platforms that can't fork processes.
+
+        WRONG:
+        ```
+        compound Example {
+            name: Str[match: /(\\w+\\s?)+$/];
+        }
+        ```
+        RIGHT:
+        ```
+        compound Example {
+            name: Str[match: /\\w+(\\s\\w+)*$/];
+        }
+        ```
+        """
+    ),
+    25: Explanation(
+        stage="validation",
+        level=DiagLevel.ERROR,
+        explanation="""
+        With `--redos-budget <ms>`, a `match` validator took longer than the
+        specified number of milliseconds to match an input generated to make it
+        backtrack. See code 24 for more details.
+        """
+    ),
+    26: Explanation(
+        stage="linting",
+        level=DiagLevel.WARN,
+        explanation="""
+        Enabled with `set lint opt_layout` or `set lint all`.
+
+        Optional fields are sent with their opt() value, so it has to stay the
+        same once clients are deployed: clients that know the old value
+        ignore the field or, worse, mistake it for another one. For the same
+        reason, the values of removed fields shouldn't be given to new ones.
+        Both are checked against a snapshot of the previously deployed
+        revision of the project (saved with `susc -l ir`) set with
+        `set opt_baseline path/to/ir.json`; without one, this lint reports
+        nothing.
+
+        The numbering doesn't change the size of messages: every optional
+        field that is present takes one byte for its value, be it opt(0) or
+        opt(200). Values of 256 and above wrap around (see code 8).
+
+        `susc --fix-opt-layout` moves deployed fields back to their values if
+        those are still free, and `susc -l layout` writes a report of the
+        opt() values used by every structure.
+
+        WRONG:
+        ```
+        # deployed: compound Example { a: opt(0) Str; b: opt(1) Str; }
+        set lint opt_layout
+        set opt_baseline ir.json
+        compound Example {
+            a: opt(1) Str;
+            c: opt(2) Str;
+        }
+        ```
+        RIGHT:
+        ```
+        set lint opt_layout
+        set opt_baseline ir.json
+        compound Example {
+            a: opt(0) Str;
+            c: opt(2) Str;
+        }
+        ```
+        """
+    ),
+    27: Explanation(
+        stage="validation",
+        level=DiagLevel.ERROR,
+        explanation="""
+        A `cache` directive had a TTL of zero. Entries would expire as soon as
+        they're stored, so the cache would never be used.
+
+        WRONG:
+        ```
+        entity Example(0) {
+            id: Int(8);
+            cache hard 0s;
+        }
+        ```
+        RIGHT:
+        ```
+        entity Example(0) {
+            id: Int(8);
+            cache hard 5m;
+        }
+        ```
+        """
+    ),
+    28: Explanation(
+        stage="validation",
+        level=DiagLevel.WARN,
+        explanation="""
+        A method that doesn't return anything had a `cache` directive. There's
+        nothing clients could serve from the cache, so the directive has no
+        effect.
+
+        ```
+        globalmethod example(0) {
+            cache soft 1m;
+        }
+        ```
+        """
+    ),
+    29: Explanation(
+        stage="validation",
+        level=DiagLevel.ERROR,
+        explanation="""
+        A method with `returns stream` didn't declare any return values.
+        Streaming methods send their return values in chunks, each of which
+        has the fields declared in the `returns stream` block and a `cursor`
+        field that's added automatically. There's nothing to stream if the
+        block is empty.
+
+        WRONG:
+        ```
+        globalmethod example(0) {
+            returns stream { }
+        }
+        ```
+        RIGHT:
+        ```
+        globalmethod example(0) {
+            returns stream {
+                rows: List(Int(4), 2);
+            }
+        }
+        ```
+        """
+    ),
+    30: Explanation(
+        stage="validation",
+        level=DiagLevel.ERROR,
+        explanation="""
+        A method with `returns stream` required confirmations. Clients call
+        streaming methods once for every chunk of their return values, so
+        confirmations would be requested over and over. Require them in a
+        separate method that's called before the streaming one.
+
+        ```
+        confirmation Sure(0) {
+            request { }
+            response { }
+        }
+        globalmethod example(0) {
+            returns stream {
+                rows: List(Int(4), 2);
+            }
+            confirmations { Sure }
+        }
+        ```
+        """
+    ),
+    31: Explanation(
+        stage="validation",
+        level=DiagLevel.WARN,
+        explanation="""
+        A `compress none` directive, or `set compression none` with a
+        `compression_threshold`, had a threshold. Payloads are never
+        compressed, so the threshold has no effect.
+
+        WRONG:
+        ```
+        globalmethod example(0) {
+            compress none 256;
+        }
+        ```
+        RIGHT:
+        ```
+        globalmethod example(0) {
+            compress none;
+        }
+        ```
+        """
+    ),
+    32: Explanation(
+        stage="validation",
+        level=DiagLevel.WARN,
+        explanation="""
+        A `compress deflate <threshold>` directive applied to payloads that
+        can never be as large as the threshold, so they're never compressed.
+        Remove the directive or lower the threshold. Methods without a
+        directive of their own are checked against the project default set
+        with `set compression` and `set compression_threshold`.
+
+        ```
+        globalmethod example(0) {
+            flag: Bool;
+            compress deflate 256;
+        }
+        ```
+        """
+    ),
+    33: Explanation(
+        stage="validation",
+        level=DiagLevel.WARN,
+        explanation="""
+        A `compress deflate` directive applied to payloads that may be
+        shorter than 64 bytes. Deflate adds a header and a checksum to every
+        payload, so short ones usually get larger and take longer to process.
+        Set a threshold so that only large payloads are compressed. Methods
+        without a directive of their own are checked against the project
+        default set with `set compression`.
+
+        WRONG:
+        ```
+        globalmethod example(0) {
+            text: Str;
+            compress deflate;
+        }
+        ```
+        RIGHT:
+        ```
+        globalmethod example(0) {
+            text: Str;
+            compress deflate 64;
+        }
+        ```
+        """
+    ),
+    34: Explanation(
+        stage="validation",
+        level=DiagLevel.ERROR,
+        explanation="""
+        An entity with a `subscribe` directive defined a method with a value
+        that's reserved for the generated `subscribe` (125) and `unsubscribe`
+        (124) methods. Change the value of the method.
+
+        WRONG:
+        ```
+        entity Example(0) {
+            id: Int(8);
+            name: Str;
+            subscribe;
+            method rename(125) {
+                name: Str;
+            }
+        }
+        ```
+        RIGHT:
+        ```
+        entity Example(0) {
+            id: Int(8);
+            name: Str;
+            subscribe;
+            method rename(0) {
+                name: Str;
+            }
+        }
+        ```
+        """
+    ),
+    35: Explanation(
+        stage="validation",
+        level=DiagLevel.WARN,
+        explanation="""
+        An entity with a `subscribe` directive had no fields other than `id`.
+        Subscribers are notified when fields change, and the ID of an entity
+        never does, so no subscription methods were generated.
+
+        ```
+        entity Example(0) {
+            id: Int(8);
+            subscribe;
+        }
+        ```
+        """
+    ),
+    36: Explanation(
+        stage="validation",
+        level=DiagLevel.ERROR,
+        explanation="""
+        An entity with a `generate get_fields` or `subscribe` directive gets a
+        generated `<Entity>Fields` bitfield that selects its fields, and
+        another definition had the same name. Rename that definition.
+
+        WRONG:
+        ```
+        entity Example(0) {
+            id: Int(8);
+            name: Str;
+            generate get_fields;
+        }
+        compound ExampleFields {
+            name: Str;
+        }
+        ```
+        RIGHT:
+        ```
+        entity Example(0) {
+            id: Int(8);
+            name: Str;
+            generate get_fields;
+        }
+        compound ExampleNames {
+            name: Str;
+        }
+        ```
+        """
+    ),
+    37: Explanation(
+        stage="validation",
+        level=DiagLevel.ERROR,
+        explanation="""
+        An entity defined a method with a value that's taken by one of its
+        generated methods: the static `get` (127) and the dynamic `update`
+        (127), and, if a `generate` directive asks for them, the static
+        `get_many` (126) and `get_fields` (125) and the dynamic `patch` (126).
+        Change the value of the method.
+
+        WRONG:
+        ```
+        entity Example(0) {
+            id: Int(8);
+            generate get_many;
+            staticmethod search(126) {
+                query: Str;
+            }
+        }
+        ```
+        RIGHT:
+        ```
+        entity Example(0) {
+            id: Int(8);
+            generate get_many;
+            staticmethod search(0) {
+                query: Str;
+            }
+        }
+        ```
+        """
+    ),
+    38: Explanation(
+        stage="resolution",
+        level=DiagLevel.WARN,
+        explanation="""
+        The `lint` setting named a lint that the compiler does not know. The
+        other lints in the list still run. The known ones are `unbounded`,
+        `wide_int`, `nested_list`, `get_size`, `rate_limit` and `opt_layout`,
+        or `all` of them.
+
+        ```
+        set lint unbounded,wideint
+        ```
+        """
+    ),
 }
 
 
@@ -478,7 +955,7 @@ def explain(n: int):
     level_color = [Back.RED, Back.YELLOW, Back.BLUE][exp.level.value - 1]
     print(f"{Back.LIGHTBLACK_EX}{Fore.WHITE} LEVEL {level_color}{Fore.BLACK} {level} {Back.RESET}")
 
-    stage_color = {"validation": Back.MAGENTA, "parsing": Back.GREEN, "resolution": Back.YELLOW}[exp.stage]
+    stage_color = {"validation": Back.MAGENTA, "parsing": Back.GREEN, "resolution": Back.YELLOW, "linting": Back.CYAN}[exp.stage]
     print(f"{Back.LIGHTBLACK_EX}{Fore.WHITE} STAGE {stage_color}{Fore.BLACK} {exp.stage} {Back.RESET}")
 
     print(f"\n{Back.LIGHTBLACK_EX}{Fore.WHITE} EXPLANATION {Back.RESET}:")
@@ -0,0 +1,265 @@
+from collections import Counter
+from dataclasses import field as dc_field
+
+from .things import *
+from . import log
+from .exceptions import *
+from .index import ProjectIndex, field_sets_of, referenced_names
+from .linker import (MAGIC_IDENTIFIERS, combine, validate_fields, validate_method_meta, validate_values,
+                     validate_id_field, validate_subscription, validate_generated, validate_projection, validate_caches,
+                     value_clash, strip_docstrings, deduplicate)
+
+# value spaces shared by all top-level things
+VALUE_SPACES = {SusEntity: "entities", SusMethod: "methods", SusConfirmation: "confirmations"}
+
+@dataclass
+class LinkedDefinition():
+    thing: SusThing
+    optionals: List[Tuple[SusField, int]] # opt() values as they were parsed
+    references: Set[str] # type names its fields refer to
+    confirmations: Set[str] # confirmations its methods refer to
+    uses_errors: bool # whether any of its methods refer to error codes
+    # diagnostics by the field set category they belong to
+    fields: Dict[str, List[Diagnostic]] = dc_field(default_factory=dict)
+    meta: List[Diagnostic] = dc_field(default_factory=list) # error and confirmation references
+    ids: List[Diagnostic] = dc_field(default_factory=list) # 'id' field and subscription of an entity
+    values: List[Diagnostic] = dc_field(default_factory=list) # values of methods within an entity
+    caches: List[Diagnostic] = dc_field(default_factory=list) # cache directives
+
+    def methods(self) -> List[SusMethod]:
+        if isinstance(self.thing, SusEntity):
+            return self.thing.methods
+        if isinstance(self.thing, SusMethod):
+            return [self.thing]
+        return []
+
+    def method_sets(self) -> List[List[SusMethod]]:
+        if isinstance(self.thing, SusEntity):
+            return [[m for m in self.thing.methods if m.static], [m for m in self.thing.methods if not m.static]]
+        if isinstance(self.thing, SusMethod):
+            return [[self.thing]]
+        return []
+
+    def field_sets(self) -> Dict[str, List[List[SusField]]]:
+        # field sets grouped by the order in which linker.run() validates them
+        thing = self.thing
+        if isinstance(thing, SusEntity):
+            return {"entity": [thing.fields],
+                "params": [m.parameters for m in thing.methods],
+                "returns": [m.returns for m in thing.methods]}
+        if isinstance(thing, SusMethod):
+            return {"params": [thing.parameters], "returns": [thing.returns]}
+        if isinstance(thing, SusConfirmation):
+            return {"req": [thing.req_parameters], "resp": [thing.resp_parameters]}
+        if isinstance(thing, SusCompound):
+            return {"compound": [thing.fields]}
+        return {}
+
+# Links a project the same way linker.run() does, but remembers what every
+# diagnostic depends on. Feeding it the things of a new revision of the project
+# only revalidates the definitions that were added or removed and the ones that
+# depend on them:
+#   - field sets depend on their definition and on the names their types refer to
+#   - combined enums and bitfields depend on the definitions with that name
+#   - error and confirmation references depend on the definitions with that name
+#   - numeric value clashes depend on the things sharing the value
+# Definitions are matched by identity, so unchanged things have to be passed in
+# as the same objects as before. The result is always the same as that of
+# linker.run() over the same things.
+class IncrementalLinker():
+    def __init__(self):
+        self.definitions: Dict[int, LinkedDefinition] = {} # id(thing) -> definition
+        self.by_name: Dict[str, List[SusThing]] = {} # name -> definitions
+        self.combined: Dict[str, Tuple[SusThing, List[Diagnostic]]] = {} # name -> combined thing and diagnostics
+        self.name_counts = Counter() # identifier -> number of definitions
+        self.identifiers = set(MAGIC_IDENTIFIERS)
+        self.by_value: Dict[Tuple[str, int], List[SusThing]] = {} # (value space, value) -> things
+        self.clashes: Dict[Tuple[str, int], Diagnostic] = {} # (value space, value) -> diagnostic
+        self.referencing: Dict[str, Set[int]] = {} # type name -> ids of definitions
+        self.confirming: Dict[str, Set[int]] = {} # confirmation name -> ids of definitions
+        self.erring: Set[int] = set() # ids of definitions referring to error codes
+        self.index = ProjectIndex([])
+
+    def run(self, things: List[SusThing]) -> Tuple[List[SusThing], List[Diagnostic], ProjectIndex]:
+        current = {id(t) for t in things}
+        removed = [d for i, d in self.definitions.items() if i not in current]
+        added = [t for t in things if id(t) not in self.definitions]
+        log.verbose(f"Relinking {len(added)} added and {len(removed)} removed definitions", "linker")
+        position = {id(t): i for i, t in enumerate(things)}
+
+        for definition in removed:
+            self.forget(definition)
+        flipped = set() # identifiers that appeared or disappeared
+        for thing in added:
+            self.remember(thing)
+            if not isinstance(thing, SusMethod):
+                self.name_counts[thing.name] += 1
+                if self.name_counts[thing.name] == 1:
+                    flipped.add(thing.name)
+        for definition in removed:
+            if not isinstance(definition.thing, SusMethod):
+                self.name_counts[definition.thing.name] -= 1
+                if self.name_counts[definition.thing.name] == 0:
+                    del self.name_counts[definition.thing.name]
+                    flipped.add(definition.thing.name)
+        self.identifiers ^= {n for n in flipped if n not in MAGIC_IDENTIFIERS}
+
+        # recombine the names that were touched
+        changed_names = {t.name for t in added} | {d.thing.name for d in removed}
+        for name in changed_names:
+            self.relink_name(name, position)
+
+        # revalidate field sets of new definitions and of those that refer to
+        # identifiers which appeared or disappeared
+        checker = TypeChecker(self.identifiers)
+        dirty_fields = {id(t) for t in added}
+        for name in flipped:
+            dirty_fields |= self.referencing.get(name, set())
+        for i in dirty_fields:
+            self.validate_fields(self.definitions[i], checker)
+
+        # revalidate references to errors and confirmations
+        dirty_meta = {id(t) for t in added}
+        for name in changed_names:
+            dirty_meta |= self.confirming.get(name, set())
+        if "ErrorCode" in changed_names:
+            dirty_meta |= self.erring
+        for i in dirty_meta:
+            definition = self.definitions[i]
+            definition.meta = validate_method_meta(self.index, definition.method_sets())
+
+        # revalidate numeric values
+        dirty_values = set()
+        for thing in added:
+            definition = self.definitions[id(thing)]
+            if isinstance(thing, SusEntity):
+                definition.ids = validate_id_field(thing) + validate_subscription(thing) + validate_generated(thing)
+                definition.values = validate_values([], definition.method_sets(), [])
+        for thing in added + [d.thing for d in removed]:
+            if type(thing) in VALUE_SPACES:
+                dirty_values.add((VALUE_SPACES[type(thing)], thing.value))
+        for key in dirty_values:
+            self.relink_value(key, position)
+
+        # cache directives only depend on their own definition
+        for thing in added:
+            self.definitions[id(thing)].caches = validate_caches(thing)
+
+        return self.collect(things)
+
+    def remember(self, thing: SusThing):
+        optionals = [(f, f.optional) for s in field_sets_of(thing) for f in s]
+        references = set()
+        for field, _ in optionals:
+            references |= referenced_names(field.type_)
+        definition = LinkedDefinition(thing, optionals, references, set(), False)
+        for method in definition.methods():
+            definition.confirmations.update(method.confirmations)
+            definition.uses_errors |= len(method.errors) > 0
+        self.definitions[id(thing)] = definition
+
+        self.by_name.setdefault(thing.name, []).append(thing)
+        if type(thing) in VALUE_SPACES:
+            self.by_value.setdefault((VALUE_SPACES[type(thing)], thing.value), []).append(thing)
+        for name in definition.references:
+            self.referencing.setdefault(name, set()).add(id(thing))
+        for name in definition.confirmations:
+            self.confirming.setdefault(name, set()).add(id(thing))
+        if definition.uses_errors:
+            self.erring.add(id(thing))
+
+    def forget(self, definition: LinkedDefinition):
+        thing = definition.thing
+        del self.definitions[id(thing)]
+
+        self.by_name[thing.name] = [t for t in self.by_name[thing.name] if t is not thing]
+        if type(thing) in VALUE_SPACES:
+            key = (VALUE_SPACES[type(thing)], thing.value)
+            self.by_value[key] = [t for t in self.by_value[key] if t is not thing]
+        for name in definition.references:
+            self.referencing[name].discard(id(thing))
+        for name in definition.confirmations:
+            self.confirming[name].discard(id(thing))
+        self.erring.discard(id(thing))
+
+    def relink_name(self, name: str, position: Dict[int, int]):
+        if name in self.combined:
+            old = self.combined.pop(name)[0]
+            if old is not None:
+                self.index.remove(old)
+
+        things = sorted(self.by_name[name], key=lambda t: position[id(t)])
+        if not things:
+            del self.by_name[name]
+            return
+        self.by_name[name] = things
+
+        out, diag = combine(things)
+        if name.endswith("Fields"):
+            for entity in self.by_name.get(name[:-len("Fields")], []):
+                if isinstance(entity, SusEntity):
+                    diag = validate_projection(entity, things) + diag
+        out = strip_docstrings(out)
+        self.combined[name] = (out[0] if out else None, diag)
+        if out:
+            self.index.add(out[0])
+
+    def relink_value(self, key: Tuple[str, int], position: Dict[int, int]):
+        things = sorted(self.by_value[key], key=lambda t: position[id(t)])
+        self.clashes.pop(key, None)
+        if not things:
+            del self.by_value[key]
+            return
+        self.by_value[key] = things
+        if len(things) > 1:
+            self.clashes[key] = value_clash(things, key[0])
+
+    def validate_fields(self, definition: LinkedDefinition, checker: TypeChecker):
+        # opt() values get taken mod 256 during validation; put the original
+        # ones back so that validating again yields the same diagnostics
+        for field, optional in definition.optionals:
+            field.optional = optional
+        definition.fields = {category: validate_fields(checker, sets)
+            for category, sets in definition.field_sets().items()}
+
+    def collect(self, things: List[SusThing]) -> Tuple[List[SusThing], List[Diagnostic], ProjectIndex]:
+        # put the diagnostics together in the order linker.run() produces them
+        definitions = [self.definitions[id(t)] for t in things]
+        entities = [d for d in definitions if isinstance(d.thing, SusEntity)]
+        methods = [d for d in definitions if isinstance(d.thing, SusMethod)]
+        confirmations = [d for d in definitions if isinstance(d.thing, SusConfirmation)]
+        compounds = [d for d in definitions if isinstance(d.thing, SusCompound)]
+
+        out, diag = [], []
+        for name in dict.fromkeys(t.name for t in things):
+            thing, combine_diag = self.combined[name]
+            if thing is not None:
+                out.append(thing)
+            diag += combine_diag
+
+        for category, group in [("entity", entities), ("params", methods), ("params", entities),
+                                ("returns", methods), ("returns", entities), ("req", confirmations),
+                                ("resp", confirmations), ("compound", compounds)]:
+            for definition in group:
+                diag += definition.fields[category]
+
+        for definition in methods + entities:
+            diag += definition.meta
+
+        for space, group in [("entities", entities), ("methods", methods)]:
+            for definition in group:
+                clash = self.clashes.get((space, definition.thing.value))
+                if clash is not None and self.by_value[(space, definition.thing.value)][0] is definition.thing:
+                    diag.append(clash)
+                diag += definition.ids
+        for definition in entities:
+            diag += definition.values
+        for definition in confirmations:
+            clash = self.clashes.get(("confirmations", definition.thing.value))
+            if clash is not None and self.by_value[("confirmations", definition.thing.value)][0] is definition.thing:
+                diag.append(clash)
+        for definition in methods + entities:
+            diag += definition.caches
+
+        self.index.things = out
+        return out, deduplicate(diag), self.index
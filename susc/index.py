@@ -0,0 +1,114 @@
+from .things import *
+
+# lookup tables over the things of a linked project
+# built once after linking so that the linker, the output backends and the
+# language server don't have to scan the whole project for every name
+class ProjectIndex():
+    def __init__(self, things: List[SusThing]):
+        self.things = things
+        self.names: Dict[str, SusThing] = {} # name -> thing
+        self.kinds: Dict[type, Dict[str, SusThing]] = {} # kind -> name -> thing
+        self.values: Dict[Tuple[type, int], List[SusThing]] = {} # (kind, value) -> things
+        self.id_fields: Dict[str, SusField] = {} # entity name -> id field
+        self.methods: Dict[str, Dict[str, SusMethod]] = {} # entity name -> method name -> method
+        self.references: Dict[str, Dict[int, SusField]] = {} # type name -> id(field) -> field referencing it
+
+        for thing in things:
+            self.add(thing)
+
+    def add(self, thing: SusThing):
+        kind = type(thing)
+        self.names.setdefault(thing.name, thing)
+        self.kinds.setdefault(kind, {}).setdefault(thing.name, thing)
+        if isinstance(thing, (SusEntity, SusMethod, SusConfirmation)):
+            self.values.setdefault((kind, thing.value), []).append(thing)
+
+        for fields in field_sets_of(thing):
+            for field in fields:
+                self.add_references(field, field.type_)
+
+        if isinstance(thing, SusEntity):
+            for field in thing.fields:
+                if field.name == "id":
+                    self.id_fields.setdefault(thing.name, field)
+            methods = self.methods.setdefault(thing.name, {})
+            for method in thing.methods:
+                methods.setdefault(method.name, method)
+
+    def add_references(self, field: SusField, type_: SusTypeBase):
+        if not isinstance(type_, SusType):
+            return
+        self.references.setdefault(type_.name, {})[id(field)] = field
+        for arg in type_.args:
+            self.add_references(field, arg)
+
+    # forgets a thing that was previously added; used by the incremental linker
+    def remove(self, thing: SusThing):
+        kind = type(thing)
+        if self.names.get(thing.name) is thing:
+            del self.names[thing.name]
+        if self.kinds.get(kind, {}).get(thing.name) is thing:
+            del self.kinds[kind][thing.name]
+        if isinstance(thing, (SusEntity, SusMethod, SusConfirmation)):
+            same_value = self.values[(kind, thing.value)]
+            same_value[:] = [t for t in same_value if t is not thing]
+            if not same_value:
+                del self.values[(kind, thing.value)]
+
+        for field in (f for s in field_sets_of(thing) for f in s):
+            for name in referenced_names(field.type_):
+                referencing = self.references[name]
+                referencing.pop(id(field), None)
+                if not referencing:
+                    del self.references[name]
+
+        # names are unique after linking
+        if isinstance(thing, SusEntity):
+            self.id_fields.pop(thing.name, None)
+            self.methods.pop(thing.name, None)
+
+    def find(self, name: str, *kinds: type) -> SusThing:
+        # finds a thing by its name, optionally restricting it to some kinds
+        if not kinds:
+            return self.names.get(name)
+        for kind in kinds:
+            thing = self.kinds.get(kind, {}).get(name)
+            if thing is not None:
+                return thing
+        return None
+
+    def of_kind(self, *kinds: type) -> List[SusThing]:
+        return [t for k in kinds for t in self.kinds.get(k, {}).values()]
+
+    def by_value(self, kind: type, value: int) -> SusThing:
+        things = self.values.get((kind, value))
+        return things[0] if things else None
+
+    def id_field(self, entity: str) -> SusField:
+        return self.id_fields.get(entity)
+
+    def method(self, entity: str, name: str) -> SusMethod:
+        return self.methods.get(entity, {}).get(name)
+
+    def referencing(self, name: str) -> List[SusField]:
+        return list(self.references.get(name, {}).values())
+
+def field_sets_of(thing: SusThing) -> List[List[SusField]]:
+    if isinstance(thing, SusEntity):
+        return [thing.fields] + [s for m in thing.methods for s in field_sets_of(m)]
+    if isinstance(thing, SusMethod):
+        return [thing.parameters, thing.returns]
+    if isinstance(thing, SusConfirmation):
+        return [thing.req_parameters, thing.resp_parameters]
+    if isinstance(thing, SusCompound):
+        return [thing.fields]
+    return []
+
+def referenced_names(type_: SusTypeBase) -> Set[str]:
+    # names of all types that a type refers to, including its arguments
+    if not isinstance(type_, SusType):
+        return set()
+    names = {type_.name}
+    for arg in type_.args:
+        names |= referenced_names(arg)
+    return names
@@ -0,0 +1,80 @@
+from dataclasses import fields, is_dataclass
+from os import path
+import json
+
+from . import things as things_module
+from .things import *
+from .exceptions import Location, OutputError
+
+# Snapshots of linked projects that can be saved with the `ir` output language
+# and loaded back later, e.g. to check a new revision of a schema against what
+# was previously deployed. Things are stored as JSON objects tagged with their
+# class name; locations refer to source files by path.
+VERSION = 1
+
+class SnapshotFile():
+    # stands in for the File that things of a snapshot were parsed from
+    def __init__(self, file_path: str):
+        self.path = file_path
+        self.parent = None
+        try:
+            with open(file_path, encoding="utf8") as f:
+                self.source = f.read()
+        except OSError:
+            self.source = ""
+
+def dump_value(value: Any) -> Any:
+    if isinstance(value, Location):
+        return {"kind": "Location", "file": value.file.path, "line": value.line, "col": value.col, "dur": value.dur}
+    if is_dataclass(value):
+        return {"kind": type(value).__name__, **{f.name: dump_value(getattr(value, f.name)) for f in fields(value)}}
+    if isinstance(value, range):
+        return {"kind": "range", "start": value.start, "stop": value.stop}
+    if isinstance(value, re.Pattern):
+        return {"kind": "regex", "pattern": value.pattern, "flags": value.flags}
+    if isinstance(value, tuple):
+        return {"kind": "tuple", "items": [dump_value(v) for v in value]}
+    if isinstance(value, list):
+        return [dump_value(v) for v in value]
+    return value
+
+def load_value(value: Any, files: Dict[str, SnapshotFile]) -> Any:
+    if isinstance(value, list):
+        return [load_value(v, files) for v in value]
+    if not isinstance(value, dict):
+        return value
+
+    kind = value["kind"]
+    if kind == "Location":
+        if value["file"] not in files:
+            files[value["file"]] = SnapshotFile(value["file"])
+        return Location(files[value["file"]], value["line"], value["col"], value["dur"])
+    if kind == "range":
+        return range(value["start"], value["stop"])
+    if kind == "regex":
+        return re.compile(value["pattern"], value["flags"])
+    if kind == "tuple":
+        return tuple(load_value(v, files) for v in value["items"])
+    cls = getattr(things_module, kind, None)
+    if not is_dataclass(cls):
+        raise OutputError(f"Unknown kind of thing '{kind}' in snapshot")
+    return cls(**{k: load_value(v, files) for k, v in value.items() if k != "kind"})
+
+def dump(things: List[SusThing]) -> dict:
+    return {"version": VERSION, "things": [dump_value(t) for t in things]}
+
+def load(data: dict) -> List[SusThing]:
+    if data.get("version") != VERSION:
+        raise OutputError(f"Unsupported snapshot version '{data.get('version')}'")
+    files = {}
+    return [load_value(t, files) for t in data["things"]]
+
+def load_file(file_path: str) -> List[SusThing]:
+    try:
+        with open(file_path, encoding="utf8") as f:
+            return load(json.load(f))
+    except (OSError, ValueError, KeyError, TypeError) as ex:
+        raise OutputError(f"Could not load snapshot '{file_path}': {ex}")
+
+def is_snapshot(file_path: str) -> bool:
+    return path.splitext(file_path)[1] == ".json"
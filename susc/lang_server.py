@@ -12,7 +12,7 @@ from pygls.lsp.types import (DidChangeTextDocumentParams, Diagnostic, Range,
                              TextDocumentPositionParams, Location)
 
 from .things import (SusBitfield, SusCompound, SusConfirmation, SusEntity, SusEnum, SusThing, SusField, SusType,
-                    SusValidator, SusMethod)
+                    SusValidator, SusMethod, BUILTIN_TYPES)
 from . import log
 from . import File, KNOWN_SETTINGS
 
@@ -25,8 +25,10 @@ def recompile_file(ls: LanguageServer, doc: VersionedTextDocumentIdentifier):
     global files
     source = ls.workspace.get_document(doc.uri).source
 
-    file = File()
-    files[doc.uri] = file
+    file = files.get(doc.uri)
+    if file is None:
+        file = File(incremental=True)
+        files[doc.uri] = file
 
     file.load_from_text(source, path)
     _, diagnostics = file.parse()
@@ -125,27 +127,27 @@ def completions(params: CompletionParams):
     items = []
 
     # types: built-ins, entities, compounds, enums, bitfields
-    if finding == "types":
-        for thing in file.things:
+    if finding == "types" and file.index:
+        for thing in file.index.of_kind(SusEntity, SusCompound, SusEnum, SusBitfield):
             kind = {
                 SusEntity: CompletionItemKind.Class,
                 SusCompound: CompletionItemKind.Struct,
                 SusEnum: CompletionItemKind.Enum,
                 SusBitfield: CompletionItemKind.Enum
-            }.get(type(thing), None)
-            if kind:
-                items.append(CompletionItem(label=thing.name, kind=kind))
+            }[type(thing)]
+            items.append(CompletionItem(label=thing.name, kind=kind))
         # built-in types
         items += [
-            CompletionItem(label=n, kind=CompletionItemKind.TypeParameter)
-            for n in ("Str", "Int", "List", "Bool")
+            CompletionItem(label=t.name, kind=CompletionItemKind.TypeParameter, documentation=t.docstring)
+            for t in BUILTIN_TYPES.values()
         ]
 
     # validators: all validators for all types
     if finding == "validators":
+        validators = {v: None for t in BUILTIN_TYPES.values() for v in t.validators}
         items += [
             CompletionItem(label=n, kind=CompletionItemKind.Property)
-            for n in ("val", "len", "match")
+            for n in validators
         ]
 
     # parameters: setting titles
@@ -167,19 +169,18 @@ def completions(params: CompletionParams):
         ]
 
     # errors: members of ErrorCode if it's defined
-    error_enums = [t for t in file.things if isinstance(t, SusEnum) and t.name == "ErrorCode"]
-    if finding == "errors" and len(error_enums):
-        enum = error_enums[0]
+    enum = file.index.find("ErrorCode", SusEnum) if file.index else None
+    if finding == "errors" and enum:
         items += [
             CompletionItem(label=path.basename(m.name), kind=CompletionItemKind.EnumMember)
             for m in enum.members
         ]
 
     # confirmations: all confirmations
-    if finding == "confirmations":
+    if finding == "confirmations" and file.index:
         items += [
             CompletionItem(label=path.basename(c.name), kind=CompletionItemKind.Constructor)
-            for c in file.things if isinstance(c, SusConfirmation)
+            for c in file.index.of_kind(SusConfirmation)
         ]
 
     log.verbose("Sending completions", "ls")
@@ -234,15 +235,9 @@ def display_thing(thing: SusThing):
 
 # finds the thing (that can be used as a type) from a token at that position
 def find_thing(params: TextDocumentPositionParams) -> tuple[str, SusThing]:
-    global foles
+    global files
     file = files[params.text_document.uri]
 
-    # list of things that can be used as types
-    things: list[SusThing] = []
-    for thing in file.things:
-        if isinstance(thing, (SusEntity, SusCompound, SusEnum, SusBitfield)):
-            things.append(thing)
-
     line = file.source.split("\n")[params.position.line]
     # find first non-alpha char to the left
     start = params.position.character
@@ -255,10 +250,9 @@ def find_thing(params: TextDocumentPositionParams) -> tuple[str, SusThing]:
 
     # find token
     token = line[start:end]
-    for thing in things:
-        if thing.name == token:
-            return token, thing
-    return token, None
+    if not file.index:
+        return token, None
+    return token, file.index.find(token, SusEntity, SusCompound, SusEnum, SusBitfield)
 
 @server.feature(HOVER)
 def hover(params: HoverParams):
@@ -274,11 +268,11 @@ def hover(params: HoverParams):
             contents.append(thing.docstring)
         return Hover(contents=contents)
         
-    if token in ("Str", "Int", "List", "Bool"):
+    if token in BUILTIN_TYPES:
         return Hover(contents=[MarkedString(
             language="sus",
             value = f"(built-in) {token}"
-        )])
+        ), BUILTIN_TYPES[token].docstring])
 
 @server.feature(DEFINITION)
 def definition(params: DefinitionParams):
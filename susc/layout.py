@@ -0,0 +1,162 @@
+from os import path
+from functools import lru_cache
+
+from .things import *
+from . import log
+from . import ir
+from .exceptions import *
+from .index import ProjectIndex
+from .wire import OPT_COUNT, OPT_ID
+
+# Analyzes how opt() values are laid out. Under the SpeedAPI encoding, a field
+# array with optional fields carries a count of the ones present and a
+# one-byte opt() value before every one of them, so the numbering doesn't
+# change the size of the header: opt(0) and opt(200) both take one byte. What
+# the numbering can get wrong is:
+#   - values of 256 and above wrap around, as they're sent in one byte
+#   - fields that were already deployed with some value have to keep it, and
+#     values of removed fields shouldn't be reused, as clients that still
+#     know the removed fields would mistake the new ones for them
+# The latter are checked against a snapshot of the previously deployed
+# revision of the project, set with `set opt_baseline <ir.json>`.
+OPT_VALUE = re.compile(r"opt\s*\(\s*(\d+)\s*\)")
+
+@dataclass
+class OptLayout():
+    name: str # name of the field set, e.g. 'User' or 'User.create:returns'
+    fields: List[SusField] # optional fields in the set
+    wrapped: Dict[str, int] # field name -> opt() value of 256 or more as written
+    moved: Dict[str, int] # field name -> deployed opt() value that it no longer has
+    reused: Dict[str, str] # field name -> removed field whose opt() value it took
+
+    @property
+    def ids(self) -> List[int]:
+        return sorted(f.optional for f in self.fields)
+
+    @property
+    def gaps(self) -> List[int]:
+        # unused values below the highest one
+        used = set(self.ids)
+        return [i for i in range(max(used, default=-1)) if i not in used]
+
+    @property
+    def header(self) -> Tuple[int, int]:
+        # with none and with all of the optional fields present
+        return OPT_COUNT, OPT_COUNT + OPT_ID * len(self.fields)
+
+    def to_json(self) -> dict:
+        return {"name": self.name, "ids": self.ids, "gaps": self.gaps,
+            "header": {"min": self.header[0], "max": self.header[1]},
+            "wrapped": self.wrapped, "moved": self.moved, "reused": self.reused}
+
+def named_field_sets(index: ProjectIndex) -> Dict[str, List[SusField]]:
+    sets = {}
+    for thing in index.things:
+        if isinstance(thing, SusEntity):
+            sets[thing.name] = thing.fields
+            for method in thing.methods:
+                sets[f"{thing.name}.{method.name}:parameters"] = method.parameters
+                sets[f"{thing.name}.{method.name}:returns"] = method.returns
+        elif isinstance(thing, SusMethod):
+            sets[f"{thing.name}:parameters"] = thing.parameters
+            sets[f"{thing.name}:returns"] = thing.returns
+        elif isinstance(thing, SusConfirmation):
+            sets[f"{thing.name}:request"] = thing.req_parameters
+            sets[f"{thing.name}:response"] = thing.resp_parameters
+        elif isinstance(thing, SusCompound):
+            sets[thing.name] = thing.fields
+    return sets
+
+def find_opt(field: SusField) -> Optional[re.Match]:
+    # the opt() value as written in the source; the linker takes it mod 256
+    source = getattr(field.location.file, "source", None)
+    if source is None or field.type_.location is None:
+        return None
+    offsets = line_offsets(source)
+    start = offsets[field.location.line - 1] + field.location.col - 1
+    end = offsets[field.type_.location.line - 1] + field.type_.location.col - 1
+    return OPT_VALUE.search(source, start, end)
+
+def layout(name: str, fields: List[SusField], old_fields: List[SusField]) -> OptLayout:
+    optional = [f for f in fields if f.optional is not None]
+
+    wrapped = {}
+    for field in optional:
+        match = find_opt(field)
+        if match is not None and int(match.group(1)) >= 256:
+            wrapped[field.name] = int(match.group(1))
+
+    deployed = {f.name: f.optional for f in old_fields if f.optional is not None}
+    names = {f.name for f in fields}
+    moved = {f.name: deployed[f.name] for f in fields if f.name in deployed and f.optional != deployed[f.name]}
+    removed = {v: n for n, v in deployed.items() if n not in names}
+    reused = {f.name: removed[f.optional] for f in optional if f.optional in removed}
+
+    return OptLayout(name, optional, wrapped, moved, reused)
+
+def analyze(index: ProjectIndex, baseline: ProjectIndex=None) -> List[OptLayout]:
+    old_sets = named_field_sets(baseline) if baseline else {}
+    layouts = []
+    for name, fields in named_field_sets(index).items():
+        if not any(f.optional is not None for f in fields):
+            continue
+        layouts.append(layout(name, fields, old_sets.get(name, [])))
+    return layouts
+
+def load_baseline(root_file) -> ProjectIndex:
+    # the snapshot set with `set opt_baseline`, relative to the root file
+    baseline = root_file.settings.get("opt_baseline")
+    if not baseline:
+        return None
+    if not path.isabs(baseline):
+        baseline = path.join(path.dirname(root_file.path), baseline)
+    try:
+        return ProjectIndex(ir.load_file(baseline))
+    except OutputError as ex:
+        log.warn(str(ex))
+        return None
+
+def fix(root_file) -> Tuple[int, int]:
+    # rewrites wrapped opt() values to the ones actually sent, and moves
+    # deployed fields back to their deployed values if those are free;
+    # returns the number of fields and files changed
+    layouts = analyze(root_file.index, load_baseline(root_file))
+    edits: Dict[Any, List[Tuple[SusField, int]]] = {} # file -> fields and new values
+    for opt_layout in layouts:
+        used = set(opt_layout.ids)
+        for field in opt_layout.fields:
+            value = None
+            if field.name in opt_layout.wrapped:
+                value = field.optional
+            if field.name in opt_layout.moved and opt_layout.moved[field.name] not in used:
+                value = opt_layout.moved[field.name]
+                used.add(value)
+            if value is not None:
+                edits.setdefault(field.location.file, []).append((field, value))
+
+    fields_changed, files_changed = 0, 0
+    for file, changes in edits.items():
+        if not path.isfile(file.path) or file.path.startswith(path.join(path.dirname(__file__), "stdlib")):
+            continue
+        files_changed += 1
+        source = file.source
+        # edit from the end so that earlier offsets stay valid
+        for field, value in sorted(changes, key=lambda c: (c[0].location.line, c[0].location.col), reverse=True):
+            match = find_opt(field)
+            if match is None:
+                log.warn(f"Could not find the opt() value of '{field.name}' in {file.path}:{field.location.line}")
+                continue
+            source = source[:match.start(1)] + str(value) + source[match.end(1):]
+            fields_changed += 1
+        with open(file.path, "w", encoding="utf8") as f:
+            f.write(source)
+        log.verbose(f"Renumbered {len(changes)} optional fields in {file.path}", "layout")
+
+    return fields_changed, files_changed
+
+@lru_cache(maxsize=None)
+def line_offsets(source: str) -> List[int]:
+    offsets = [0]
+    for line in source.split("\n"):
+        offsets.append(offsets[-1] + len(line) + 1)
+    return offsets
@@ -1,14 +1,36 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from os import cpu_count
+
 from .things import *
 from . import log
 from .exceptions import *
+from .index import ProjectIndex
 
 MAGIC_IDENTIFIERS = ["Entity"]
 
-def validate_fields(identifiers: List[str], field_sets: List[List[SusField]]) -> None:
+# projects with fewer fields than this are validated in this process
+PARALLEL_THRESHOLD = 50000
+# number of worker processes; None means one per CPU
+WORKERS = None
+
+def group_by(items: Iterable[Any], key: Callable[[Any], Hashable]) -> Dict[Hashable, List[Any]]:
+    # groups items by a key, keeping the original order within and across groups
+    groups = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+    return groups
+
+def validate_fields(checker: TypeChecker, field_sets: List[List[SusField]]) -> None:
     log.verbose("Validating fields", "linker")
     diag = []
 
     for fields in field_sets:
+        by_name = group_by(fields, lambda f: f.name)
+        # optional values are taken mod 256 one by one as the set is walked, so
+        # group them by the final value and compare the current one on lookup
+        by_optional = group_by([f for f in fields if f.optional != None], lambda f: f.optional % 256)
+
         for f1 in fields:
             # optional values mod 256
             if f1.optional != None and f1.optional >= 256:
@@ -17,44 +39,105 @@ def validate_fields(identifiers: List[str], field_sets: List[List[SusField]]) ->
                 f1.optional %= 256
 
             # the fields within one set shouldn't have matching names
-            equal = [f2 for f2 in fields if f2.name == f1.name]
-            if len(equal) > 1:
+            # (reported once per group, by its first member)
+            equal = by_name[f1.name]
+            if len(equal) > 1 and equal[0] is f1:
                 diag.append(Diagnostic([f.location for f in equal], DiagLevel.ERROR, 9,
                     f"Multiple fields with matching names '{f1.name}'"))
             
             # or values
-            equal = [f2 for f2 in fields if f2.optional == f1.optional and f1.optional != None]
-            if len(equal) > 1:
-                diag.append(Diagnostic([f.location for f in equal], DiagLevel.ERROR, 10,
-                    f"Multiple fields with matching opt() values '{f1.optional}'"))
+            if f1.optional != None:
+                equal = [f2 for f2 in by_optional[f1.optional] if f2.optional == f1.optional]
+                if len(equal) > 1:
+                    diag.append(Diagnostic([f.location for f in equal], DiagLevel.ERROR, 10,
+                        f"Multiple fields with matching opt() values '{f1.optional}'"))
 
             # validate the type
-            type_err = f1.type_.find_errors(identifiers)
+            type_err = checker.find_errors(f1.type_)
             if type_err != None:
                 diag.append(Diagnostic([f1.type_.location], DiagLevel.ERROR, 11, type_err))
 
     return diag
 
+# work shared with the worker processes; they are forked after it's set and
+# inherit it instead of receiving a pickled copy of the whole project
+_shards = None
+
+def shard_locations(fields: List[List[SusField]]) -> List[Location]:
+    return [l for s in fields for f in s for l in (f.location, f.type_.location)]
+
+def validate_shard(i: int) -> Tuple[list, list]:
+    checker, shards = _shards
+    field_sets = shards[i]
+    diag = validate_fields(checker, field_sets)
+
+    # locations can't be sent back as is, refer to them by their position in the shard
+    positions = {}
+    for pos, loc in enumerate(shard_locations(field_sets)):
+        positions.setdefault(id(loc), pos)
+    diag = [([positions[id(l)] for l in d.locations], d.level, d.code, d.message) for d in diag]
+    # and so can't the opt() values that were taken mod 256
+    optionals = [f.optional for s in field_sets for f in s]
+    return diag, optionals
+
+def validate_fields_parallel(checker: TypeChecker, field_sets: List[List[SusField]], workers: int) -> List[Diagnostic]:
+    global _shards
+    log.verbose(f"Validating fields in {workers} processes", "linker")
+
+    # split the sets into contiguous shards of about the same number of fields
+    # so that concatenating the results keeps the order of a sequential run
+    total = sum(len(s) for s in field_sets)
+    shards, shard, size = [], [], 0
+    for fields in field_sets:
+        shard.append(fields)
+        size += len(fields)
+        if size >= total / (workers * 4):
+            shards.append(shard)
+            shard, size = [], 0
+    if shard:
+        shards.append(shard)
+
+    _shards = (checker, shards)
+    try:
+        context = multiprocessing.get_context("fork")
+        with ProcessPoolExecutor(workers, mp_context=context) as pool:
+            results = list(pool.map(validate_shard, range(len(shards))))
+    finally:
+        _shards = None
+
+    diag = []
+    for shard, (shard_diag, optionals) in zip(shards, results):
+        locations = shard_locations(shard)
+        for d_locs, level, code, message in shard_diag:
+            diag.append(Diagnostic([locations[l] for l in d_locs], level, code, message))
+        for field, optional in zip((f for s in shard for f in s), optionals):
+            field.optional = optional
+    return diag
+
+def validate_fields_auto(checker: TypeChecker, field_sets: List[List[SusField]]) -> List[Diagnostic]:
+    # large projects are validated by a pool of processes if the platform can fork
+    workers = WORKERS or cpu_count() or 1
+    fields = sum(len(s) for s in field_sets)
+    if workers < 2 or fields < PARALLEL_THRESHOLD or "fork" not in multiprocessing.get_all_start_methods():
+        return validate_fields(checker, field_sets)
+    return validate_fields_parallel(checker, field_sets, workers)
+
 def combine(things: List[SusThing]) -> Tuple[list[SusThing], list[Diagnostic]]:
     log.verbose(f"Combining {len(things)} total definitions", "linker")
     diag = []
-    ignore, out = [], []
-
-    for thing1 in things:
-        if thing1.name in ignore:
-            continue
+    out = []
 
-        # find things with same name
-        with_matching_name = [thing2 for thing2 in things if thing2.name == thing1.name]
+    # find things with same name
+    for with_matching_name in group_by(things, lambda t: t.name).values():
+        thing1 = with_matching_name[0]
 
         if len(with_matching_name) > 1:
             # diagnose redefinitions
-            fine = True
-            for thing2 in with_matching_name:
-                if type(thing1) != type(thing2) or not isinstance(thing1, (SusEnum, SusBitfield)):
-                    diag.append(Diagnostic([t.location for t in with_matching_name], DiagLevel.ERROR, 12,
-                        f"Redefinition of '{thing1.name}' (only enums and bitfields can be combined)"))
-                    fine = False
+            fine = isinstance(thing1, (SusEnum, SusBitfield)) and\
+                all(type(thing2) == type(thing1) for thing2 in with_matching_name)
+            if not fine:
+                diag.append(Diagnostic([t.location for t in with_matching_name], DiagLevel.ERROR, 12,
+                    f"Redefinition of '{thing1.name}' (only enums and bitfields can be combined)"))
 
             if fine:
                 # match sizes
@@ -69,14 +152,13 @@ def combine(things: List[SusThing]) -> Tuple[list[SusThing], list[Diagnostic]]:
 
                 # finally, combine all members
                 constructor = SusEnum if isinstance(thing1, SusEnum) else SusBitfield
-                doc = (thing1.docstring or "") + "\n" + (thing2.docstring or "")
+                doc = (thing1.docstring or "") + "\n" + (with_matching_name[-1].docstring or "")
                 if doc == "\n": doc = None
                 new_thing = constructor(thing1.location, doc, thing1.name, thing1.size, opt_members)
                 out.append(new_thing)
                 log.verbose(f"{Fore.LIGHTBLACK_EX}Combined {constructor.__name__[3:].lower()} {Fore.WHITE}{thing1.name}{Fore.LIGHTBLACK_EX} members across {len(with_matching_name)} definitions: {Fore.WHITE}{new_thing}", "linker")
         else:
             out.append(thing1)
-        ignore.append(thing1.name)
 
         # check numeric values
         if isinstance(thing1, (SusEnum, SusBitfield)):
@@ -95,26 +177,32 @@ def combine(things: List[SusThing]) -> Tuple[list[SusThing], list[Diagnostic]]:
     log.verbose(f"Combined {len(things)} definitions into {len(out)} things", "linker")
     return out, diag
 
-def validate_method_meta(things: List[SusThing], method_sets: List[List[SusMethod]]) -> None:
+def validate_method_meta(index: ProjectIndex, method_sets: List[List[SusMethod]]) -> None:
     log.verbose("Validating method metdata", "linker")
     diag = []
 
-    errors = [t for t in things if isinstance(t, SusEnum) and t.name == "ErrorCode"]
-    confirmations = [t.name for t in things if isinstance(t, SusConfirmation)]
+    errors = index.find("ErrorCode", SusEnum)
 
     for m_set in method_sets:
         for method in m_set:
+            if method.stream and len(method.returns) == 1:
+                diag.append(Diagnostic([method.location], DiagLevel.ERROR, 29,
+                    f"Streaming method '{method.name}' returns nothing but its cursor"))
+            if method.stream and method.confirmations:
+                diag.append(Diagnostic([method.location], DiagLevel.ERROR, 30,
+                    f"Streaming method '{method.name}' can't require confirmations"))
+
             for conf in method.confirmations:
-                if conf not in confirmations:
+                if index.find(conf, SusConfirmation) is None:
                     diag.append(Diagnostic([method.location], DiagLevel.ERROR, 14, f"Undefined confirmation '{conf}'"))
 
-            if len(method.errors) > 0 and len(errors) == 0:
+            if len(method.errors) > 0 and errors is None:
                 diag.append(Diagnostic([method.location], DiagLevel.WARN, 15,
                     "No 'ErrorCode' enum defined. Include 'impostor.sus' or use a custom definition"))
                 continue
             if len(method.errors) == 0:
                 continue
-            error_names = [m.name for m in errors[0].members]
+            error_names = {m.name for m in errors.members}
 
             for err in method.errors:
                 if err not in error_names:
@@ -126,47 +214,123 @@ def validate_values(entities: List[SusEntity], method_sets: List[List[SusMethod]
     log.verbose("Validating numeric values", "linker")
     diag = []
 
+    # groups of things with matching values are reported once, by their first member
+    by_value = group_by(entities, lambda t: t.value)
     for thing in entities:
-        matching = [t for t in entities if t.value == thing.value]
-        if len(matching) != 1:
-            diag.append(Diagnostic([t.location for t in matching], DiagLevel.ERROR, 17,
-                f"Multiple entities with matching values '{thing.value}'"))
-
-        # check ID field
-        id_field = [f for f in thing.fields if f.name == "id"]
-        if not id_field:
-            diag.append(Diagnostic([thing.location], DiagLevel.ERROR, 18, f"No 'id' field"))
-        else:
-            id_field = id_field[0]
-            if id_field.optional != None:
-                diag.append(Diagnostic([id_field.location], DiagLevel.ERROR, 18, f"'id' field can't be optional"))
+        matching = by_value[thing.value]
+        if len(matching) != 1 and matching[0] is thing:
+            diag.append(value_clash(matching, "entities"))
+        diag += validate_id_field(thing)
+        diag += validate_subscription(thing)
+        diag += validate_generated(thing)
 
     for m_set in method_sets:
+        by_value = group_by(m_set, lambda t: t.value)
         for method in m_set:
-            matching = [t for t in m_set if t.value == method.value]
-            if len(matching) != 1:
-                diag.append(Diagnostic([t.location for t in matching], DiagLevel.ERROR, 17,
-                    f"Multiple methods with matching values '{method.value}'"))
+            matching = by_value[method.value]
+            if len(matching) != 1 and matching[0] is method:
+                diag.append(value_clash(matching, "methods"))
 
+    by_value = group_by(confirmations, lambda t: t.value)
     for thing in confirmations:
-        matching = [t for t in confirmations if t.value == thing.value]
-        if len(matching) != 1:
-            diag.append(Diagnostic([t.location for t in matching], DiagLevel.ERROR, 17,
-                f"Multiple confirmations with matching values '{thing.value}'"))
+        matching = by_value[thing.value]
+        if len(matching) != 1 and matching[0] is thing:
+            diag.append(value_clash(matching, "confirmations"))
     
     return diag
 
+def value_clash(matching: List[SusThing], noun: str) -> Diagnostic:
+    return Diagnostic([t.location for t in matching], DiagLevel.ERROR, 17,
+        f"Multiple {noun} with matching values '{matching[0].value}'")
+
+def validate_id_field(entity: SusEntity) -> List[Diagnostic]:
+    id_field = [f for f in entity.fields if f.name == "id"]
+    if not id_field:
+        return [Diagnostic([entity.location], DiagLevel.ERROR, 18, f"No 'id' field")]
+    id_field = id_field[0]
+    if id_field.optional != None:
+        return [Diagnostic([id_field.location], DiagLevel.ERROR, 18, f"'id' field can't be optional")]
+    return []
+
+def validate_subscription(entity: SusEntity) -> List[Diagnostic]:
+    # the generated methods take values of their own; clashes are reported
+    # here instead of as plain value clashes, which the entity location
+    # listed first makes deduplicate() drop
+    if entity.subscription is None:
+        return []
+    generated = {m.name for m in entity.methods if m.location is entity.location}
+    if "subscribe" not in generated:
+        if "id" in [f.name for f in entity.fields]:
+            return [Diagnostic([entity.subscription.location], DiagLevel.WARN, 35,
+                f"'{entity.name}' has no fields other than 'id' to subscribe to")]
+        return []
+
+    diag = []
+    for method in entity.methods:
+        if method.static or method.location is entity.location:
+            continue
+        for name, value in SUBSCRIPTION_METHODS.items():
+            if method.value == value:
+                diag.append(Diagnostic([entity.location, method.location], DiagLevel.ERROR, 34,
+                    f"Value '{value}' of method '{method.name}' is reserved for the generated '{name}' method of subscribable entities"))
+    return diag
+
+def validate_generated(entity: SusEntity) -> List[Diagnostic]:
+    # like validate_subscription(), for the standard methods and those of
+    # `generate` directives; every clash is reported, each one at the method
+    # that takes the value
+    generated = {m.name for m in entity.methods if m.location is entity.location}
+    diag = []
+    for method in entity.methods:
+        if method.location is entity.location:
+            continue
+        for name, (static, value) in {**STANDARD_METHODS, **GENERATED_METHODS}.items():
+            if name in generated and method.static == static and method.value == value:
+                diag.append(Diagnostic([entity.location, method.location], DiagLevel.ERROR, 37,
+                    f"Value '{value}' of method '{method.name}' is reserved for the generated '{name}' method"))
+    return diag
+
+def validate_projection(entity: SusEntity, defined: List[SusThing]) -> List[Diagnostic]:
+    # the bitfield generated for 'get_fields' and 'subscribe' is named like a
+    # type of the project could be; `defined` are the things of its name
+    if not any(t.location is entity.location for t in defined):
+        return []
+    others = [t for t in defined if t.location is not entity.location]
+    if not others:
+        return []
+    return [Diagnostic([t.location for t in others] + [entity.location], DiagLevel.ERROR, 36,
+        f"'{entity.name}Fields' is generated for the fields of entity '{entity.name}'; rename this definition")]
+
+def validate_caches(thing: SusThing) -> List[Diagnostic]:
+    # the cache of an entity applies to its 'get' method, which shares it
+    diag = []
+    caches = []
+    if isinstance(thing, SusEntity):
+        if thing.cache is not None:
+            caches.append((thing.cache, None))
+        caches += [(m.cache, m) for m in thing.methods if m.cache is not None and m.cache is not thing.cache]
+    elif isinstance(thing, SusMethod) and thing.cache is not None:
+        caches.append((thing.cache, thing))
+
+    for cache, method in caches:
+        if cache.ttl == 0:
+            diag.append(Diagnostic([cache.location], DiagLevel.ERROR, 27, "Cache TTL must be positive"))
+        if method is not None and not method.returns:
+            diag.append(Diagnostic([cache.location], DiagLevel.WARN, 28,
+                f"Method '{method.name}' returns nothing, there's nothing to cache"))
+    return diag
+
 def strip_docstrings(things: List[SusThing]) -> List[SusThing]:
     for thing in things:
         doc = thing.docstring
         thing.docstring = doc.strip() if doc else None
     return things
 
-def run(things: List[SusThing]) -> List[SusThing]:
+def run(things: List[SusThing]) -> Tuple[List[SusThing], List[Diagnostic], ProjectIndex]:
     log.verbose("Running linker", "linker")
 
     # get all identifiers that can be referenced
-    identifiers = [t.name for t in things if not isinstance(t, SusMethod)] + MAGIC_IDENTIFIERS
+    identifiers = {t.name for t in things if not isinstance(t, SusMethod)} | set(MAGIC_IDENTIFIERS)
     # get all possible fields: entity fields, method params and method return vals
     entities = [t for t in things if isinstance(t, SusEntity)]
     methods = [t for t in things if isinstance(t, SusMethod)]
@@ -185,13 +349,25 @@ def run(things: List[SusThing]) -> List[SusThing]:
         method_sets.append([m for m in e.methods if m.static])
         method_sets.append([m for m in e.methods if not m.static])
 
-    # run substeps collecting diagnostics
-    things, diag = combine(things)
-    diag += validate_fields(identifiers, field_sets)
-    diag += validate_method_meta(things, method_sets)
+    # run substeps collecting diagnostics; clashes with generated names go
+    # first, so that they take the place of the plain redefinition errors
+    by_name = group_by(things, lambda t: t.name)
+    diag = []
+    for e in entities:
+        diag += validate_projection(e, by_name.get(f"{e.name}Fields", []))
+    things, combine_diag = combine(things)
+    diag += combine_diag
+    index = ProjectIndex(things)
+    diag += validate_fields_auto(TypeChecker(identifiers), field_sets)
+    diag += validate_method_meta(index, method_sets)
     diag += validate_values(entities, method_sets, confirmations)
+    for thing in method_sets[0] + entities:
+        diag += validate_caches(thing)
     things = strip_docstrings(things)
 
+    return things, deduplicate(diag), index
+
+def deduplicate(diag: List[Diagnostic]) -> List[Diagnostic]:
     # sort by severity
     diag = sorted(diag, key=lambda d: d.level.value)
 
@@ -207,4 +383,4 @@ def run(things: List[SusThing]) -> List[SusThing]:
         if not has_duplicates:
             deduplicated.append(d)
 
-    return things, deduplicated
\ No newline at end of file
+    return deduplicated
\ No newline at end of file
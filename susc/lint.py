@@ -0,0 +1,137 @@
+from .things import *
+from . import log
+from .exceptions import *
+from .index import ProjectIndex
+from .wire import SizeAnalyzer
+from .layout import analyze as analyze_layout
+
+# Opt-in diagnostics for performance hazards. Enabled per project with
+#   set lint unbounded,wide_int
+# or `set lint all`. `set lint_level error` turns them into errors so that CI
+# can gate on them, and `set lint_get_size <bytes>` adjusts the threshold of
+# the `get_size` lint. The `opt_layout` lint takes previously deployed opt()
+# values from the snapshot set with `set opt_baseline <ir.json>`.
+LINTS = {
+    "unbounded": 19,   # Str, Bin or List without a `len` validator
+    "wide_int": 20,    # Int or VarInt wider than 4 bytes
+    "nested_list": 21, # List(List(...))
+    "get_size": 22,    # auto-generated `get` returns large payloads
+    "rate_limit": 23,  # method without a `ratelimit`
+    "opt_layout": 26,  # opt() values that break deployed clients
+}
+DEFAULT_GET_SIZE = 16384
+MAX_INT_SIZE = 4
+
+def enabled_lints(settings: Dict[str, str], location: Location=None) -> Tuple[List[str], List[Diagnostic]]:
+    # `location` is that of the value of the `lint` setting
+    value = settings.get("lint", "")
+    if value == "all":
+        return list(LINTS), []
+    names, diag = [], []
+    offset = 0
+    for name in value.split(","):
+        if name in LINTS:
+            names.append(name)
+        elif name and location is not None:
+            diag.append(Diagnostic([Location(location.file, location.line, location.col + offset, len(name))],
+                DiagLevel.WARN, 38, f"Unknown lint '{name}'"))
+        offset += len(name) + 1
+    return names, diag
+
+def list_depth(type_: SusTypeBase) -> int:
+    if not isinstance(type_, SusType) or type_.name != "List":
+        return 0
+    return 1 + list_depth(type_.args[0])
+
+def is_generated(method: SusMethod, entity: SusEntity) -> bool:
+    # `get` and `update` are generated with the location of their entity
+    return method.location is entity.location
+
+def user_field_sets(thing: SusThing) -> List[List[SusField]]:
+    if isinstance(thing, SusEntity):
+        return [thing.fields] + [s for m in thing.methods if not is_generated(m, thing)
+            for s in (m.parameters, m.returns)]
+    if isinstance(thing, SusMethod):
+        return [thing.parameters, thing.returns]
+    if isinstance(thing, SusConfirmation):
+        return [thing.req_parameters, thing.resp_parameters]
+    if isinstance(thing, SusCompound):
+        return [thing.fields]
+    return []
+
+def lint_type(type_: SusTypeBase, lints: List[str], level: DiagLevel) -> List[Diagnostic]:
+    if not isinstance(type_, SusType):
+        return []
+    diag = []
+
+    if "unbounded" in lints and type_.name in ("Str", "Bin", "List"):
+        if not any(v.param == "len" for v in type_.validators):
+            diag.append(Diagnostic([type_.location], level, LINTS["unbounded"],
+                f"'{type_.name}' without a 'len' validator may be arbitrarily large"))
+
+    if "wide_int" in lints and type_.name in ("Int", "VarInt") and type_.args and isinstance(type_.args[0], int):
+        if type_.args[0] > MAX_INT_SIZE:
+            diag.append(Diagnostic([type_.location], level, LINTS["wide_int"],
+                f"'{type_.name}({type_.args[0]})' is wider than {MAX_INT_SIZE} bytes and will be represented as a BigInteger in TypeScript"))
+
+    if "nested_list" in lints and list_depth(type_) > 1:
+        diag.append(Diagnostic([type_.location], level, LINTS["nested_list"],
+            f"'List' nested {list_depth(type_)} levels deep"))
+        # don't report the inner lists again
+        while isinstance(type_, SusType) and type_.name == "List":
+            type_ = type_.args[0]
+        return diag + lint_type(type_, [l for l in lints if l != "nested_list"], level)
+
+    for arg in type_.args:
+        diag += lint_type(arg, lints, level)
+    return diag
+
+def run(index: ProjectIndex, settings: Dict[str, str], lints: List[str], baseline: ProjectIndex=None) -> List[Diagnostic]:
+    if not lints:
+        return []
+    log.verbose(f"Running lints: {', '.join(lints)}", "lint")
+    level = DiagLevel.ERROR if settings.get("lint_level") == "error" else DiagLevel.WARN
+    diag = []
+
+    for thing in index.things:
+        for fields in user_field_sets(thing):
+            for field in fields:
+                diag += lint_type(field.type_, lints, level)
+
+    if "rate_limit" in lints:
+        methods = [(m, None) for m in index.of_kind(SusMethod)]
+        methods += [(m, e) for e in index.of_kind(SusEntity) for m in e.methods]
+        for method, entity in methods:
+            if method.rate_limit is None and not (entity and is_generated(method, entity)):
+                diag.append(Diagnostic([method.location], level, LINTS["rate_limit"],
+                    f"Method '{method.name}' has no rate limit"))
+
+    if "get_size" in lints:
+        try: limit = int(settings.get("lint_get_size", DEFAULT_GET_SIZE))
+        except ValueError:
+            log.warn("'lint_get_size' is not a number")
+            limit = DEFAULT_GET_SIZE
+        analyzer = SizeAnalyzer(index)
+        for entity in index.of_kind(SusEntity):
+            if index.id_field(entity.name) is None:
+                continue
+            size = analyzer.named_size(entity)
+            if size.max is None:
+                diag.append(Diagnostic([entity.location], level, LINTS["get_size"],
+                    f"'{entity.name}.get' may return an arbitrarily large payload"))
+            elif size.max > limit:
+                diag.append(Diagnostic([entity.location], level, LINTS["get_size"],
+                    f"'{entity.name}.get' may return up to {size.max} bytes (more than {limit})"))
+
+    if "opt_layout" in lints:
+        # wrapped values are reported by the linker (code 8)
+        for opt_layout in analyze_layout(index, baseline):
+            for field in opt_layout.fields:
+                if field.name in opt_layout.moved:
+                    diag.append(Diagnostic([field.location], level, LINTS["opt_layout"],
+                        f"'{field.name}' was deployed as opt({opt_layout.moved[field.name]}), moving it breaks wire compatibility"))
+                if field.name in opt_layout.reused:
+                    diag.append(Diagnostic([field.location], level, LINTS["opt_layout"],
+                        f"opt({field.optional}) belonged to the removed field '{opt_layout.reused[field.name]}', clients that still know it will misread '{field.name}'"))
+
+    return diag
@@ -9,7 +9,7 @@ SUS_COLORS = {
     "/.+/[ims]{0,3}": Fore.LIGHTCYAN_EX,
     "#.*$": Fore.LIGHTBLACK_EX,
     "\\b([0-9]+|false|true|([0-9]+(y|mo|d|h|m|s|ms)))\\b": Fore.LIGHTYELLOW_EX,
-    "\\b(enum|bitfield|confirmation|entity|opt|cache|hard|soft|method|staticmethod|globalmethod|compound|request|response|returns|errors|confirmations|states|ratelimit|every)\\b": Fore.MAGENTA,
+    "\\b(enum|bitfield|confirmation|entity|opt|cache|hard|soft|method|staticmethod|globalmethod|compound|request|response|returns|stream|subscribe|generate|errors|confirmations|states|ratelimit|every)\\b": Fore.MAGENTA,
     "[.,;:]": Fore.LIGHTBLUE_EX,
     "\\b[a-z][a-z_]*\\b": Fore.WHITE,
     "\\b[A-Z][A-Za-z]*\\b": Fore.YELLOW,
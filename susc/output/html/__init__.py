@@ -146,11 +146,35 @@ def write_field(f, field: SusField, title: str, css_class: str):
     f.write("\t\t<div class='thing-member'>\n")
     f.write(f"\t\t\t<h3>{title}: <code class='{css_class}'>{field.name}</code></h3>\n")
     f.write(format_docstring(field.docstring, indentation=3))
-    f.write(f"\t\t\t<div class='thing-param'>Type: <code>{format_type(field.type_)}</code></div>\n")
+    builtin = BUILTIN_TYPES.get(field.type_.name)
+    title = f" title='{builtin.docstring}'" if builtin else ""
+    f.write(f"\t\t\t<div class='thing-param'>Type: <code{title}>{format_type(field.type_)}</code></div>\n")
     if field.optional is not None:
         f.write(f"\t\t\t<div class='thing-param'>Optional ID: {field.optional}</div>\n")
     f.write("\t\t</div>\n")
 
+def format_cache(cache: SusCache):
+    refresh = "refreshed in the background" if cache.mode == "soft" else "fetched again"
+    return f"<code>{cache.mode}</code>, {format_duration(cache.ttl)} (expired results are {refresh})"
+
+def format_compression(compression: SusCompression):
+    if compression.mode == "none":
+        return "<code>none</code>"
+    if not compression.threshold:
+        return f"<code>{compression.mode}</code>, all payloads"
+    return f"<code>{compression.mode}</code>, payloads of {compression.threshold} bytes or more"
+
+def format_subscription(subscription: SusSubscription):
+    if not subscription.interval:
+        return "every change is sent"
+    return f"changes are sent at most every {format_duration(subscription.interval)}"
+
+def format_duration(ms: int):
+    for unit, size in [("d", 24 * 3600 * 1000), ("h", 3600 * 1000), ("m", 60 * 1000), ("s", 1000)]:
+        if ms % size == 0:
+            return f"{ms // size}{unit}"
+    return f"{ms}ms"
+
 def transform_cond_list(l):
     return ", ".join(f"<code class='field'>{m}</code>" for m in l)
 def write_method(f, method: SusMethod, write_header=True):
@@ -166,6 +190,13 @@ def write_method(f, method: SusMethod, write_header=True):
         f.write(f"\t\t\t<{value_elm} class='thing-param'>Errors: {transform_cond_list(method.errors)}</{value_elm}>\n")
     if method.confirmations:
         f.write(f"\t\t\t<{value_elm} class='thing-param'>Confirmations: {transform_cond_list(method.confirmations)}</{value_elm}>\n")
+    if method.cache:
+        f.write(f"\t\t\t<{value_elm} class='thing-param'>Cache: {format_cache(method.cache)}</{value_elm}>\n")
+    if method.compression:
+        f.write(f"\t\t\t<{value_elm} class='thing-param'>Compression: {format_compression(method.compression)}</{value_elm}>\n")
+    if method.stream:
+        f.write(f"\t\t\t<{value_elm} class='thing-param'>Streaming: return values are sent in chunks, " +\
+            f"the method is called again with the <code class='param'>cursor</code> of every chunk but the last one</{value_elm}>\n")
 
     for param in method.parameters:
         write_field(f, param, "parameter", "param")
@@ -190,6 +221,12 @@ def write_thing(f, thing: SusThing):
     elif isinstance(thing, SusEntity):
         f.write(format_docstring(thing.docstring))
         f.write(f"\t\t<h3 class='thing-param'>Value: {thing.value}</h3>\n")
+        if thing.cache:
+            f.write(f"\t\t<h3 class='thing-param'>Cache: {format_cache(thing.cache)}</h3>\n")
+        if thing.compression:
+            f.write(f"\t\t<h3 class='thing-param'>Compression: {format_compression(thing.compression)}</h3>\n")
+        if thing.subscription:
+            f.write(f"\t\t<h3 class='thing-param'>Subscriptions: {format_subscription(thing.subscription)}</h3>\n")
         for field in thing.fields:
             write_field(f, field, "field", "field")
         for method in thing.methods:
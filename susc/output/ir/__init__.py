@@ -0,0 +1,9 @@
+from susc import File, log
+from susc.ir import dump
+from os import path
+import json
+
+def write_output(root_file: File, target_dir: str) -> None:
+    log.verbose(f"Saving a snapshot of {len(root_file.things)} things", "ir")
+    with open(path.join(target_dir, "ir.json"), "w") as f:
+        json.dump(dump(root_file.things), f, indent=1)
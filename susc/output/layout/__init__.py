@@ -0,0 +1,42 @@
+from susc import File, log
+from susc.layout import analyze, load_baseline
+from os import path
+import json
+
+def format_ids(ids) -> str:
+    # collapses runs of consecutive values, e.g. "0-3, 7"
+    runs = []
+    for i in ids:
+        if runs and runs[-1][1] == i - 1:
+            runs[-1][1] = i
+        else:
+            runs.append([i, i])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in runs)
+
+def write_output(root_file: File, target_dir: str) -> None:
+    baseline = load_baseline(root_file)
+    layouts = analyze(root_file.index, baseline)
+    log.verbose(f"Analyzed {len(layouts)} field sets with optional fields", "layout")
+
+    with open(path.join(target_dir, "layout.json"), "w") as f:
+        json.dump({"baseline": baseline is not None, "field_sets": [l.to_json() for l in layouts]}, f, indent=4)
+
+    with open(path.join(target_dir, "layout.txt"), "w") as f:
+        f.write("Optional field layout; header sizes in bytes\n")
+        f.write("The header is a count of the optional fields present and their one-byte opt() values,\n")
+        f.write("so the numbering doesn't change its size\n")
+        if baseline is None:
+            f.write("No baseline snapshot set, deployed opt() values are not checked\n")
+        for l in layouts:
+            f.write(f"\n{l.name}\n")
+            f.write(f"  opt() values: {format_ids(l.ids)}\n")
+            if l.gaps:
+                f.write(f"  unused:       {format_ids(l.gaps)}\n")
+            f.write(f"  header:       {l.header[0]} to {l.header[1]}\n")
+            for name, value in l.wrapped.items():
+                f.write(f"  wrapped:      {name}: opt({value}) is sent as opt({value % 256})\n")
+            for field in l.fields:
+                if field.name in l.moved:
+                    f.write(f"  moved:        {field.name}: deployed as opt({l.moved[field.name]}), now opt({field.optional}), which breaks compatibility\n")
+            for name, old in l.reused.items():
+                f.write(f"  reused:       {name} took the opt() value of the removed field '{old}'\n")
@@ -0,0 +1,49 @@
+from susc import File, log
+from susc.things import *
+from os import path
+import json
+
+# Rate limits of every method for gateways to enforce. `ratelimit N every T;`
+# becomes a token bucket that holds N tokens and gets one back every T/N, so
+# that bursts of up to N calls go through and the average rate stays at N
+# calls per T. Methods are identified by their values as they go over the
+# wire: static entity methods are at +128, as in the TS backend
+
+def bucket(rate_limit: Optional[Tuple[int, int]]) -> Optional[dict]:
+    if rate_limit is None:
+        return None
+    amount, window = rate_limit
+    # `ratelimit 0 every T;` blocks the method and a zero window doesn't limit it
+    return {"capacity": amount,
+        "refill_per_second": amount * 1000 / window if window else None,
+        "refill_interval_ms": window / amount if amount else None}
+
+def method_entry(method: SusMethod, kind: str, name: str, entity: SusEntity=None) -> dict:
+    value = method.value + (128 if method.static else 0) if entity else method.value
+    return {
+        "name": name,
+        "kind": kind,
+        "value": value,
+        "entity": entity.name if entity else None,
+        "entity_value": entity.value if entity else None,
+        "rate_limit": {"amount": method.rate_limit[0], "window_ms": method.rate_limit[1]} if method.rate_limit else None,
+        "bucket": bucket(method.rate_limit),
+    }
+
+def manifest(root_file: File) -> dict:
+    methods = []
+    for method in root_file.index.of_kind(SusMethod):
+        methods.append(method_entry(method, "global", method.name))
+    for entity in root_file.index.of_kind(SusEntity):
+        for method in entity.methods:
+            kind = "static" if method.static else "dynamic"
+            methods.append(method_entry(method, kind, f"{entity.name}.{method.name}", entity))
+    return {"methods": methods}
+
+def write_output(root_file: File, target_dir: str) -> None:
+    result = manifest(root_file)
+    limited = sum(m["rate_limit"] is not None for m in result["methods"])
+    log.verbose(f"{limited} of {len(result['methods'])} methods are rate limited", "ratelimit")
+
+    with open(path.join(target_dir, "ratelimit.json"), "w") as f:
+        json.dump(result, f, indent=4)
@@ -0,0 +1,31 @@
+from susc import File, log
+from susc.things import *
+from susc.wire import analyze
+from os import path
+import json
+
+COLUMNS = [("kind", "Kind"), ("name", "Name"), ("part", "Part"), ("min", "Min"), ("max", "Max"), ("typical", "Typical")]
+
+def format_table(rows: List[dict]) -> str:
+    cells = [[title for _, title in COLUMNS]]
+    for row in rows:
+        cells.append([("unbounded" if row[key] is None else str(row[key])) for key, _ in COLUMNS])
+    widths = [max(len(line[i]) for line in cells) for i in range(len(COLUMNS))]
+
+    lines = []
+    for line in cells:
+        # left-align text, right-align sizes
+        lines.append("  ".join(c.ljust(w) if i < 3 else c.rjust(w)
+            for i, (c, w) in enumerate(zip(line, widths))).rstrip())
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines) + "\n"
+
+def write_output(root_file: File, target_dir: str) -> None:
+    rows = analyze(root_file.index)
+    log.verbose(f"Computed sizes of {len(rows)} messages", "sizes")
+
+    with open(path.join(target_dir, "sizes.json"), "w") as f:
+        json.dump({"unit": "bytes", "messages": rows}, f, indent=4)
+    with open(path.join(target_dir, "sizes.txt"), "w") as f:
+        f.write("Wire sizes in bytes, excluding transport framing\n\n")
+        f.write(format_table(rows))
@@ -1,10 +1,15 @@
 from posixpath import dirname
 from textwrap import indent
 from typing import *
-from susc import File
+from susc import File, GET_MANY_LIMIT
 from susc.things import *
+from susc.index import ProjectIndex, field_sets_of, referenced_names
+from contextlib import contextmanager
+from susc.compression import default_policy, effective_policy
+from susc.output.ts.codecs import Codec, write_codecs
 from os import makedirs, path, write
 from susc import log
+from susc.exceptions import OutputError
 from colorama import Fore
 from nanoid import generate as nanoid
 
@@ -46,22 +51,23 @@ def type_validators(type_: SusType):
     if len(vals) == 0:
         return "{}"
     return "{ " + ', '.join(vals) + " }"
-def type_to_speedapi(type_: SusType, obj_types: Dict[str, str]) -> str:
+def type_to_speedapi(type_: SusType, index: ProjectIndex) -> str:
     if type_.name == "List":
-        elements = type_to_speedapi(type_.args[0], obj_types)
+        elements = type_to_speedapi(type_.args[0], index)
         return f"new speedapi.repr.List({elements}, {type_.args[1]}, {type_validators(type_)})"
     if type_.name == "Entity":
         return "new speedapi.repr.Entity()"
 
-    if type_.name in obj_types:
-        # determine the type of the object from its name
+    thing = index.find(type_.name, SusEntity, SusBitfield, SusEnum, SusConfirmation, SusCompound)
+    if thing is not None:
+        # determine the type of the object from its kind
         t_name = {
-            "entities": "Entity",
-            "bitfields": "EnumOrBf",
-            "enums": "EnumOrBf",
-            "confirmations": "Confirmation",
-            "compounds": "Compound"
-        }[obj_types[type_.name]]
+            SusEntity: "Entity",
+            SusBitfield: "EnumOrBf",
+            SusEnum: "EnumOrBf",
+            SusConfirmation: "Confirmation",
+            SusCompound: "Compound"
+        }[type(thing)]
 
         if t_name == "Entity":
             return "new speedapi.repr.Entity()"
@@ -80,6 +86,104 @@ def type_to_speedapi(type_: SusType, obj_types: Dict[str, str]) -> str:
 
     return f"new speedapi.repr.{name}({', '.join([str(x) for x in type_.args] + [''])}{type_validators(type_)})"
 
+# builtin types that the driver has no representation of, and the ones to
+# use instead
+UNSUPPORTED_TYPES = {"VarInt": "Int", "Array": "List"}
+
+def check_types(things: List[SusThing]):
+    for thing in things:
+        for fields in field_sets_of(thing):
+            for field in fields:
+                for name in referenced_names(field.type_) & UNSUPPORTED_TYPES.keys():
+                    raise OutputError(f"Field '{field.name}' of '{thing.name}' is of type '{name}', which "
+                        f"@speedapi/driver can't represent yet; use '{UNSUPPORTED_TYPES[name]}' with the TypeScript output")
+
+# sizes of the dispatch tables (`set ts_dispatch dense`): the value ranges
+# of global methods, entities, entity methods (static ones at value + 128)
+# and confirmations
+METHOD_VALUES = 128
+ENTITY_VALUES = 128
+ENTITY_METHOD_VALUES = 256
+CONFIRMATION_VALUES = 16
+
+IMPORT_DRIVER = "import * as speedapi from \"@speedapi/driver\";\n"
+
+class ModuleWriter():
+    # writes every definition to index.ts or, with `set ts_modules split`, to
+    # a module of its own that the index re-exports. Bundlers can then leave
+    # out the modules that aren't used and tsc only rechecks the changed ones
+    def __init__(self, target_dir: str, header: str, split: bool):
+        self.target_dir = target_dir
+        self.header = header
+        self.split = split
+        self.modules: List[str] = []
+        self.index = open(path.join(target_dir, "index.ts"), "w")
+        self.index.write(header)
+        self.index.write(IMPORT_DRIVER)
+        if not split:
+            self.index.write("\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.index.close()
+
+    @contextmanager
+    def module(self, name: str, imports: Dict[str, List[str]], driver: bool=True):
+        if not self.split:
+            yield self.index
+            return
+        with open(path.join(self.target_dir, f"{name}.ts"), "w") as f:
+            f.write(self.header)
+            if driver:
+                f.write(IMPORT_DRIVER)
+            write_imports(f, imports)
+            f.write("\n")
+            yield f
+        self.modules.append(name)
+
+    def write_index(self, imports: Dict[str, List[str]]):
+        # the rest of the index uses the symbols in `imports`
+        if self.split:
+            for module in self.modules:
+                self.index.write(f"export * from \"./{module}\";\n")
+            write_imports(self.index, {m: s for m, s in imports.items() if m in self.modules and s})
+        return self.index
+
+def write_imports(f, imports: Dict[str, List[str]]):
+    for module, symbols in imports.items():
+        f.write(f"import {'{'} {', '.join(symbols)} {'}'} from \"./{module}\";\n")
+
+def exported_symbols(thing: SusThing) -> List[str]:
+    if isinstance(thing, SusCompound):
+        return [f"{thing.name}Spec"]
+    if isinstance(thing, (SusEnum, SusBitfield)):
+        return [thing.name, f"{thing.name}_SIZE"]
+    if isinstance(thing, SusConfirmation):
+        return [thing.name]
+    # entities are referred to with speedapi.repr.Entity
+    return []
+
+def module_imports(things: List[SusThing], index: ProjectIndex, split: bool) -> Dict[str, List[str]]:
+    # symbols that the module of `things` imports from other modules
+    if not split:
+        return {}
+    names = set()
+    for thing in things:
+        names |= {n for s in field_sets_of(thing) for f in s for n in referenced_names(f.type_)}
+        methods = thing.methods if isinstance(thing, SusEntity) else [thing] if isinstance(thing, SusMethod) else []
+        names |= {c for m in methods for c in m.confirmations}
+
+    imports = {}
+    for name in sorted(names - {t.name for t in things}):
+        thing = index.find(name)
+        if thing is not None and exported_symbols(thing):
+            imports[name] = exported_symbols(thing)
+    if any(isinstance(t, SusEntity) and t.subscription and any(m.name == "subscribe" for m in t.methods) for t in things):
+        imports["$subscription"] = ["$Subscription"]
+    return imports
+
 def write_output(root_file: File, target_dir: str) -> None:
     proj_name = path.splitext(path.basename(root_file.path))[0]
     header = ("/* Generated by SpeedAPI SUSC (https://github.com/speedapi/susc)\n"
@@ -89,202 +193,268 @@ def write_output(root_file: File, target_dir: str) -> None:
     # pick random identifier
     proj_id = f"{proj_name}-{nanoid(size=10)}"
 
-    # construct a name-to-type mapping
-    objs = {}
-    for thing in root_file.things:
-        name = type(thing).__name__[3:].lower() + "s"
-        if name == "entitys": # correct plural form
-            name = "entities"
-        objs[thing.name] = name
+    index = root_file.index
+    check_types(index.things)
+    default_compression = default_policy(root_file.settings)
+
+    split = root_file.settings.get("ts_modules", "single") == "split"
+    if root_file.settings.get("ts_modules", "single") not in ("single", "split"):
+        log.warn("Unknown 'ts_modules' setting (expected 'single' or 'split')")
 
-    with open(path.join(target_dir, "index.ts"), "w") as f:
-        f.write(header)
-        f.write("import * as speedapi from \"@speedapi/driver\";\n\n")
+    dense = root_file.settings.get("ts_dispatch", "object") == "dense"
+    if root_file.settings.get("ts_dispatch", "object") not in ("object", "dense"):
+        log.warn("Unknown 'ts_dispatch' setting (expected 'object' or 'dense')")
+    table_imports = {"$dispatch": ["$table"]} if dense and split else {}
+
+    with ModuleWriter(target_dir, header, split) as modules:
+        if any(m.name == "subscribe" for e in root_file.index.of_kind(SusEntity) for m in e.methods):
+            with modules.module("$subscription", {}, False) as f:
+                write_subscription_class(f)
+        if dense:
+            with modules.module("$dispatch", {}, False) as f:
+                write_table_function(f)
 
         # write compounds
         compounds = [t for t in root_file.things if isinstance(t, SusCompound)]
         for thing in compounds:
-            write_docstr(f, thing)
-            f.write(f"export const {thing.name}Spec = {'{'}\n")
-            write_field_array(f, thing.fields, objs, 1)
-            f.write("};\n\n")
+            with modules.module(thing.name, module_imports([thing], index, split)) as f:
+                write_docstr(f, thing)
+                f.write(f"export const {thing.name}Spec = {'{'}\n")
+                write_field_array(f, thing.fields, index, 1)
+                f.write("};\n\n")
 
         # write enums
         enums_and_bfs = [t for t in root_file.things if isinstance(t, (SusEnum, SusBitfield))]
         for thing in enums_and_bfs:
-            write_docstr(f, thing)
-            f.write(f"export enum {thing.name} {'{'}\n")
-            for member in thing.members:
-                write_docstr(f, member, 1)
-                prefix = "" if isinstance(thing, SusEnum) else "1 << "
-                f.write(f"\t{member.name} = {prefix}{member.value},\n")
-            f.write("}\n")
-            f.write(f"export const {thing.name}_SIZE = {thing.size};\n\n\n")
+            with modules.module(thing.name, {}, False) as f:
+                write_docstr(f, thing)
+                f.write(f"export enum {thing.name} {'{'}\n")
+                for member in thing.members:
+                    write_docstr(f, member, 1)
+                    prefix = "" if isinstance(thing, SusEnum) else "1 << "
+                    f.write(f"\t{member.name} = {prefix}{member.value},\n")
+                f.write("}\n")
+                f.write(f"export const {thing.name}_SIZE = {thing.size};\n\n\n")
 
         # write confirmations
         confirmations = [t for t in root_file.things if isinstance(t, SusConfirmation)]
         for conf in confirmations:
-            # write spec
-            name = snake_to_pascal(conf.name)
-            f.write(f"const {name}Spec = {'{'}\n")
-            f.write("\trequest: {\n")
-            write_field_array(f, conf.req_parameters, objs)
-            f.write("\t},\n")
-            f.write("\tresponse: {\n")
-            write_field_array(f, conf.resp_parameters, objs)
-            f.write("\t}\n")
-            f.write("};\n")
-            # write class
-            write_docstr(f, conf)
-            f.write(f"export class {name} extends speedapi.Confirmation<typeof {name}Spec> {'{'}\n")
-            f.write("\tconstructor() {\n")
-            f.write(f"\t\tsuper({name}Spec, {conf.value});\n")
-            f.write("\t}\n")
-            f.write("}\n")
+            with modules.module(conf.name, module_imports([conf], index, split)) as f:
+                # write spec
+                name = snake_to_pascal(conf.name)
+                f.write(f"const {name}Spec = {'{'}\n")
+                f.write("\trequest: {\n")
+                write_field_array(f, conf.req_parameters, index)
+                f.write("\t},\n")
+                f.write("\tresponse: {\n")
+                write_field_array(f, conf.resp_parameters, index)
+                f.write("\t}\n")
+                f.write("};\n")
+                # write class
+                write_docstr(f, conf)
+                f.write(f"export class {name} extends speedapi.Confirmation<typeof {name}Spec> {'{'}\n")
+                f.write("\tconstructor() {\n")
+                f.write(f"\t\tsuper({name}Spec, {conf.value});\n")
+                f.write("\t}\n")
+                f.write("}\n")
 
         # write global methods
         methods = [t for t in root_file.things if isinstance(t, SusMethod)]
-        for method in methods:
-            # write spec
-            name = snake_to_pascal(method.name)
-            f.write(f"const {name}Spec = {'{'}\n")
-            f.write(f"\tname: \"{method.name}\" as const,\n")
-            if method.rate_limit:
-                f.write(f"\trateLimit: [{method.rate_limit[0]}, {method.rate_limit[1]}] as const,\n")
-            f.write("\tparams: {\n")
-            write_field_array(f, method.parameters, objs)
-            f.write("\t},\n")
-            f.write("\treturns: {\n")
-            write_field_array(f, method.returns, objs)
-            f.write("\t},\n")
-            conf_names = ", ".join(f"new {snake_to_pascal(conf)}()" for conf in method.confirmations)
-            f.write(f"\tconfirmations: [{conf_names}]\n")
-            f.write("};\n")
-            # write class
-            write_docstr(f, method)
-            f.write(f"export class {name} extends speedapi.Method<typeof {name}Spec> {'{'}\n")
-            f.write("\tconstructor() {\n")
-            f.write(f"\t\tsuper({name}Spec, {method.value}, undefined);\n")
-            f.write("\t}\n")
-            f.write("}\n")
-            # write function
-            write_docstr(f, method)
-            f.write(f"async function {snake_to_camel(method.name)}(\n")
-            f.write("\tthis: any | speedapi.BoundSession,\n")
-            f.write(f"\tparams: speedapi.repr.FieldValue<typeof {name}Spec[\"params\"]>,\n")
-            f.write(f"\tconfirm?: speedapi.ConfCallback<{name}>,\n")
-            f.write("\tsession?: speedapi.Session\n")
-            f.write(f"): Promise<speedapi.repr.FieldValue<typeof {name}Spec[\"returns\"]>> {'{'}\n")
-            f.write(f"\tconst method = new {name}();\n")
-            f.write(f"\tmethod.params = params;\n")
-            f.write(f"\treturn await (session ?? this.$session).invokeMethod(method, confirm);\n")
-            f.write("}\n\n\n")
-
-        # write entities
-        entities = [t for t in root_file.things if isinstance(t, SusEntity)]
-        for entity in entities:
-            id_field = [f for f in entity.fields if f.name == "id"][0]
-
-            # write method specs and classes
-            for method in entity.methods:
-                name = f"{entity.name}_{snake_to_pascal(method.name)}"
+        # `$bind()` exposes them, modules have to export them for it
+        export = "export " if split else ""
+        with modules.module("methods", module_imports(methods, index, split)) as f:
+            for method in methods:
+                # write spec
+                name = snake_to_pascal(method.name)
                 f.write(f"const {name}Spec = {'{'}\n")
-                f.write(f"\tname: \"{entity.name}.{method.name}\" as const,\n")
+                f.write(f"\tname: \"{method.name}\" as const,\n")
                 if method.rate_limit:
                     f.write(f"\trateLimit: [{method.rate_limit[0]}, {method.rate_limit[1]}] as const,\n")
+                if method.cache:
+                    f.write(f"\tcache: [\"{method.cache.mode}\", {method.cache.ttl}] as const,\n")
+                if method.stream:
+                    f.write("\tstream: true as const,\n")
+                write_compression(f, effective_policy(method, None, default_compression))
                 f.write("\tparams: {\n")
-                write_field_array(f, method.parameters, objs)
+                write_field_array(f, method.parameters, index)
                 f.write("\t},\n")
                 f.write("\treturns: {\n")
-                write_field_array(f, method.returns, objs)
+                write_field_array(f, method.returns, index)
                 f.write("\t},\n")
                 conf_names = ", ".join(f"new {snake_to_pascal(conf)}()" for conf in method.confirmations)
-                f.write(f"\tconfirmations: [{conf_names}],\n")
-                if not method.static:
-                    f.write(f"\tentityIdRepr: {type_to_speedapi(id_field.type_, objs)}\n")
+                f.write(f"\tconfirmations: [{conf_names}]\n")
                 f.write("};\n")
+                # write class
                 write_docstr(f, method)
                 f.write(f"export class {name} extends speedapi.Method<typeof {name}Spec> {'{'}\n")
                 f.write("\tconstructor() {\n")
-                f.write(f"\t\tsuper({name}Spec, {method.value + (128 if method.static else 0)}, {entity.value});\n")
+                f.write(f"\t\tsuper({name}Spec, {method.value}, undefined);\n")
                 f.write("\t}\n")
                 f.write("}\n")
+                # write function
+                write_docstr(f, method)
+                if method.stream:
+                    f.write(f"{export}async function* {snake_to_camel(method.name)}(\n")
+                    f.write("\tthis: any | speedapi.BoundSession,\n")
+                    write_stream_function(f, name, "(session ?? this.$session)", 0)
+                    f.write("\n\n")
+                    continue
+                f.write(f"{export}async function {snake_to_camel(method.name)}(\n")
+                f.write("\tthis: any | speedapi.BoundSession,\n")
+                f.write(f"\tparams: speedapi.repr.FieldValue<typeof {name}Spec[\"params\"]>,\n")
+                f.write(f"\tconfirm?: speedapi.ConfCallback<{name}>,\n")
+                f.write("\tsession?: speedapi.Session\n")
+                f.write(f"): Promise<speedapi.repr.FieldValue<typeof {name}Spec[\"returns\"]>> {'{'}\n")
+                f.write(f"\tconst method = new {name}();\n")
+                f.write(f"\tmethod.params = params;\n")
+                f.write(f"\treturn await (session ?? this.$session).invokeMethod(method, confirm);\n")
+                f.write("}\n\n\n")
 
-            # write spec
-            name = entity.name
-            f.write(f"const {name}Spec = {'{'}\n")
-            f.write("\tfields: {\n")
-            write_field_array(f, entity.fields, objs)
-            f.write("\t},\n")
-            f.write("\tmethods: {\n")
-            for method in entity.methods:
-                val = method.value + (128 if method.static else 0)
-                f.write(f"\t\t{val}: new {entity.name}_{snake_to_pascal(method.name)}(),\n")
-            f.write("\t}\n")
-            f.write("};\n")
-            # write class
-            write_docstr(f, entity)
-            f.write(f"export class {name} extends speedapi.Entity<typeof {name}Spec> {'{'}\n")
-            f.write("\tprotected static readonly session?: speedapi.Session;\n")
-            f.write("\treadonly dynSession?: speedapi.Session;\n\n")
-            f.write(f"\tconstructor(value?: speedapi.repr.FieldValue<typeof {name}Spec[\"fields\"]>) {'{'}\n")
-            f.write(f"\t\tsuper({name}Spec, {entity.value}, value);\n")
-            f.write("\t}\n")
-
-            # write fields
-            f.write("\n")
-            for field in entity.fields:
-                f.write(f"\tget {field.name}() {'{'} return this.value?.{field.name}; {'}'}\n")
+        # write entities
+        entities = [t for t in root_file.things if isinstance(t, SusEntity)]
+        for entity in entities:
+            with modules.module(entity.name, {**module_imports([entity], index, split), **table_imports}) as f:
+                id_field = index.id_field(entity.name)
+
+                # write method specs and classes
+                for method in entity.methods:
+                    name = f"{entity.name}_{snake_to_pascal(method.name)}"
+                    f.write(f"const {name}Spec = {'{'}\n")
+                    f.write(f"\tname: \"{entity.name}.{method.name}\" as const,\n")
+                    if method.rate_limit:
+                        f.write(f"\trateLimit: [{method.rate_limit[0]}, {method.rate_limit[1]}] as const,\n")
+                    if method.cache:
+                        f.write(f"\tcache: [\"{method.cache.mode}\", {method.cache.ttl}] as const,\n")
+                    if method.stream:
+                        f.write("\tstream: true as const,\n")
+                    if method.name == "subscribe" and entity.subscription and entity.subscription.interval:
+                        f.write(f"\tcoalesce: {entity.subscription.interval} as const,\n")
+                    write_compression(f, effective_policy(method, entity, default_compression))
+                    f.write("\tparams: {\n")
+                    write_field_array(f, method.parameters, index)
+                    f.write("\t},\n")
+                    f.write("\treturns: {\n")
+                    write_field_array(f, method.returns, index)
+                    f.write("\t},\n")
+                    conf_names = ", ".join(f"new {snake_to_pascal(conf)}()" for conf in method.confirmations)
+                    f.write(f"\tconfirmations: [{conf_names}],\n")
+                    if not method.static:
+                        f.write(f"\tentityIdRepr: {type_to_speedapi(id_field.type_, index)}\n")
+                    f.write("};\n")
+                    write_docstr(f, method)
+                    f.write(f"export class {name} extends speedapi.Method<typeof {name}Spec> {'{'}\n")
+                    f.write("\tconstructor() {\n")
+                    f.write(f"\t\tsuper({name}Spec, {method.value + (128 if method.static else 0)}, {entity.value});\n")
+                    f.write("\t}\n")
+                    f.write("}\n")
+
+                # write spec
+                name = entity.name
+                f.write(f"const {name}Spec = {'{'}\n")
+                f.write("\tfields: {\n")
+                write_field_array(f, entity.fields, index)
+                f.write("\t},\n")
+                f.write(f"\tmethods: {table_start(dense, ENTITY_METHOD_VALUES, [m.value + (128 if m.static else 0) for m in entity.methods], entity.name + ' methods')}\n")
+                for method in entity.methods:
+                    val = method.value + (128 if method.static else 0)
+                    f.write(f"\t\t{val}: new {entity.name}_{snake_to_pascal(method.name)}(),\n")
+                f.write(f"\t{table_end(dense)}\n")
+                f.write("};\n")
+                # write class
+                write_docstr(f, entity)
+                f.write(f"export class {name} extends speedapi.Entity<typeof {name}Spec> {'{'}\n")
+                f.write("\tprotected static readonly session?: speedapi.Session;\n")
+                f.write("\treadonly dynSession?: speedapi.Session;\n\n")
+                f.write(f"\tconstructor(value?: speedapi.repr.FieldValue<typeof {name}Spec[\"fields\"]>) {'{'}\n")
+                f.write(f"\t\tsuper({name}Spec, {entity.value}, value);\n")
+                f.write("\t}\n")
 
-            # write method functions
-            for method in entity.methods:
-                name = f"{entity.name}_{snake_to_pascal(method.name)}"
+                # write fields
                 f.write("\n")
-                write_docstr(f, method, 1)
-                static = "static " if method.static else ""
-                protected = "protected " if method.name == "get" else ""
-                f.write(f"\t{protected}{static}async {snake_to_camel(method.name)}(\n")
-                f.write(f"\t\tparams: speedapi.repr.FieldValue<typeof {name}Spec[\"params\"]>,\n")
-                f.write(f"\t\tconfirm?: speedapi.ConfCallback<{name}>,\n")
-                f.write("\t\tsession?: speedapi.Session\n")
-                f.write(f"\t): Promise<speedapi.repr.FieldValue<typeof {name}Spec[\"returns\"]>> {'{'}\n")
-                f.write(f"\t\tconst method = new {name}();\n")
-                f.write(f"\t\tmethod.params = params;\n")
-                if method.static:
-                    f.write("\t\treturn await (session ?? this.session)!.invokeMethod(method, confirm);\n")
+                for field in entity.fields:
+                    f.write(f"\tget {field.name}() {'{'} return this.value?.{field.name}; {'}'}\n")
+                if any(m.name == "patch" for m in entity.methods):
+                    write_dirty_tracking(f, entity)
+
+                # write method functions
+                for method in entity.methods:
+                    name = f"{entity.name}_{snake_to_pascal(method.name)}"
+                    f.write("\n")
+                    write_docstr(f, method, 1)
+                    static = "static " if method.static else ""
+                    protected = "protected " if method.name in PROTECTED_METHODS else ""
+                    if method.stream:
+                        f.write(f"\t{protected}{static}async *{snake_to_camel(method.name)}(\n")
+                        if method.static:
+                            write_stream_function(f, name, "(session ?? this.session)!", 1)
+                        else:
+                            write_stream_function(f, name, "(session ?? this.dynSession)!", 1, True)
+                        continue
+                    f.write(f"\t{protected}{static}async {snake_to_camel(method.name)}(\n")
+                    f.write(f"\t\tparams: speedapi.repr.FieldValue<typeof {name}Spec[\"params\"]>,\n")
+                    f.write(f"\t\tconfirm?: speedapi.ConfCallback<{name}>,\n")
+                    f.write("\t\tsession?: speedapi.Session\n")
+                    f.write(f"\t): Promise<speedapi.repr.FieldValue<typeof {name}Spec[\"returns\"]>> {'{'}\n")
+                    f.write(f"\t\tconst method = new {name}();\n")
+                    f.write(f"\t\tmethod.params = params;\n")
+                    if method.static:
+                        f.write("\t\treturn await (session ?? this.session)!.invokeMethod(method, confirm);\n")
+                    elif entity.cache and method.name in ("update", "patch"):
+                        # updated entities are dropped from the cache
+                        f.write("\t\tif(!this.value) throw new Error(\"Entity must have a value\");\n")
+                        f.write("\t\tmethod.entityId = this.value.id;\n")
+                        f.write("\t\tconst result = await (session ?? this.dynSession)!.invokeMethod(method, confirm);\n")
+                        f.write("\t\t(this.constructor as typeof " + entity.name + ").$cached?.delete(this.value.id);\n")
+                        f.write("\t\treturn result;\n")
+                    else:
+                        f.write("\t\tif(!this.value) throw new Error(\"Entity must have a value\");\n")
+                        f.write("\t\tmethod.entityId = this.value.id;\n")
+                        f.write("\t\treturn await (session ?? this.dynSession)!.invokeMethod(method, confirm);\n")
+                    f.write("\t}\n")
+
+                # write $get()
+                if entity.cache and id_field:
+                    write_cached_get(f, entity)
                 else:
-                    f.write("\t\tif(!this.value) throw new Error(\"Entity must have a value\");\n")
-                    f.write("\t\tmethod.entityId = this.value.id;\n")
-                    f.write("\t\treturn await (session ?? this.dynSession)!.invokeMethod(method, confirm);\n")
-                f.write("\t}\n")
+                    f.write(f"\n\tstatic async $get(id: speedapi.repr.TsType<typeof {entity.name}Spec[\"fields\"][\"required\"][\"id\"]>) {'{'}\n")
+                    f.write(f"\t\treturn (await this.get({'{'} id {'}'})).entity as speedapi.ValuedEntity<{entity.name}>;\n")
+                    f.write("\t}\n")
 
-            # write $get()
-            f.write(f"\n\tstatic async $get(id: speedapi.repr.TsType<typeof {entity.name}Spec[\"fields\"][\"required\"][\"id\"]>) {'{'}\n")
-            f.write(f"\t\treturn (await this.get({'{'} id {'}'})).entity as speedapi.ValuedEntity<{entity.name}>;\n")
-            f.write("\t}\n")
+                # write $getMany()
+                if id_field and any(m.name == "get_many" for m in entity.methods):
+                    write_get_many(f, entity)
+                if any(m.name == "get_fields" for m in entity.methods):
+                    write_get_fields(f, entity)
+                if any(m.name == "subscribe" for m in entity.methods):
+                    write_subscribe(f, entity)
 
-            f.write("}\n\n\n")
+                f.write("}\n\n\n")
 
         # write spec space
+        f = modules.write_index({
+            "methods": [n for m in methods for n in (snake_to_pascal(m.name), snake_to_camel(m.name))],
+            **{t.name: [t.name] for t in entities + confirmations + enums_and_bfs},
+            **table_imports,
+        })
         f.write("\nexport function $specSpace(session: speedapi.Session) {\n")
         f.write("\treturn {\n")
         f.write("\t\tspecVersion: \"2\" as const,\n")
         f.write(f"\t\tproject: \"{proj_id}\" as const,\n")
-        f.write("\t\tglobalMethods: {\n")
+        f.write(f"\t\tglobalMethods: {table_start(dense, METHOD_VALUES, [m.value for m in methods], 'global methods')}\n")
         for method in methods:
             f.write(f"\t\t\t{method.value}: new {snake_to_pascal(method.name)}(),\n")
-        f.write("\t\t},\n")
-        f.write("\t\tentities: {\n")
+        f.write(f"\t\t{table_end(dense)},\n")
+        f.write(f"\t\tentities: {table_start(dense, ENTITY_VALUES, [e.value for e in entities], 'entities')}\n")
         for entity in entities:
             f.write(f"\t\t\t{entity.value}: new class extends {entity.name} {'{'}\n")
             f.write("\t\t\t\treadonly dynSession = session;\n")
             f.write("\t\t\t\tprotected static readonly session = session;\n")
             f.write("\t\t\t} (),\n")
-        f.write("\t\t},\n")
-        f.write("\t\tconfirmations: {\n")
+        f.write(f"\t\t{table_end(dense)},\n")
+        f.write(f"\t\tconfirmations: {table_start(dense, CONFIRMATION_VALUES, [c.value for c in confirmations], 'confirmations')}\n")
         for confirmation in confirmations:
             f.write(f"\t\t\t{confirmation.value}: new {confirmation.name}(),\n")
-        f.write("\t\t},\n")
+        f.write(f"\t\t{table_end(dense)},\n")
         f.write("\t};\n")
         f.write("}\n\n\n")
 
@@ -310,20 +480,247 @@ def write_output(root_file: File, target_dir: str) -> None:
         f.write("\t};\n")
         f.write("}\n")
 
-
-def write_field_array(f, fields, objs, indent=2):
+    # write codecs
+    if root_file.settings.get("ts_codecs", "false") == "true":
+        codecs = [Codec(t.name, t.fields) for t in compounds]
+        codecs += [Codec(e.name, e.fields, e) for e in entities]
+        for method in methods:
+            name = snake_to_pascal(method.name)
+            codecs += [Codec(f"{name}Params", method.parameters), Codec(f"{name}Returns", method.returns)]
+        for entity in entities:
+            for method in entity.methods:
+                name = f"{entity.name}_{snake_to_pascal(method.name)}"
+                codecs += [Codec(f"{name}Params", method.parameters), Codec(f"{name}Returns", method.returns)]
+        for conf in confirmations:
+            name = snake_to_pascal(conf.name)
+            codecs += [Codec(f"{name}Request", conf.req_parameters), Codec(f"{name}Response", conf.resp_parameters)]
+        write_codecs(index, codecs, header, target_dir)
+
+
+# generated entity methods that are wrapped by $-prefixed ones
+PROTECTED_METHODS = ["get", "get_many", "get_fields", "subscribe", "unsubscribe"]
+
+def write_compression(f, policy: SusCompression):
+    # payloads of `threshold` bytes or more are compressed with `mode`
+    if policy is not None:
+        f.write(f"\tcompression: [\"{policy.mode}\", {policy.threshold}] as const,\n")
+
+def write_stream_function(f, name: str, session: str, level: int, dynamic=False):
+    # streaming methods are iterated over: every chunk is yielded as soon as
+    # it arrives, while the next one is already being requested with the
+    # cursor of the current one
+    tabs = "\t" * level
+    f.write(f"{tabs}\tparams: Omit<speedapi.repr.FieldValue<typeof {name}Spec[\"params\"]>, \"cursor\">,\n")
+    f.write(f"{tabs}\tsession?: speedapi.Session\n")
+    f.write(f"{tabs}): AsyncGenerator<speedapi.repr.FieldValue<typeof {name}Spec[\"returns\"]>> {'{'}\n")
+    if dynamic:
+        f.write(f"{tabs}\tif(!this.value) throw new Error(\"Entity must have a value\");\n")
+        f.write(f"{tabs}\tconst entityId = this.value.id;\n")
+    f.write(f"{tabs}\tconst call = (cursor?: speedapi.repr.FieldValue<typeof {name}Spec[\"returns\"]>[\"cursor\"]) => {'{'}\n")
+    f.write(f"{tabs}\t\tconst method = new {name}();\n")
+    f.write(f"{tabs}\t\tmethod.params = cursor === undefined ? params : {'{'} ...params, cursor {'}'};\n")
+    if dynamic:
+        f.write(f"{tabs}\t\tmethod.entityId = entityId;\n")
+    f.write(f"{tabs}\t\treturn {session}.invokeMethod(method);\n")
+    f.write(f"{tabs}\t{'}'};\n")
+    f.write(f"{tabs}\tlet next: ReturnType<typeof call> | undefined = call();\n")
+    f.write(f"{tabs}\twhile(next) {'{'}\n")
+    f.write(f"{tabs}\t\tconst chunk = await next;\n")
+    f.write(f"{tabs}\t\tnext = chunk.cursor === undefined ? undefined : call(chunk.cursor);\n")
+    f.write(f"{tabs}\t\tyield chunk;\n")
+    f.write(f"{tabs}\t{'}'}\n")
+    f.write(f"{tabs}{'}'}\n")
+
+def write_cached_get(f, entity: SusEntity):
+    # $get() that serves entities from a cache kept by every bound entity
+    # class; hard caches fetch expired entities again before returning them,
+    # soft ones return them right away and refresh them in the background
+    name = entity.name
+    id_type = f"speedapi.repr.TsType<typeof {name}Spec[\"fields\"][\"required\"][\"id\"]>"
+    f.write(f"\n\t// cache {entity.cache.mode} {entity.cache.ttl}ms\n")
+    f.write(f"\tstatic $cached?: Map<{id_type}, [number, Promise<speedapi.ValuedEntity<{name}>>]>;\n")
+    f.write(f"\tstatic async $get(id: {id_type}) {'{'}\n")
+    f.write("\t\tif(!Object.prototype.hasOwnProperty.call(this, \"$cached\"))\n")
+    f.write("\t\t\tthis.$cached = new Map();\n")
+    f.write("\t\tconst cache = this.$cached!;\n")
+    f.write("\t\tconst cached = cache.get(id);\n")
+    f.write(f"\t\tif(cached && Date.now() - cached[0] < {entity.cache.ttl})\n")
+    f.write("\t\t\treturn await cached[1];\n")
+    f.write(f"\t\tconst entity = this.get({'{'} id {'}'}).then(r => r.entity as speedapi.ValuedEntity<{name}>);\n")
+    if entity.cache.mode == "soft":
+        f.write("\t\tif(cached) {\n")
+        f.write("\t\t\tcache.set(id, [Date.now(), cached[1]]);\n")
+        f.write("\t\t\tentity.then(() => cache.set(id, [Date.now(), entity]), () => {});\n")
+        f.write("\t\t\treturn await cached[1];\n")
+        f.write("\t\t}\n")
+    f.write("\t\tcache.set(id, [Date.now(), entity]);\n")
+    f.write("\t\tentity.catch(() => { if(cache.get(id)?.[1] === entity) cache.delete(id); });\n")
+    f.write("\t\treturn await entity;\n")
+    f.write("\t}\n")
+
+def write_get_fields(f, entity: SusEntity):
+    # $getFields() builds the projection bitfield from field names
+    name = entity.name
+    id_type = f"speedapi.repr.TsType<typeof {name}Spec[\"fields\"][\"required\"][\"id\"]>"
+    value_type = f"speedapi.repr.FieldValue<typeof {name}Spec[\"fields\"]>"
+    f.write(f"\n\tstatic async $getFields<K extends Exclude<keyof {value_type}, \"id\">>(id: {id_type}, fields: K[]) {'{'}\n")
+    f.write("\t\tlet mask = 0;\n")
+    f.write("\t\tfor(const field of fields)\n")
+    f.write(f"\t\t\tmask |= {name}Fields[field as keyof typeof {name}Fields];\n")
+    f.write(f"\t\tconst result = await this.getFields({'{'} id, fields: mask as {name}Fields {'}'});\n")
+    f.write(f"\t\treturn result as Pick<{value_type}, K>;\n")
+    f.write("\t}\n")
+
+def write_dirty_tracking(f, entity: SusEntity):
+    # $set() changes fields locally and $patch() sends only the changed ones
+    # using the generated `patch` method
+    name = entity.name
+    field_name = f"Exclude<keyof speedapi.repr.FieldValue<typeof {name}Spec[\"fields\"]>, \"id\">"
+    f.write(f"\n\treadonly $dirty = new Set<{field_name}>();\n\n")
+    f.write("\t// Changes a field locally and marks it to be sent by $patch()\n")
+    f.write(f"\t$set<K extends {field_name}>(field: K, value: speedapi.repr.FieldValue<typeof {name}Spec[\"fields\"]>[K]) {'{'}\n")
+    f.write("\t\tif(!this.value) throw new Error(\"Entity must have a value\");\n")
+    f.write("\t\tthis.value[field] = value;\n")
+    f.write("\t\tthis.$dirty.add(field);\n")
+    f.write("\t}\n\n")
+    f.write("\t// Sends the fields changed with $set() since the last call\n")
+    f.write(f"\tasync $patch(confirm?: speedapi.ConfCallback<{name}_Patch>, session?: speedapi.Session) {'{'}\n")
+    f.write("\t\tif(!this.value) throw new Error(\"Entity must have a value\");\n")
+    f.write("\t\tconst changed = [...this.$dirty];\n")
+    f.write("\t\tif(!changed.length) return;\n")
+    f.write("\t\tconst params: any = {};\n")
+    f.write("\t\tfor(const field of changed)\n")
+    f.write("\t\t\tparams[field] = this.value[field];\n")
+    f.write("\t\t// fields changed while the call is in flight stay dirty\n")
+    f.write("\t\tthis.$dirty.clear();\n")
+    f.write("\t\ttry {\n")
+    f.write("\t\t\tawait this.patch(params, confirm, session);\n")
+    f.write("\t\t} catch(ex) {\n")
+    f.write("\t\t\tfor(const field of changed)\n")
+    f.write("\t\t\t\tthis.$dirty.add(field);\n")
+    f.write("\t\t\tthrow ex;\n")
+    f.write("\t\t}\n")
+    f.write("\t}\n")
+
+def table_start(dense: bool, size: int, values: List[int], what: str) -> str:
+    # values past the usual range are only a warning (code 8), but they
+    # stretch the table to reach them
+    if dense and any(v >= size for v in values):
+        log.warn(f"Values of {what} past {size - 1} make their dispatch table longer and mostly empty")
+    return f"$table({max([size] + [v + 1 for v in values])}, {'{'}" if dense else "{"
+
+def table_end(dense: bool) -> str:
+    return "})" if dense else "}"
+
+def write_table_function(f):
+    f.write("// Turns a map of values into an array indexed by them. The unused ones are\n")
+    f.write("// `undefined`, so that the array stays packed and lookups are plain loads.\n")
+    f.write("// Values past 127 (255 for entity methods, 15 for confirmations) stretch the\n")
+    f.write("// array to reach them, making it mostly empty again\n")
+    f.write("export function $table<T = never>(size: number, entries: { [value: number]: T }): T[] {\n")
+    f.write("\tconst table: T[] = [];\n")
+    f.write("\tfor(let i = 0; i < size; i++)\n")
+    f.write("\t\ttable.push(entries[i]);\n")
+    f.write("\treturn table;\n")
+    f.write("}\n\n")
+
+def write_subscription_class(f):
+    # a minimal event emitter, as the driver runs in browsers too
+    f.write("type $SubscriptionEvents<T> = {\n")
+    f.write("\tchange: (changes: Partial<T>) => void,\n")
+    f.write("\terror: (error: unknown) => void,\n")
+    f.write("\tend: () => void,\n")
+    f.write("};\n")
+    f.write("// Emits the changes returned by the `subscribe` method of an entity until it's closed\n")
+    f.write("export class $Subscription<T> {\n")
+    f.write("\tprivate readonly listeners: { [E in keyof $SubscriptionEvents<T>]: Set<$SubscriptionEvents<T>[E]> } =\n")
+    f.write("\t\t{ change: new Set(), error: new Set(), end: new Set() };\n")
+    f.write("\tprivate open = true;\n\n")
+    f.write("\tconstructor(chunks: AsyncGenerator<Partial<T> & { cursor?: unknown }>, private readonly stop: () => Promise<unknown>) {\n")
+    f.write("\t\tthis.run(chunks);\n")
+    f.write("\t}\n\n")
+    f.write("\ton<E extends keyof $SubscriptionEvents<T>>(event: E, listener: $SubscriptionEvents<T>[E]) {\n")
+    f.write("\t\tthis.listeners[event].add(listener);\n")
+    f.write("\t\treturn this;\n")
+    f.write("\t}\n\n")
+    f.write("\toff<E extends keyof $SubscriptionEvents<T>>(event: E, listener: $SubscriptionEvents<T>[E]) {\n")
+    f.write("\t\tthis.listeners[event].delete(listener);\n")
+    f.write("\t\treturn this;\n")
+    f.write("\t}\n\n")
+    f.write("\t// Ends the subscription; \"end\" is emitted once the pending call returns\n")
+    f.write("\tasync close() {\n")
+    f.write("\t\tif(!this.open) return;\n")
+    f.write("\t\tthis.open = false;\n")
+    f.write("\t\tawait this.stop();\n")
+    f.write("\t}\n\n")
+    f.write("\tprivate async run(chunks: AsyncGenerator<Partial<T> & { cursor?: unknown }>) {\n")
+    f.write("\t\ttry {\n")
+    f.write("\t\t\tfor await(const { cursor, ...changes } of chunks) {\n")
+    f.write("\t\t\t\tif(Object.keys(changes).length)\n")
+    f.write("\t\t\t\t\tfor(const listener of this.listeners.change)\n")
+    f.write("\t\t\t\t\t\tlistener(changes as Partial<T>);\n")
+    f.write("\t\t\t}\n")
+    f.write("\t\t} catch(ex) {\n")
+    f.write("\t\t\tfor(const listener of this.listeners.error)\n")
+    f.write("\t\t\t\tlistener(ex);\n")
+    f.write("\t\t}\n")
+    f.write("\t\tthis.open = false;\n")
+    f.write("\t\tfor(const listener of this.listeners.end)\n")
+    f.write("\t\t\tlistener();\n")
+    f.write("\t}\n")
+    f.write("}\n\n")
+
+def write_subscribe(f, entity: SusEntity):
+    # $subscribe() keeps the value of the entity up to date and emits the
+    # changes; `subscribe` is called again as soon as it returns
+    name = entity.name
+    value_type = f"speedapi.repr.FieldValue<typeof {name}Spec[\"fields\"]>"
+    f.write(f"\n\t$subscribe<K extends Exclude<keyof {value_type}, \"id\">>(fields?: K[], session?: speedapi.Session) {'{'}\n")
+    f.write("\t\tif(!this.value) throw new Error(\"Entity must have a value\");\n")
+    if entity.cache:
+        f.write("\t\tconst id = this.value.id;\n")
+    f.write("\t\tlet mask: number | undefined;\n")
+    f.write("\t\tfor(const field of fields ?? [])\n")
+    f.write(f"\t\t\tmask = (mask ?? 0) | {name}Fields[field as keyof typeof {name}Fields];\n")
+    f.write(f"\t\tconst chunks = this.subscribe(mask === undefined ? {'{}'} : {'{'} fields: mask as {name}Fields {'}'}, session);\n")
+    f.write(f"\t\tconst subscription = new $Subscription<Pick<{value_type}, K>>(chunks, () => this.unsubscribe({'{}'}, undefined, session));\n")
+    f.write("\t\tsubscription.on(\"change\", changes => {\n")
+    f.write("\t\t\tObject.assign(this.value!, changes);\n")
+    if entity.cache:
+        f.write(f"\t\t\t(this.constructor as typeof {name}).$cached?.delete(id);\n")
+    f.write("\t\t});\n")
+    f.write("\t\treturn subscription;\n")
+    f.write("\t}\n")
+
+def write_get_many(f, entity: SusEntity):
+    # $getMany() takes any number of IDs and splits them into as few calls to
+    # `get_many` as possible, which are made concurrently
+    name = entity.name
+    id_type = f"speedapi.repr.TsType<typeof {name}Spec[\"fields\"][\"required\"][\"id\"]>"
+    f.write(f"\n\tstatic async $getMany(ids: {id_type}[]) {'{'}\n")
+    f.write("\t\tconst calls = [];\n")
+    f.write(f"\t\tfor(let i = 0; i < ids.length; i += {GET_MANY_LIMIT})\n")
+    f.write(f"\t\t\tcalls.push(this.getMany({'{'} ids: ids.slice(i, i + {GET_MANY_LIMIT}) {'}'}));\n")
+    f.write("\t\tconst results = await Promise.all(calls);\n")
+    f.write("\t\treturn {\n")
+    f.write(f"\t\t\tentities: results.flatMap(r => r.entities) as speedapi.ValuedEntity<{name}>[],\n")
+    f.write("\t\t\tmissing: results.flatMap(r => r.missing),\n")
+    f.write("\t\t};\n")
+    f.write("\t}\n")
+
+def write_field_array(f, fields, index, indent=2):
     indent = "\t" * indent
 
     f.write(f"{indent}required: {'{'}\n")
     for field in [f for f in fields if f.optional is None]:
         write_docstr(f, field, len(indent) + 1)
-        f.write(f"{indent}\t{field.name}: {type_to_speedapi(field.type_, objs)},\n")
+        f.write(f"{indent}\t{field.name}: {type_to_speedapi(field.type_, index)},\n")
     f.write(f"{indent}{'}'},\n")
 
     f.write(f"{indent}optional: {'{'}\n")
     for field in [f for f in fields if f.optional is not None]:
         write_docstr(f, field, len(indent) + 1)
-        type_ = type_to_speedapi(field.type_, objs)
+        type_ = type_to_speedapi(field.type_, index)
         repr_class = type_[:type_.find("(")]
         f.write(f"{indent}\t{field.name}: [{field.optional}, {type_}] as const,\n")
     f.write(f"{indent}{'}'}\n")
@@ -0,0 +1,686 @@
+from math import ceil
+from random import Random
+from os import path
+import json
+import io
+
+from susc import log
+from susc.things import *
+from susc.index import ProjectIndex
+from susc.exceptions import OutputError
+from susc.wire import Encoder, SizeAnalyzer, STR_PREFIX, BIN_PREFIX, ENTITY_PREFIX, OPT_COUNT, OPT_ID, UNBOUNDED
+from susc.dictionary import SampleGenerator
+
+# Straight-line encoders and decoders (`set ts_codecs true`). Every compound,
+# entity, method and confirmation gets functions that write and read its
+# fields one after another, with their validators inlined. Runs of
+# fixed-width fields are written at fixed offsets after a single bounds
+# check. codecs.test.ts checks them against payloads encoded by wire.Encoder,
+# which follows the format of the driver's FieldArray: required fields in
+# order, then the count of optional fields present and every one of them
+# after its one-byte opt() value
+MAX_NUMBER_SIZE = 4 # wider integers are bigints, as in the rest of the TS output
+TEST_VECTORS = 8 # per codec
+MAX_PREALLOCATED = 4096 # bytes allocated up front for messages of a known size
+
+# DataView accessors and the $Writer/$Reader helpers for every fixed width
+ACCESSORS = {1: "Uint8", 2: "Uint16", 4: "Uint32", 8: "BigUint64"}
+HELPERS = {1: "u8", 2: "u16", 4: "u32", 8: "u64"}
+
+RUNTIME = f"""const $textEncoder = new TextEncoder();
+const $textDecoder = new TextDecoder("utf-8", {{ fatal: true }});
+
+// number of characters (code points) in a string
+function $chars(s: string) {{
+	let n = s.length;
+	for(let i = 0; i < s.length; i++) {{
+		const c = s.charCodeAt(i);
+		if(c >= 0xdc00 && c <= 0xdfff) n--;
+	}}
+	return n;
+}}
+
+function $within(n: number, min: number, max: number) {{
+	return n >= min && n <= max;
+}}
+
+export class $Writer {{
+	buf: Uint8Array;
+	view: DataView;
+	pos = 0;
+
+	constructor(size: number) {{
+		this.buf = new Uint8Array(size);
+		this.view = new DataView(this.buf.buffer);
+	}}
+
+	// makes room for `n` more bytes
+	ensure(n: number) {{
+		if(this.pos + n <= this.buf.length) return;
+		let size = Math.max(this.buf.length * 2, 16);
+		while(size < this.pos + n) size *= 2;
+		const buf = new Uint8Array(size);
+		buf.set(this.buf.subarray(0, this.pos));
+		this.buf = buf;
+		this.view = new DataView(buf.buffer);
+	}}
+
+	u8(value: number) {{ this.ensure(1); this.view.setUint8(this.pos, value); this.pos += 1; }}
+	u16(value: number) {{ this.ensure(2); this.view.setUint16(this.pos, value); this.pos += 2; }}
+	u32(value: number) {{ this.ensure(4); this.view.setUint32(this.pos, value); this.pos += 4; }}
+	u64(value: bigint) {{ this.ensure(8); this.view.setBigUint64(this.pos, value); this.pos += 8; }}
+
+	// big-endian integer of any other size
+	uint(value: number | bigint, size: number) {{
+		this.ensure(size);
+		let v = BigInt(value);
+		for(let i = size - 1; i >= 0; i--) {{
+			this.buf[this.pos + i] = Number(v & 0xffn);
+			v >>= 8n;
+		}}
+		this.pos += size;
+	}}
+
+	varint(value: number | bigint) {{
+		if(typeof value === "number") {{
+			this.ensure(8);
+			while(value >= 0x80) {{
+				this.buf[this.pos++] = value % 0x80 | 0x80;
+				value = Math.floor(value / 0x80);
+			}}
+			this.buf[this.pos++] = value;
+			return;
+		}}
+		do {{
+			this.ensure(1);
+			const byte = Number(value & 0x7fn);
+			value >>= 7n;
+			this.buf[this.pos++] = byte | (value ? 0x80 : 0);
+		}} while(value);
+	}}
+
+	bytes(data: Uint8Array) {{
+		this.ensure(data.length);
+		this.buf.set(data, this.pos);
+		this.pos += data.length;
+	}}
+
+	str(value: string) {{
+		const data = $textEncoder.encode(value);
+		this.{HELPERS[STR_PREFIX]}(data.length);
+		this.bytes(data);
+	}}
+
+	bin(value: Uint8Array) {{
+		this.{HELPERS[BIN_PREFIX]}(value.length);
+		this.bytes(value);
+	}}
+
+	result() {{
+		return this.buf.slice(0, this.pos);
+	}}
+}}
+
+export class $Reader {{
+	buf: Uint8Array;
+	view: DataView;
+	pos = 0;
+
+	constructor(buf: Uint8Array) {{
+		this.buf = buf;
+		this.view = new DataView(buf.buffer, buf.byteOffset, buf.byteLength);
+	}}
+
+	// checks that there are `n` more bytes
+	need(n: number) {{
+		if(this.pos + n > this.buf.length)
+			throw new RangeError("Unexpected end of data");
+	}}
+
+	u8() {{ this.need(1); const v = this.view.getUint8(this.pos); this.pos += 1; return v; }}
+	u16() {{ this.need(2); const v = this.view.getUint16(this.pos); this.pos += 2; return v; }}
+	u32() {{ this.need(4); const v = this.view.getUint32(this.pos); this.pos += 4; return v; }}
+	u64() {{ this.need(8); const v = this.view.getBigUint64(this.pos); this.pos += 8; return v; }}
+
+	uint(size: number) {{
+		this.need(size);
+		let v = 0n;
+		for(let i = 0; i < size; i++)
+			v = v << 8n | BigInt(this.buf[this.pos + i]);
+		this.pos += size;
+		return v;
+	}}
+
+	varint() {{
+		let v = 0n, shift = 0n;
+		for(;;) {{
+			const byte = this.u8();
+			v |= BigInt(byte & 0x7f) << shift;
+			if(!(byte & 0x80)) return v;
+			shift += 7n;
+		}}
+	}}
+
+	// varints that fit in a number
+	varint32() {{
+		let v = 0, scale = 1;
+		for(;;) {{
+			const byte = this.u8();
+			v += (byte & 0x7f) * scale;
+			if(!(byte & 0x80)) return v;
+			scale *= 0x80;
+		}}
+	}}
+
+	bytes(n: number) {{
+		this.need(n);
+		const v = this.buf.slice(this.pos, this.pos + n);
+		this.pos += n;
+		return v;
+	}}
+
+	str() {{
+		const n = this.{HELPERS[STR_PREFIX]}();
+		this.need(n);
+		const v = $textDecoder.decode(this.buf.subarray(this.pos, this.pos + n));
+		this.pos += n;
+		return v;
+	}}
+
+	bin() {{
+		return this.bytes(this.{HELPERS[BIN_PREFIX]}());
+	}}
+
+	end() {{
+		if(this.pos !== this.buf.length)
+			throw new RangeError(`${{this.buf.length - this.pos}} unexpected bytes at the end`);
+	}}
+}}
+"""
+
+TEST_RUNTIME = """function $hex(hex: string) {
+	const data = new Uint8Array(hex.length / 2);
+	for(let i = 0; i < data.length; i++)
+		data[i] = parseInt(hex.slice(i * 2, i * 2 + 2), 16);
+	return data;
+}
+
+function $toHex(data: Uint8Array) {
+	return Array.from(data, b => b.toString(16).padStart(2, "0")).join("");
+}
+
+function $equal(a: Uint8Array, b: Uint8Array) {
+	return a.length === b.length && a.every((x, i) => x === b[i]);
+}
+"""
+
+@dataclass
+class Codec():
+    name: str # of the generated functions and types
+    fields: List[SusField]
+    entity: Optional[SusEntity] = None # prefixes the payload with its value
+
+def indent(lines: List[str]) -> List[str]:
+    return ["\t" + l for l in lines]
+
+def regex_literal(pattern: re.Pattern) -> str:
+    flags = "".join(c for flag, c in [(re.I, "i"), (re.M, "m"), (re.S, "s")] if pattern.flags & flag)
+    return f"/{pattern.pattern}/{flags}"
+
+class CodecWriter():
+    def __init__(self, index: ProjectIndex):
+        self.index = index
+        self.regexes: List[str] = [] # hoisted out of the functions
+        self.depth = 0 # of nested lists, to name their variables
+
+    def is_bigint(self, type_: SusType) -> bool:
+        thing = self.index.find(type_.name, SusEnum, SusBitfield)
+        if thing is not None:
+            return False
+        return type_.name in ("Int", "VarInt") and type_.args[0] > MAX_NUMBER_SIZE
+
+    def ts_type(self, type_: SusType) -> str:
+        name = type_.name
+        if name in ("Int", "VarInt"):
+            return "bigint" if self.is_bigint(type_) else "number"
+        if name == "Bool":
+            return "boolean"
+        if name == "Str":
+            return "string"
+        if name == "Bin":
+            return "Uint8Array"
+        if name in ("List", "Array"):
+            return f"{self.ts_type(type_.args[0])}[]"
+        if name == "Entity":
+            return "$AnyEntity"
+        if self.index.find(name, SusEnum, SusBitfield) is not None:
+            return "number"
+        return f"{name}Value"
+
+    def fixed_width(self, type_: SusType) -> Optional[int]:
+        # size of types that DataView reads and writes directly
+        if type_.name == "Bool":
+            return 1
+        if type_.name == "Int" and type_.args[0] in ACCESSORS:
+            return type_.args[0]
+        thing = self.index.find(type_.name, SusEnum, SusBitfield)
+        if thing is not None and thing.size in ACCESSORS:
+            return thing.size
+        return None
+
+    def regex(self, pattern: re.Pattern) -> str:
+        literal = regex_literal(pattern)
+        if literal not in self.regexes:
+            self.regexes.append(literal)
+        return f"$re{self.regexes.index(literal)}"
+
+    def checks(self, type_: SusType, expr: str, what: str) -> List[str]:
+        # validators, run before encoding and after decoding
+        lines = []
+        suffix = "n" if self.is_bigint(type_) else ""
+        for v in type_.validators:
+            r = v.restriction
+            if v.param == "val" and isinstance(r, range) and len(r):
+                conds = []
+                if r[0] > 0:
+                    conds.append(f"{expr} < {r[0]}{suffix}")
+                if r[-1] < 256 ** type_.args[0] - 1:
+                    conds.append(f"{expr} > {r[-1]}{suffix}")
+                if conds:
+                    lines.append(f"if({' || '.join(conds)}) throw new RangeError({json.dumps(what + ' is out of range')});")
+            elif v.param == "len" and isinstance(r, range) and len(r):
+                length = f"$chars({expr})" if type_.name == "Str" else f"{expr}.length"
+                high = "Infinity" if r.stop >= UNBOUNDED else r[-1]
+                lines.append(f"if(!$within({length}, {r[0]}, {high})) throw new RangeError({json.dumps(what + ' has an invalid length')});")
+            elif v.param == "match":
+                lines.append(f"if(!{self.regex(r)}.test({expr})) throw new RangeError({json.dumps(what + ' does not match ' + regex_literal(r))});")
+        return lines
+
+    # encoding
+
+    def put(self, type_: SusType, offset: str, expr: str) -> str:
+        width = self.fixed_width(type_)
+        if type_.name == "Bool":
+            expr = f"{expr} ? 1 : 0"
+        elif width == 8 and not self.is_bigint(type_):
+            expr = f"BigInt({expr})"
+        return f"w.view.set{ACCESSORS[width]}({offset}, {expr});"
+
+    def encode_value(self, type_: SusType, expr: str, what: str) -> List[str]:
+        lines = self.checks(type_, expr, what)
+        name = type_.name
+        width = self.fixed_width(type_)
+        thing = self.index.find(name)
+        if width is not None:
+            value = f"{expr} ? 1 : 0" if name == "Bool" else expr
+            if width == 8 and not self.is_bigint(type_):
+                value = f"BigInt({expr})"
+            lines.append(f"w.{HELPERS[width]}({value});")
+        elif name == "Int" or isinstance(thing, (SusEnum, SusBitfield)):
+            lines.append(f"w.uint({expr}, {type_.args[0] if name == 'Int' else thing.size});")
+        elif name == "VarInt":
+            lines.append(f"w.varint({expr});")
+        elif name == "Str":
+            lines.append(f"w.str({expr});")
+        elif name == "Bin":
+            lines.append(f"w.bin({expr});")
+        elif name in ("List", "Array"):
+            lines += self.encode_sequence(type_, expr, what)
+        elif name == "Entity":
+            lines.append(f"$encAnyEntity(w, {expr});")
+        else:
+            lines.append(f"$enc_{name}(w, {expr});")
+        return lines
+
+    def encode_sequence(self, type_: SusType, expr: str, what: str) -> List[str]:
+        element, count = type_.args
+        d = self.depth
+        self.depth += 1
+        lines = []
+        width = self.fixed_width(element)
+        if type_.name == "Array":
+            lines.append(f"if({expr}.length !== {count}) throw new RangeError({json.dumps(f'{what} must have {count} elements')});")
+        else:
+            count_type = SusType(None, None, "Int", [count], [])
+            length = f"BigInt({expr}.length)" if self.is_bigint(count_type) else f"{expr}.length"
+            lines += self.encode_value(count_type, length, what)
+
+        if type_.name == "Array" and width is not None and not element.validators:
+            # elements at fixed offsets
+            lines.append(f"w.ensure({count * width});")
+            lines.append(f"for(let i{d} = 0; i{d} < {count}; i{d}++)")
+            lines.append("\t" + self.put(element, f"w.pos + i{d} * {width}", f"{expr}[i{d}]"))
+            lines.append(f"w.pos += {count * width};")
+        else:
+            lines.append(f"for(const e{d} of {expr}) {'{'}")
+            lines += indent(self.encode_value(element, f"e{d}", f"{what}[]"))
+            lines.append("}")
+        self.depth -= 1
+        return lines
+
+    def encode_fields(self, codec: Codec, what: str) -> List[str]:
+        lines = []
+        run = [] # fixed-width items: (width, function of the offset that writes them)
+        def flush():
+            if not run:
+                return
+            total = sum(w for w, _ in run)
+            lines.append(f"w.ensure({total});")
+            offset = 0
+            for width, write in run:
+                lines.append(write("w.pos" if not offset else f"w.pos + {offset}"))
+                offset += width
+            lines.append(f"w.pos += {total};")
+            run.clear()
+
+        if codec.entity is not None:
+            run.append((ENTITY_PREFIX, lambda o: f"w.view.set{ACCESSORS[ENTITY_PREFIX]}({o}, {codec.entity.value});"))
+        optional = sorted((f for f in codec.fields if f.optional is not None), key=lambda f: f.optional)
+        if optional:
+            lines.append("let count = 0;")
+        for field in optional:
+            lines.append(f"if(v.{field.name} !== undefined) count++;")
+
+        for field in codec.fields:
+            if field.optional is not None:
+                continue
+            expr = f"v.{field.name}"
+            width = self.fixed_width(field.type_)
+            if width is not None:
+                lines += self.checks(field.type_, expr, f"{what}.{field.name}")
+                run.append((width, lambda o, t=field.type_, e=expr: self.put(t, o, e)))
+            else:
+                flush()
+                lines += self.encode_value(field.type_, expr, f"{what}.{field.name}")
+        # the number of optional fields present, then each of them after its opt() value
+        if optional:
+            run.append((OPT_COUNT, lambda o: f"w.view.set{ACCESSORS[OPT_COUNT]}({o}, count);"))
+        flush()
+
+        for field in optional:
+            expr = f"v.{field.name}"
+            lines.append(f"if({expr} !== undefined) {'{'}")
+            width = self.fixed_width(field.type_)
+            if width is not None:
+                lines += indent(self.checks(field.type_, expr, f"{what}.{field.name}"))
+                run.append((OPT_ID, lambda o: f"w.view.set{ACCESSORS[OPT_ID]}({o}, {field.optional});"))
+                run.append((width, lambda o: self.put(field.type_, o, expr)))
+                start = len(lines)
+                flush()
+                lines[start:] = indent(lines[start:])
+            else:
+                lines.append(f"\tw.{HELPERS[OPT_ID]}({field.optional});")
+                lines += indent(self.encode_value(field.type_, expr, f"{what}.{field.name}"))
+            lines.append("}")
+        return lines
+
+    # decoding
+
+    def get(self, type_: SusType, offset: str) -> str:
+        width = self.fixed_width(type_)
+        value = f"r.view.get{ACCESSORS[width]}({offset})"
+        if type_.name == "Bool":
+            return f"{value} !== 0"
+        if width == 8 and not self.is_bigint(type_):
+            return f"Number({value})"
+        return value
+
+    def decode_value(self, type_: SusType, lhs: str, what: str) -> List[str]:
+        name = type_.name
+        width = self.fixed_width(type_)
+        thing = self.index.find(name)
+        lines = []
+        if width is not None:
+            value = f"r.{HELPERS[width]}()"
+            if name == "Bool":
+                value = f"{value} !== 0"
+            elif width == 8 and not self.is_bigint(type_):
+                value = f"Number({value})"
+            lines.append(f"{lhs} = {value};")
+        elif name == "Int" or isinstance(thing, (SusEnum, SusBitfield)):
+            value = f"r.uint({type_.args[0] if name == 'Int' else thing.size})"
+            lines.append(f"{lhs} = {value if self.is_bigint(type_) else f'Number({value})'};")
+        elif name == "VarInt":
+            lines.append(f"{lhs} = r.{'varint' if self.is_bigint(type_) else 'varint32'}();")
+        elif name == "Str":
+            lines.append(f"{lhs} = r.str();")
+        elif name == "Bin":
+            lines.append(f"{lhs} = r.bin();")
+        elif name in ("List", "Array"):
+            lines += self.decode_sequence(type_, lhs, what)
+        elif name == "Entity":
+            lines.append(f"{lhs} = $decAnyEntity(r);")
+        else:
+            lines.append(f"{lhs} = $dec_{name}(r);")
+        return lines + self.checks(type_, lhs, what)
+
+    def decode_sequence(self, type_: SusType, lhs: str, what: str) -> List[str]:
+        element, count = type_.args
+        d = self.depth
+        self.depth += 1
+        width = self.fixed_width(element)
+        lines = []
+        if type_.name == "Array":
+            lines.append(f"const n{d} = {count};")
+        elif count > MAX_NUMBER_SIZE:
+            lines.append(f"const n{d} = Number(r.{'u64()' if count == 8 else f'uint({count})'});")
+        else:
+            lines += self.decode_value(SusType(None, None, "Int", [count], []), f"const n{d}", what)
+        lines.append(f"const l{d}: {self.ts_type(element)}[] = new Array(n{d});")
+
+        if type_.name == "Array" and width is not None and not element.validators:
+            # elements at fixed offsets
+            lines.append(f"r.need({count * width});")
+            lines.append(f"for(let i{d} = 0; i{d} < n{d}; i{d}++)")
+            lines.append(f"\tl{d}[i{d}] = {self.get(element, f'r.pos + i{d} * {width}')};")
+            lines.append(f"r.pos += {count * width};")
+        else:
+            lines.append(f"for(let i{d} = 0; i{d} < n{d}; i{d}++) {'{'}")
+            lines += indent(self.decode_value(element, f"l{d}[i{d}]", f"{what}[]"))
+            lines.append("}")
+        lines.append(f"{lhs} = l{d};")
+        self.depth -= 1
+        # the variables are scoped to a block of their own
+        return ["{"] + indent(lines) + ["}"]
+
+    def decode_fields(self, codec: Codec, what: str) -> List[str]:
+        lines = [f"const v = {'{}'} as {codec.name}Value;"]
+        run = [] # fixed-width items: (width, function of the offset that reads them)
+        checks = []
+        def flush():
+            if not run:
+                return
+            total = sum(w for w, _ in run)
+            lines.append(f"r.need({total});")
+            offset = 0
+            for width, read in run:
+                lines.append(read("r.pos" if not offset else f"r.pos + {offset}"))
+                offset += width
+            lines.append(f"r.pos += {total};")
+            lines.extend(checks)
+            run.clear()
+            checks.clear()
+
+        if codec.entity is not None:
+            message = json.dumps(f"Expected a {codec.entity.name} entity")
+            run.append((ENTITY_PREFIX, lambda o: f"if(r.view.get{ACCESSORS[ENTITY_PREFIX]}({o}) !== {codec.entity.value}) throw new RangeError({message});"))
+        optional = sorted((f for f in codec.fields if f.optional is not None), key=lambda f: f.optional)
+
+        for field in codec.fields:
+            if field.optional is not None:
+                continue
+            lhs = f"v.{field.name}"
+            width = self.fixed_width(field.type_)
+            if width is not None:
+                run.append((width, lambda o, t=field.type_, l=lhs: f"{l} = {self.get(t, o)};"))
+                checks.extend(self.checks(field.type_, lhs, f"{what}.{field.name}"))
+            else:
+                flush()
+                lines += self.decode_value(field.type_, lhs, f"{what}.{field.name}")
+        if optional:
+            run.append((OPT_COUNT, lambda o: f"const count = r.view.get{ACCESSORS[OPT_COUNT]}({o});"))
+        flush()
+
+        if optional:
+            lines.append("for(let i = 0; i < count; i++) {")
+            lines.append(f"\tswitch(r.{HELPERS[OPT_ID]}()) {'{'}")
+            for field in optional:
+                lines.append(f"\t\tcase {field.optional}:")
+                lines += indent(indent(indent(self.decode_value(field.type_, f"v.{field.name}", f"{what}.{field.name}"))))
+                lines.append("\t\t\tbreak;")
+            lines.append("\t\tdefault:")
+            lines.append(f"\t\t\tthrow new RangeError({json.dumps(f'Unknown optional field in {what}')});")
+            lines.append("\t}")
+            lines.append("}")
+        lines.append("return v;")
+        return lines
+
+    # test vectors
+
+    def literal(self, type_: SusType, value: Any) -> str:
+        name = type_.name
+        if name in ("Int", "VarInt"):
+            return f"{value}n" if self.is_bigint(type_) else str(value)
+        if name == "Bool":
+            return "true" if value else "false"
+        if name == "Str":
+            return json.dumps(value)
+        if name == "Bin":
+            return f"$hex(\"{value.hex()}\")"
+        if name in ("List", "Array"):
+            return "[" + ", ".join(self.literal(type_.args[0], v) for v in value) + "]"
+        if name == "Entity":
+            entity = self.index.find(value["$entity"], SusEntity)
+            return self.object(entity.fields, value, entity.name)
+        thing = self.index.find(name)
+        if isinstance(thing, (SusEnum, SusBitfield)):
+            return str(value)
+        return self.object(thing.fields, value)
+
+    def object(self, fields: List[SusField], value: Dict[str, Any], entity: str=None) -> str:
+        parts = [f"$entity: \"{entity}\""] if entity else []
+        parts += [f"{f.name}: {self.literal(f.type_, value[f.name])}" for f in fields if value.get(f.name) is not None]
+        return "{ " + ", ".join(parts) + " }" if parts else "{}"
+
+def write_codec(f, writer: CodecWriter, codec: Codec, size: int):
+    name = codec.name
+    f.write(f"export type {name}Value = {'{'}\n")
+    for field in codec.fields:
+        f.write(f"\t{field.name}{'' if field.optional is None else '?'}: {writer.ts_type(field.type_)};\n")
+    f.write("};\n")
+    f.write(f"function $enc_{name}(w: $Writer, v: {name}Value) {'{'}\n")
+    f.write("".join(f"\t{l}\n" for l in writer.encode_fields(codec, name)))
+    f.write("}\n")
+    f.write(f"function $dec_{name}(r: $Reader): {name}Value {'{'}\n")
+    f.write("".join(f"\t{l}\n" for l in writer.decode_fields(codec, name)))
+    f.write("}\n")
+    f.write(f"export function encode{name}(value: {name}Value): Uint8Array {'{'}\n")
+    f.write(f"\tconst w = new $Writer({size});\n")
+    f.write(f"\t$enc_{name}(w, value);\n")
+    f.write("\treturn w.result();\n")
+    f.write("}\n")
+    f.write(f"export function decode{name}(data: Uint8Array): {name}Value {'{'}\n")
+    f.write("\tconst r = new $Reader(data);\n")
+    f.write(f"\tconst value = $dec_{name}(r);\n")
+    f.write("\tr.end();\n")
+    f.write("\treturn value;\n")
+    f.write("}\n\n")
+
+def write_any_entity(f, entities: List[SusEntity]):
+    # values of the `Entity` type name their entity
+    union = " | ".join(f"({'{'} $entity: \"{e.name}\" {'}'} & {e.name}Value)" for e in entities) or "never"
+    f.write(f"export type $AnyEntity = {union};\n")
+    f.write("function $encAnyEntity(w: $Writer, v: $AnyEntity) {\n")
+    f.write("\tswitch(v.$entity) {\n")
+    for entity in entities:
+        f.write(f"\t\tcase \"{entity.name}\": $enc_{entity.name}(w, v); return;\n")
+    f.write("\t}\n")
+    f.write("\tthrow new RangeError(`Unknown entity ${(v as { $entity: string }).$entity}`);\n")
+    f.write("}\n")
+    f.write("function $decAnyEntity(r: $Reader): $AnyEntity {\n")
+    f.write(f"\tr.need({ENTITY_PREFIX});\n")
+    f.write(f"\tswitch(r.view.get{ACCESSORS[ENTITY_PREFIX]}(r.pos)) {'{'}\n")
+    for entity in entities:
+        f.write(f"\t\tcase {entity.value}: return {'{'} $entity: \"{entity.name}\", ...$dec_{entity.name}(r) {'}'};\n")
+    f.write("\t}\n")
+    f.write("\tthrow new RangeError(\"Unknown entity value\");\n")
+    f.write("}\n\n")
+
+def initial_size(size) -> int:
+    # messages of a known size never have to grow their buffer
+    if size.max is not None and size.max <= MAX_PREALLOCATED:
+        return max(size.max, 1)
+    return max(ceil(size.typical), 16)
+
+def test_vectors(index: ProjectIndex, codec: Codec) -> List[Tuple[dict, bytes]]:
+    # values that pass their validators, encoded by the reference encoder
+    generator = SampleGenerator(index, Random(codec.name))
+    encoder = Encoder(index, validate=True)
+    vectors = []
+    for _ in range(TEST_VECTORS * 4):
+        try:
+            value = generator.fields(codec.fields)
+            if codec.entity is not None:
+                data = encoder.encode_named(codec.entity, value)
+            else:
+                data = encoder.encode_fields(codec.fields, value)
+        except (ValueError, OutputError):
+            continue
+        vectors.append((value, data))
+        if len(vectors) == TEST_VECTORS:
+            break
+    return vectors
+
+def write_codecs(index: ProjectIndex, codecs: List[Codec], header: str, target_dir: str) -> None:
+    writer = CodecWriter(index)
+    sizes = SizeAnalyzer(index)
+
+    body = io.StringIO()
+    write_any_entity(body, [c.entity for c in codecs if c.entity is not None])
+    for codec in codecs:
+        size = sizes.named_size(codec.entity) if codec.entity else sizes.fields_size(codec.fields)
+        write_codec(body, writer, codec, initial_size(size))
+
+    with open(path.join(target_dir, "codecs.ts"), "w") as f:
+        f.write(header)
+        f.write(RUNTIME)
+        f.write("\n")
+        for i, literal in enumerate(writer.regexes):
+            f.write(f"const $re{i} = {literal};\n")
+        f.write("\n")
+        f.write(body.getvalue())
+
+    vectors = 0
+    with open(path.join(target_dir, "codecs.test.ts"), "w") as f:
+        f.write(header)
+        f.write("// Checks the codecs against payloads encoded by the reference encoder of the\n")
+        f.write("// compiler, which writes the same bytes as the FieldArray of the driver.\n")
+        f.write("// Uses no platform APIs, so it runs wherever the codecs do:\n")
+        f.write("//   const { total, failures } = runCodecTests();\n")
+        f.write("import * as codecs from \"./codecs\";\n\n")
+        f.write(TEST_RUNTIME)
+        f.write("\nconst VECTORS: [string, (value: any) => Uint8Array, (data: Uint8Array) => any, any, string][] = [\n")
+        for codec in codecs:
+            for value, data in test_vectors(index, codec):
+                literal = writer.object(codec.fields, value)
+                f.write(f"\t[\"{codec.name}\", codecs.encode{codec.name}, codecs.decode{codec.name}, {literal}, \"{data.hex()}\"],\n")
+                vectors += 1
+        f.write("];\n\n")
+        f.write("export function runCodecTests() {\n")
+        f.write("\tconst failures: string[] = [];\n")
+        f.write("\tVECTORS.forEach(([name, encode, decode, value, hex], i) => {\n")
+        f.write("\t\tconst expected = $hex(hex);\n")
+        f.write("\t\ttry {\n")
+        f.write("\t\t\tconst actual = encode(value);\n")
+        f.write("\t\t\tif(!$equal(actual, expected))\n")
+        f.write("\t\t\t\tfailures.push(`${name} #${i}: encoded as ${$toHex(actual)}, expected ${hex}`);\n")
+        f.write("\t\t\tconst again = encode(decode(expected));\n")
+        f.write("\t\t\tif(!$equal(again, expected))\n")
+        f.write("\t\t\t\tfailures.push(`${name} #${i}: decoded and encoded again as ${$toHex(again)}`);\n")
+        f.write("\t\t} catch(ex) {\n")
+        f.write("\t\t\tfailures.push(`${name} #${i}: ${ex}`);\n")
+        f.write("\t\t}\n")
+        f.write("\t});\n")
+        f.write("\treturn { total: VECTORS.length, failures };\n")
+        f.write("}\n")
+    log.verbose(f"Generated {len(codecs)} codecs and {vectors} test vectors", "ts")
@@ -0,0 +1,305 @@
+import multiprocessing
+from time import time
+
+try: from re import _parser as sre_parse # Python 3.11+
+except ImportError: import sre_parse
+
+from .things import *
+from . import log
+from .exceptions import *
+from .index import ProjectIndex, field_sets_of
+
+# Detects Str[match: /.../] patterns prone to catastrophic backtracking. The
+# static analysis looks for three shapes:
+#   - nested quantifiers: a repetition within an outer repetition that can
+#     match the characters following it, e.g. /(a+)+/, /(\w+\s?)*/ or
+#     /(x+x+)+/
+#   - overlapping alternations: a repeated alternation with branches that can
+#     start with the same character, e.g. /(ab|a.)+/ or /(\d|x\d|.)*/; an
+#     empty branch starts with whatever follows the alternation, which is what
+#     sre_parse factors /(a|aa)+/ into: /(a(?:|a))+/
+#   - optional parts within a repetition that can match what follows them,
+#     e.g. /(aa?)+/, where the next iteration can take over the second 'a'
+# If BUDGET is set (in milliseconds), every pattern is additionally run
+# against generated adversarial inputs in a forked process, and the ones
+# that take longer than that are reported as errors. Platforms that can't
+# fork skip this, as starting a fresh interpreter would eat up the budget
+BUDGET = None
+
+# repetitions with an upper bound this large are treated as unbounded
+PUMP_THRESHOLD = 16
+# characters used to approximate character classes
+PROBES = [chr(c) for c in range(128)] + ["é", "а", "一", " ", "\U0001f600"]
+# number of times the repeated part is pumped in adversarial inputs; few for
+# exponential blowup and many for polynomial blowup
+PUMP_COUNTS = [24, 4096]
+SUFFIXES = ["\0", "!", " "]
+
+# (pattern, flags, budget) -> diagnostics without a location; kept across
+# runs so that the language server doesn't analyze the same patterns again
+RESULTS = {}
+
+REPEATS = (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT)
+GROUPS = (sre_parse.SUBPATTERN, sre_parse.ATOMIC_GROUP) if hasattr(sre_parse, "ATOMIC_GROUP") else (sre_parse.SUBPATTERN,)
+
+def group_body(op, av):
+    # subpattern of a (possibly atomic) group
+    return av[-1] if op == sre_parse.SUBPATTERN else av
+
+def is_pumpable(op, av) -> bool:
+    return op in REPEATS and (av[1] == sre_parse.MAXREPEAT or av[1] > PUMP_THRESHOLD)
+
+def char_matches(op, av, ch: str, ignore_case: bool) -> bool:
+    # whether a single-character item matches a character
+    variants = {ch, ch.lower(), ch.upper()} if ignore_case else {ch}
+    if op == sre_parse.LITERAL:
+        return any(ord(c) == av for c in variants)
+    if op == sre_parse.NOT_LITERAL:
+        return all(ord(c) != av for c in variants)
+    if op == sre_parse.ANY:
+        return ch != "\n"
+    if op == sre_parse.IN:
+        negate = bool(av) and av[0][0] == sre_parse.NEGATE
+        items = av[1:] if negate else av
+        return any(class_item_matches(o, a, c) for o, a in items for c in variants) != negate
+    return False
+
+def class_item_matches(op, av, ch: str) -> bool:
+    if op == sre_parse.LITERAL:
+        return ord(ch) == av
+    if op == sre_parse.RANGE:
+        return av[0] <= ord(ch) <= av[1]
+    if op == sre_parse.CATEGORY:
+        name = str(av).lower()
+        word = ch.isalnum() or ch == "_"
+        result = {"digit": ch.isdigit(), "space": ch.isspace(), "word": word}.get(name.split("_")[-1], False)
+        return not result if "_not_" in name else result
+    return False
+
+class Analyzer():
+    def __init__(self, pattern: re.Pattern):
+        self.ignore_case = bool(pattern.flags & re.I)
+
+    def nullable(self, p) -> bool:
+        # whether a subpattern can match the empty string
+        for op, av in p:
+            if op in REPEATS:
+                if av[0] > 0 and not self.nullable(av[2]):
+                    return False
+            elif op in GROUPS:
+                if not self.nullable(group_body(op, av)):
+                    return False
+            elif op == sre_parse.BRANCH:
+                if not any(self.nullable(b) for b in av[1]):
+                    return False
+            elif op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN):
+                return False
+        return True
+
+    def first(self, p) -> Set[str]:
+        # characters a match of the subpattern can start with
+        chars = set()
+        for op, av in p:
+            if op in REPEATS:
+                chars |= self.first(av[2])
+                if av[0] > 0 and not self.nullable(av[2]):
+                    return chars
+            elif op in GROUPS:
+                chars |= self.first(group_body(op, av))
+                if not self.nullable(group_body(op, av)):
+                    return chars
+            elif op == sre_parse.BRANCH:
+                for branch in av[1]:
+                    chars |= self.first(branch)
+                if not any(self.nullable(b) for b in av[1]):
+                    return chars
+            elif op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN):
+                return chars | {c for c in PROBES if char_matches(op, av, c, self.ignore_case)}
+        return chars
+
+    def follow(self, items, follow: Set[str]) -> Set[str]:
+        # characters that can come after a position, given the rest of the
+        # sequence and what can follow the sequence itself
+        chars = self.first(items)
+        return chars | follow if self.nullable(items) else chars
+
+    def ambiguous(self, p, follow: Set[str]) -> List[str]:
+        # looks for repetitions within the body of another repetition that can
+        # take over characters that could also start what follows them, and
+        # for alternations with branches starting with the same characters
+        hazards = []
+        items = list(p)
+        for i, (op, av) in enumerate(items):
+            after = self.follow(items[i + 1:], follow)
+            # skipping an optional part only makes a difference if something
+            # else is matched; the engine stops repetitions that match nothing
+            skippable = not (self.nullable(items[:i]) and self.nullable(items[i + 1:]))
+            if is_pumpable(op, av) and self.first(av[2]) & after:
+                hazards.append("nested quantifiers")
+            elif op in REPEATS:
+                if av[0] == 0 and skippable and self.first(av[2]) & after:
+                    hazards.append("an optional part that can also match what follows it")
+                hazards += self.ambiguous(av[2], after | self.first(av[2]))
+            elif op in GROUPS:
+                hazards += self.ambiguous(group_body(op, av), after)
+            elif op == sre_parse.BRANCH:
+                if self.overlapping(av[1], after if skippable else set()):
+                    hazards.append("a repeated alternation with overlapping branches")
+                for branch in av[1]:
+                    hazards += self.ambiguous(branch, after)
+        return hazards
+
+    def find_hazards(self, p) -> List[str]:
+        hazards = []
+        for op, av in p:
+            if op in REPEATS:
+                # the body of a repetition may be followed by its own start
+                if is_pumpable(op, av):
+                    hazards += self.ambiguous(av[2], self.first(av[2]))
+                hazards += self.find_hazards(av[2])
+            elif op in GROUPS:
+                hazards += self.find_hazards(group_body(op, av))
+            elif op == sre_parse.BRANCH:
+                for branch in av[1]:
+                    hazards += self.find_hazards(branch)
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                hazards += self.find_hazards(av[1])
+        return hazards
+
+    def overlapping(self, branches, follow: Set[str]) -> bool:
+        # empty branches start with what follows the alternation
+        seen = set()
+        for branch in branches:
+            chars = self.follow(branch, follow)
+            if seen & chars:
+                return True
+            seen |= chars
+        return False
+
+    def sample(self, p) -> str:
+        # a short string matched by the subpattern
+        result = ""
+        for op, av in p:
+            if op in REPEATS:
+                result += self.sample(av[2]) * av[0]
+            elif op in GROUPS:
+                result += self.sample(group_body(op, av))
+            elif op == sre_parse.BRANCH:
+                result += self.sample(av[1][0])
+            elif op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN):
+                result += next((c for c in PROBES if char_matches(op, av, c, self.ignore_case)), "")
+        return result
+
+    def pump(self, body) -> str:
+        # a non-empty string matched by one iteration of a repetition
+        return self.sample(body) or next(iter(sorted(self.first(body))), "")
+
+    def adversarial_inputs(self, p) -> List[str]:
+        # pumps every unbounded repetition after a prefix that leads to it and
+        # appends a character that's likely to make the match fail
+        inputs = []
+        def walk(p, prefix):
+            items = list(p)
+            for i, (op, av) in enumerate(items):
+                before = prefix + self.sample(items[:i])
+                if is_pumpable(op, av):
+                    pump = self.pump(av[2])
+                    if pump:
+                        inputs.extend(before + pump * n + s for n in PUMP_COUNTS for s in SUFFIXES)
+                    walk(av[2], before)
+                elif op in REPEATS:
+                    walk(av[2], before)
+                elif op in GROUPS:
+                    walk(group_body(op, av), before)
+                elif op == sre_parse.BRANCH:
+                    for branch in av[1]:
+                        walk(branch, before)
+        walk(p, "")
+        return inputs
+
+def parse(pattern: re.Pattern):
+    return sre_parse.parse(pattern.pattern, pattern.flags)
+
+def static_hazards(pattern: re.Pattern) -> List[str]:
+    try:
+        return list(dict.fromkeys(Analyzer(pattern).find_hazards(parse(pattern))))
+    except Exception as ex:
+        log.verbose(f"Could not analyze /{pattern.pattern}/: {ex}", "redos")
+        return []
+
+def can_benchmark() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+def search(pattern: re.Pattern, text: str):
+    pattern.search(text)
+
+def benchmark(pattern: re.Pattern, budget: float) -> Tuple[str, float]:
+    # runs the pattern against adversarial inputs; returns the first input
+    # that took longer than the budget (in seconds) along with the time it
+    # took, or None
+    try:
+        inputs = Analyzer(pattern).adversarial_inputs(parse(pattern))
+    except Exception as ex:
+        log.verbose(f"Could not analyze /{pattern.pattern}/: {ex}", "redos")
+        return None
+
+    if not can_benchmark():
+        return None
+    context = multiprocessing.get_context("fork")
+    for text in inputs:
+        # the regex engine can't be interrupted, so run it in a process that
+        # can be killed
+        start = time()
+        process = context.Process(target=search, args=(pattern, text))
+        process.start()
+        process.join(budget)
+        took = time() - start
+        if process.is_alive():
+            process.terminate()
+            process.join()
+            return text, took
+    return None
+
+def run(index: ProjectIndex) -> List[Diagnostic]:
+    diag = []
+    seen = set()
+    for thing in index.things:
+        for fields in field_sets_of(thing):
+            for field in fields:
+                for validator in match_validators(field.type_):
+                    # generated methods share types with their entities
+                    if id(validator) in seen:
+                        continue
+                    seen.add(id(validator))
+                    pattern = validator.restriction
+                    key = (pattern.pattern, pattern.flags, BUDGET)
+                    if key not in RESULTS:
+                        RESULTS[key] = check(pattern)
+                    diag += [Diagnostic([validator.location], level, code, message)
+                        for level, code, message in RESULTS[key]]
+    return diag
+
+def match_validators(type_: SusTypeBase) -> List[SusValidator]:
+    if not isinstance(type_, SusType):
+        return []
+    found = [v for v in type_.validators if v.param == "match" and isinstance(v.restriction, re.Pattern)]
+    for arg in type_.args:
+        found += match_validators(arg)
+    return found
+
+def check(pattern: re.Pattern) -> List[Tuple[DiagLevel, int, str]]:
+    results = []
+    hazards = static_hazards(pattern)
+    if hazards:
+        results.append((DiagLevel.WARN, 24,
+            f"Regular expression may backtrack catastrophically: it contains {' and '.join(hazards)}"))
+
+    if BUDGET is not None:
+        log.verbose(f"Benchmarking /{pattern.pattern}/", "redos")
+        slow = benchmark(pattern, BUDGET / 1000)
+        if slow is not None:
+            text, took = slow
+            results.append((DiagLevel.ERROR, 25,
+                f"Regular expression took more than {BUDGET}ms to match an input of {len(text)} characters\n" +\
+                f"Note: the input was {repr(text[:40])}{'...' if len(text) > 40 else ''}"))
+    return results
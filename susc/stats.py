@@ -0,0 +1,128 @@
+from time import perf_counter
+
+from .things import *
+from .index import ProjectIndex, field_sets_of
+
+# Statistics about a compiled project: time spent in every phase, sizes and
+# how much of every numeric value space is taken. Used by `susc --stats` to
+# track schema growth against the hard limits of the protocol.
+
+# number of values in every value space
+ENTITY_VALUES = 128
+METHOD_VALUES = 128 # static methods are at +128 in the TS backend
+CONFIRMATION_VALUES = 16
+OPT_VALUES = 256
+
+def add_time(timings: Dict[str, float], phase: str, start: float):
+    # adds the time since `start` (from perf_counter()) to a phase
+    timings[phase] = timings.get(phase, 0) + perf_counter() - start
+
+def usage(values: Iterable[int], capacity: int) -> dict:
+    values = set(values)
+    return {"used": len(values), "capacity": capacity, "max": max(values, default=None),
+        "utilization": round(len(values) / capacity, 4)}
+
+class DepthCounter():
+    # depth of types, following compounds and entities; a type referring to
+    # a structure that's already being expanded doesn't count further
+    def __init__(self, index: ProjectIndex):
+        self.index = index
+        self.depths: Dict[str, int] = {}
+        self.expanding: Set[str] = set()
+
+    def type_depth(self, type_: SusTypeBase) -> int:
+        if not isinstance(type_, SusType):
+            return 0
+        depth = max((self.type_depth(a) for a in type_.args), default=0)
+        thing = self.index.find(type_.name, SusCompound, SusEntity)
+        if thing is not None:
+            depth = max(depth, self.thing_depth(thing))
+        return 1 + depth
+
+    def thing_depth(self, thing: SusThing) -> int:
+        if thing.name in self.depths:
+            return self.depths[thing.name]
+        if thing.name in self.expanding:
+            return 0
+        self.expanding.add(thing.name)
+        depth = max((self.type_depth(f.type_) for f in thing.fields), default=0)
+        self.expanding.discard(thing.name)
+        self.depths[thing.name] = depth
+        return depth
+
+def all_types(type_: SusTypeBase) -> List[SusType]:
+    if not isinstance(type_, SusType):
+        return []
+    return [type_] + [t for a in type_.args for t in all_types(a)]
+
+def collect(index: ProjectIndex, timings: Dict[str, float]) -> dict:
+    entities = index.of_kind(SusEntity)
+    global_methods = index.of_kind(SusMethod)
+    confirmations = index.of_kind(SusConfirmation)
+    enums = index.of_kind(SusEnum)
+    bitfields = index.of_kind(SusBitfield)
+
+    fields = [f for t in index.things for s in field_sets_of(t) for f in s]
+    types = {type_key(t) for f in fields for t in all_types(f.type_)}
+    counter = DepthCounter(index)
+    deepest = max(fields, key=lambda f: counter.type_depth(f.type_), default=None)
+
+    opt_sets = [[f.optional for f in s if f.optional is not None] for t in index.things for s in field_sets_of(t)]
+    fullest_opt = max(opt_sets, key=len, default=[])
+
+    return {
+        "timings_ms": {phase: round(t * 1000, 2) for phase, t in timings.items()},
+        "counts": {
+            "things": len(index.things),
+            "entities": len(entities),
+            "global_methods": len(global_methods),
+            "entity_methods": sum(len(e.methods) for e in entities),
+            "confirmations": len(confirmations),
+            "compounds": len(index.of_kind(SusCompound)),
+            "enums": len(enums),
+            "bitfields": len(bitfields),
+            "fields": len(fields),
+            "distinct_types": len(types),
+        },
+        "max_type_depth": {
+            "depth": counter.type_depth(deepest.type_) if deepest else 0,
+            "field": deepest.name if deepest else None,
+            "location": f"{deepest.location.file.path}:{deepest.location.line}" if deepest else None,
+        },
+        "value_spaces": {
+            "entities": usage((e.value for e in entities), ENTITY_VALUES),
+            "global_methods": usage((m.value for m in global_methods), METHOD_VALUES),
+            "entity_methods": {e.name: {
+                "static": usage((m.value for m in e.methods if m.static), METHOD_VALUES),
+                "dynamic": usage((m.value for m in e.methods if not m.static), METHOD_VALUES),
+            } for e in entities},
+            "confirmations": usage((c.value for c in confirmations), CONFIRMATION_VALUES),
+            "enums": {e.name: usage((m.value for m in e.members), 256 ** e.size) for e in enums},
+            "bitfields": {b.name: usage((m.value for m in b.members), b.size * 8) for b in bitfields},
+            "opt_fullest": usage(fullest_opt, OPT_VALUES),
+        },
+    }
+
+def format_usage(name: str, u: dict) -> str:
+    return f"{name}: {u['used']}/{u['capacity']} ({u['utilization'] * 100:.1f}%), max value {u['max']}"
+
+def format_report(stats: dict) -> List[str]:
+    lines = []
+    lines.append("Timings: " + ", ".join(f"{p} {t:.1f}ms" for p, t in stats["timings_ms"].items()))
+    lines.append("Counts: " + ", ".join(f"{n.replace('_', ' ')} {c}" for n, c in stats["counts"].items()))
+    depth = stats["max_type_depth"]
+    lines.append(f"Deepest type: {depth['depth']} levels (field '{depth['field']}' at {depth['location']})")
+
+    spaces = stats["value_spaces"]
+    lines.append(format_usage("Entity values", spaces["entities"]))
+    lines.append(format_usage("Global method values", spaces["global_methods"]))
+    for entity, methods in spaces["entity_methods"].items():
+        lines.append(format_usage(f"{entity} static method values", methods["static"]))
+        lines.append(format_usage(f"{entity} method values", methods["dynamic"]))
+    lines.append(format_usage("Confirmation values", spaces["confirmations"]))
+    for name, u in spaces["enums"].items():
+        lines.append(format_usage(f"{name} members", u))
+    for name, u in spaces["bitfields"].items():
+        lines.append(format_usage(f"{name} bits", u))
+    lines.append(format_usage("opt() values of the fullest structure", spaces["opt_fullest"]))
+    return lines
@@ -1,5 +1,5 @@
 from abc import ABC
-from dataclasses import dataclass
+from dataclasses import dataclass, field as dc_field
 from os import times
 from typing import *
 from enum import Enum
@@ -31,60 +31,107 @@ class SusType(SusTypeBase):
     args: List[Any]
     validators: List[SusValidator]
     def find_errors(self, identifiers):
-        if self.name == "Int":
-            if len(self.args) != 1:
-                return "Int requires one argument"
-            if not isinstance(self.args[0], int) or self.args[0] <= 0:
-                return "Argument to Int should be a positive integer"
-            for v in self.validators:
-                if v.param != "val":
-                    return "The following validators are valid for Int: 'val'"
-                if not isinstance(v.restriction, range):
-                    return "Int[val] must be a range"
-        elif self.name == "Str":
-            if len(self.args) != 0:
-                return "Str takes no arguments"
-            for v in self.validators:
-                if v.param not in ["len", "match"]:
-                    return "The following validators are valid for Str: 'len', 'match'"
-                if v.param == "len" and not isinstance(v.restriction, range):
-                    return "Str[len] must be a range"
-                if v.param == "match" and not isinstance(v.restriction, re.Pattern):
-                    return "Str[match] must be a regular expression"
-        elif self.name == "List":
-            if len(self.args) != 2:
-                return "List takes two arguments"
-            if not isinstance(self.args[0], SusTypeBase):
-                return "First argument to List should be a type"
-            err = self.args[0].find_errors(identifiers)
-            if err is not None: return err
-            if not isinstance(self.args[1], int) or self.args[1] <= 0:
-                return "Second argument to List should be a positive integer"
-            for v in self.validators:
-                if v.param != "len":
-                    return "The following validators are valid for List: 'len'"
-                if not isinstance(v.restriction, range):
-                    return "List[len] must be a range"
-        elif self.name == "Bool":
-            if len(self.args) != 0:
-                return "Bool takes no arguments"
-            if len(self.validators) != 0:
-                return "Bool can't be validated"
-        elif self.name == "Bin":
-            if len(self.args) != 0:
-                return "Bin takes no arguments"
-            for v in self.validators:
-                if v.param != "len":
-                    return "The following validators are valid for Bin: 'len'"
-                if not isinstance(v.restriction, range):
-                    return "Bin[len] must be a range"
-        elif self.name not in identifiers:
-            return f"Unknown type '{self.name}'"
-        else:
-            if len(self.args):
-                return f"{self.name} takes no arguments"
-            if len(self.validators):
-                return f"{self.name} can't be validated"
+        if not isinstance(identifiers, TypeChecker):
+            identifiers = TypeChecker(identifiers)
+        return identifiers.find_errors(self)
+
+@dataclass
+class BuiltinType():
+    name: str
+    args: List[str] # "type" or "size" for each argument
+    validators: Dict[str, type] # validator name -> restriction type
+    docstring: str
+
+BUILTIN_TYPES = {t.name: t for t in [
+    BuiltinType("Int", ["size"], {"val": range},
+        "Fixed-width integer. The argument is its size in bytes"),
+    BuiltinType("VarInt", ["size"], {"val": range},
+        "Variable-length integer, 7 bits per byte. The argument is the size in bytes of the largest value it holds"),
+    BuiltinType("Str", [], {"len": range, "match": re.Pattern},
+        "UTF-8 string"),
+    BuiltinType("List", ["type", "size"], {"len": range},
+        "List of values. The arguments are the element type and the size of the length prefix in bytes"),
+    BuiltinType("Array", ["type", "size"], {},
+        "Fixed number of values without a length prefix. The arguments are the element type and the number of elements"),
+    BuiltinType("Bool", [], {},
+        "Boolean value"),
+    BuiltinType("Bin", [], {"len": range},
+        "Arbitrary binary data"),
+]}
+
+# longest cursor a streaming method may return
+STREAM_CURSOR_LEN = 64
+
+# dynamic methods generated for entities with a `subscribe` directive
+SUBSCRIPTION_METHODS = {"subscribe": 125, "unsubscribe": 124}
+# methods generated for every entity with an 'id' field, and for entities with a
+# `generate` directive: static or not, value
+STANDARD_METHODS = {"get": (True, 127), "update": (False, 127)}
+GENERATED_METHODS = {"get_many": (True, 126), "patch": (False, 126), "get_fields": (True, 125)}
+
+ARG_COUNTS = ["no arguments", "one argument", "two arguments", "three arguments"]
+ARG_ORDINALS = ["First", "Second", "Third"]
+ARG_KINDS = {"type": "a type", "size": "a positive integer"}
+RESTRICTION_KINDS = {range: "a range", re.Pattern: "a regular expression"}
+
+def type_key(type_: Any) -> Hashable:
+    # structural key that is equal for types that check the same
+    if isinstance(type_, SusType):
+        return (type_.name,
+            tuple(type_key(a) for a in type_.args),
+            tuple((v.param, type(v.restriction)) for v in type_.validators))
+    if isinstance(type_, int):
+        return type_
+    return id(type_)
+
+class TypeChecker():
+    # checks type instantiations against the builtin type table and a set of
+    # known identifiers, remembering the result for every distinct type
+    def __init__(self, identifiers: Iterable[str]):
+        self.identifiers = identifiers if isinstance(identifiers, (set, frozenset)) else set(identifiers)
+        self.cache: Dict[Hashable, str] = {}
+
+    def find_errors(self, type_: SusTypeBase) -> str:
+        if not isinstance(type_, SusType):
+            return type_.find_errors(self)
+        key = type_key(type_)
+        if key not in self.cache:
+            self.cache[key] = self.check(type_)
+        return self.cache[key]
+
+    def check(self, type_: SusType) -> str:
+        builtin = BUILTIN_TYPES.get(type_.name)
+        if builtin is None:
+            if type_.name not in self.identifiers:
+                return f"Unknown type '{type_.name}'"
+            if len(type_.args):
+                return f"{type_.name} takes no arguments"
+            if len(type_.validators):
+                return f"{type_.name} can't be validated"
+            return None
+
+        if len(type_.args) != len(builtin.args):
+            return f"{type_.name} takes {ARG_COUNTS[len(builtin.args)]}"
+        for i, (arg, kind) in enumerate(zip(type_.args, builtin.args)):
+            ordinal = "Argument" if len(builtin.args) == 1 else f"{ARG_ORDINALS[i]} argument"
+            if kind == "type":
+                if not isinstance(arg, SusTypeBase):
+                    return f"{ordinal} to {type_.name} should be {ARG_KINDS[kind]}"
+                err = self.find_errors(arg)
+                if err is not None: return err
+            elif kind == "size":
+                if not isinstance(arg, int) or arg <= 0:
+                    return f"{ordinal} to {type_.name} should be {ARG_KINDS[kind]}"
+
+        for v in type_.validators:
+            if not builtin.validators:
+                return f"{type_.name} can't be validated"
+            if v.param not in builtin.validators:
+                valid = ", ".join(f"'{n}'" for n in builtin.validators)
+                return f"The following validators are valid for {type_.name}: {valid}"
+            restriction = builtin.validators[v.param]
+            if not isinstance(v.restriction, restriction):
+                return f"{type_.name}[{v.param}] must be {RESTRICTION_KINDS[restriction]}"
 
 @dataclass
 class SusCompoundMember(SusThing):
@@ -123,6 +170,21 @@ class SusField(SusThing):
     type_: SusType
     optional: int
 
+@dataclass
+class SusCache(SusThing):
+    mode: str # "hard": expired entries are fetched again before being returned
+              # "soft": expired entries are returned and refreshed in the background
+    ttl: int # milliseconds
+
+@dataclass
+class SusCompression(SusThing):
+    mode: str # "none" or "deflate"
+    threshold: int # payloads shorter than this many bytes are sent as they are
+
+@dataclass
+class SusSubscription(SusThing):
+    interval: int # milliseconds; changes within it are sent together, 0 sends every one
+
 @dataclass
 class SusMethod(SusThing):
     static: bool
@@ -133,6 +195,9 @@ class SusMethod(SusThing):
     errors: List[str]
     confirmations: List[str]
     rate_limit: Tuple[int, int]
+    cache: SusCache = None
+    stream: bool = False # returns are sent in chunks, see convert_method()
+    compression: SusCompression = None
 
 @dataclass
 class SusEntity(SusThing):
@@ -140,6 +205,10 @@ class SusEntity(SusThing):
     value: int
     fields: List[SusField]
     methods: List[SusMethod]
+    cache: SusCache = None
+    compression: SusCompression = None
+    subscription: SusSubscription = None
+    generated: List[str] = dc_field(default_factory=list) # methods named by `generate` directives
 
 @dataclass
 class SusConfirmation(SusThing):
@@ -214,7 +283,7 @@ def convert_type(ast, file):
             elif isinstance(val_val, Tree) and val_val.data == "range":
                 max_val = 2 ** 64
                 # we can infer the maximum value from the int length
-                if name == "Int" and len(args) == 1 and isinstance(args[0], int):
+                if name in ("Int", "VarInt") and len(args) == 1 and isinstance(args[0], int):
                     max_val = 2 ** (args[0] * 8)
                 val_val = convert_range(val_val, max_val)
             validators.append(SusValidator(Location(file, val_name.line, val_name.column, len(val_name.value)), None,
@@ -262,6 +331,32 @@ def convert_timeout(val):
         "y":  356 * 24 * 3600 * 1000,
     }[mul]
 
+def convert_cache(ast, file):
+    mode, ttl = ast.children
+    return SusCache(Location(file, mode.line, mode.column, len(mode.value)), None,
+        mode.value, convert_timeout(ttl.value))
+
+def convert_compression(ast, file):
+    mode, threshold = ast.children
+    return SusCompression(Location(file, mode.line, mode.column, len(mode.value)), None,
+        mode.value, int(threshold.value) if threshold else 0)
+
+def convert_subscription(ast, file):
+    interval = ast.children[0]
+    location = Location(file, ast.meta.line, ast.meta.column, len("subscribe"))
+    return SusSubscription(location, None, convert_timeout(interval.value) if interval else 0)
+
+def stream_cursors(location: Location, params: List[SusField], returns: List[SusField]) -> Tuple[SusField, SusField]:
+    # streaming methods are called repeatedly, once for every chunk of their
+    # return values; every chunk but the last one comes with an opaque cursor
+    # that the next call passes back to get the next chunk
+    def cursor(fields, doc):
+        opt = max((f.optional for f in fields if f.optional is not None), default=-1) + 1
+        type_ = SusType(location, None, "Bin", [], [SusValidator(location, None, "len", range(1, STREAM_CURSOR_LEN + 1))])
+        return SusField(location, doc, "cursor", type_, opt)
+    return (cursor(params, "Cursor returned with the previous chunk; absent when getting the first one"),
+        cursor(returns, "Cursor to get the next chunk with; absent in the last chunk"))
+
 def convert_method(ast, file):
     static = None
     if ast.data == "static_method": static = True
@@ -271,13 +366,15 @@ def convert_method(ast, file):
     name = ast.children[1]
     value = int(ast.children[2].value)
 
-    params, returns, errors, confirmations, states, rate_limit = [], [], [], [], [], None
+    params, returns, errors, confirmations, states, rate_limit, cache = [], [], [], [], [], None, None
+    stream, compression = None, None
     for directive in ast.children[3:]:
         if not directive: continue
         if directive.data == "method_param":
             params.append(convert_param(directive, file))
         elif directive.data == "returns":
-            for p in directive.children:
+            stream = directive.children[0]
+            for p in directive.children[1:]:
                 returns.append(convert_param(p, file))
         elif directive.data in ["errors", "confirmations"]:
             lst = {"errors": errors, "confirmations": confirmations}[directive.data]
@@ -291,9 +388,19 @@ def convert_method(ast, file):
             amount = int(directive.children[0].value)
             window = convert_timeout(directive.children[1].value)
             rate_limit = (amount, window)
+        elif directive.data == "cache":
+            cache = convert_cache(directive, file)
+        elif directive.data == "compress":
+            compression = convert_compression(directive, file)
+
+    if stream is not None:
+        param_cursor, return_cursor = stream_cursors(Location(file, stream.line, stream.column, len(stream.value)),
+            params, returns)
+        params.append(param_cursor)
+        returns.append(return_cursor)
 
     return SusMethod(Location(file, name.line, name.column, len(name.value)), doc, static, name.value,
-        value, params, returns, errors, confirmations, rate_limit)
+        value, params, returns, errors, confirmations, rate_limit, cache, stream is not None, compression)
 
 def convert_ast(ast, file):
     if ast.data in ["enum", "bitfield"]:
@@ -310,7 +417,7 @@ def convert_ast(ast, file):
         value = ast.children[2]
 
         directives = ast.children[3:]
-        fields, methods = [], []
+        fields, methods, cache, compression, subscription, generated = [], [], None, None, None, []
         for directive in directives:
             if directive.data == "entity_field":
                 f_doc = convert_docstring(directive.children[0])
@@ -324,8 +431,20 @@ def convert_ast(ast, file):
             if directive.data.endswith("method"):
                 methods.append(convert_method(directive, file))
 
+            if directive.data == "cache":
+                cache = convert_cache(directive, file)
+
+            if directive.data == "compress":
+                compression = convert_compression(directive, file)
+
+            if directive.data == "subscribe":
+                subscription = convert_subscription(directive, file)
+
+            if directive.data == "generate":
+                generated += [t.value for t in directive.children if t.value not in generated]
+
         return SusEntity(Location(file, name.line, name.column, len(name.value)), doc,
-            name.value, int(value.value), fields, methods)
+            name.value, int(value.value), fields, methods, cache, compression, subscription, generated)
 
     elif ast.data == "global_method":
         return convert_method(ast, file)
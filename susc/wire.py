@@ -0,0 +1,270 @@
+from .things import *
+from .index import ProjectIndex
+
+# The SpeedAPI encoding as the compiler models it:
+#   - Int(n) and enums/bitfields of size n take n bytes
+#   - VarInt(n) takes 7 bits of the value per byte, the top bit of each byte
+#     telling whether another one follows (see varint_length())
+#   - Bool takes one byte
+#   - Str and Bin are prefixed by their length in bytes (STR_PREFIX and
+#     BIN_PREFIX bytes wide); Str[len] limits the number of characters, each
+#     of which takes up to 4 bytes of UTF-8
+#   - List(T, n) is prefixed by an n-byte element count
+#   - Array(T, n) is n elements without a prefix
+#   - entities are prefixed by their one-byte value
+#   - field arrays are the required fields in order, followed by a one-byte
+#     count of optional fields present if there are any optional fields at
+#     all, followed by a one-byte opt() value and the value of every one of
+#     them, in the order of their opt() values
+# Transport framing (transaction and method identifiers) is not included
+STR_PREFIX = 2
+BIN_PREFIX = 4
+ENTITY_PREFIX = 1
+OPT_COUNT = 1
+OPT_ID = 1
+
+# assumptions for the "typical" size when the schema doesn't bound a length
+TYPICAL_STR_LEN = 16 # characters, one byte each
+TYPICAL_BIN_LEN = 64
+TYPICAL_LIST_LEN = 4
+TYPICAL_OPT_PRESENCE = 0.5 # share of optional fields present
+TYPICAL_VARINT_LEN = 2 # values below 16384
+
+UNBOUNDED = 2 ** 64 # ranges with "a+" validators end here or further
+
+@dataclass
+class WireSize():
+    min: int
+    max: Optional[int] # None if unbounded
+    typical: float
+
+    def __add__(self, other: "WireSize") -> "WireSize":
+        return WireSize(self.min + other.min,
+            None if self.max is None or other.max is None else self.max + other.max,
+            self.typical + other.typical)
+
+    def repeat(self, min_times: int, max_times: Optional[int], typical_times: float) -> "WireSize":
+        maximum = None
+        if max_times is not None and self.max is not None:
+            maximum = self.max * max_times
+        if max_times == 0:
+            maximum = 0
+        return WireSize(self.min * min_times, maximum, self.typical * typical_times)
+
+    def to_json(self) -> dict:
+        return {"min": self.min, "max": self.max, "typical": round(self.typical)}
+
+def fixed(size: int) -> WireSize:
+    return WireSize(size, size, size)
+
+def varint_length(value: int) -> int:
+    # number of bytes a VarInt takes to encode a value
+    return max(1, (value.bit_length() + 6) // 7)
+
+def varint_bounds(type_: SusType) -> WireSize:
+    # the `val` validator limits the encoded length further than the size does
+    high = 256 ** type_.args[0] - 1
+    low = 0
+    for v in type_.validators:
+        if v.param == "val" and isinstance(v.restriction, range) and len(v.restriction):
+            low, high = max(v.restriction[0], 0), min(v.restriction[-1], high)
+    return WireSize(varint_length(low), varint_length(high),
+        min(max(TYPICAL_VARINT_LEN, varint_length(low)), varint_length(high)))
+
+def length_bounds(type_: SusType, typical: int) -> Tuple[int, Optional[int], float]:
+    # minimum, maximum and typical length allowed by the `len` validator
+    for v in type_.validators:
+        if v.param == "len" and isinstance(v.restriction, range) and len(v.restriction):
+            low, high = v.restriction[0], v.restriction[-1]
+            if v.restriction.stop >= UNBOUNDED:
+                return low, None, max(low, typical)
+            return low, high, (low + high) / 2
+    return 0, None, typical
+
+class SizeAnalyzer():
+    # computes wire sizes of types and field arrays, remembering the size of
+    # every named thing
+    def __init__(self, index: ProjectIndex):
+        self.index = index
+        self.named: Dict[str, WireSize] = {}
+        self.expanding: Set[str] = set()
+
+    def type_size(self, type_: SusType) -> WireSize:
+        name = type_.name
+        if name in ("Int", "BigInteger"):
+            return fixed(type_.args[0])
+        if name == "VarInt":
+            return varint_bounds(type_)
+        if name == "Bool":
+            return fixed(1)
+        if name == "Str":
+            low, high, typical = length_bounds(type_, TYPICAL_STR_LEN)
+            return fixed(STR_PREFIX) + WireSize(low, None if high is None else high * 4, typical)
+        if name == "Bin":
+            low, high, typical = length_bounds(type_, TYPICAL_BIN_LEN)
+            return fixed(BIN_PREFIX) + WireSize(low, high, typical)
+        if name == "List":
+            low, high, typical = length_bounds(type_, TYPICAL_LIST_LEN)
+            return fixed(type_.args[1]) + self.type_size(type_.args[0]).repeat(low, high, typical)
+        if name == "Array":
+            count = type_.args[1]
+            return self.type_size(type_.args[0]).repeat(count, count, count)
+        if name == "Entity":
+            sizes = [self.named_size(e) for e in self.index.of_kind(SusEntity)]
+            if not sizes:
+                return fixed(ENTITY_PREFIX)
+            return WireSize(min(s.min for s in sizes),
+                None if any(s.max is None for s in sizes) else max(s.max for s in sizes),
+                sum(s.typical for s in sizes) / len(sizes))
+        thing = self.index.find(name)
+        if thing is None:
+            return fixed(0)
+        return self.named_size(thing)
+
+    def named_size(self, thing: SusThing) -> WireSize:
+        if thing.name in self.named:
+            return self.named[thing.name]
+        # recursive structures can nest indefinitely
+        if thing.name in self.expanding:
+            return WireSize(0, None, 0)
+
+        self.expanding.add(thing.name)
+        if isinstance(thing, (SusEnum, SusBitfield)):
+            size = fixed(thing.size)
+        elif isinstance(thing, SusEntity):
+            size = fixed(ENTITY_PREFIX) + self.fields_size(thing.fields)
+        elif isinstance(thing, SusCompound):
+            size = self.fields_size(thing.fields)
+        else:
+            size = fixed(0)
+        self.expanding.discard(thing.name)
+
+        self.named[thing.name] = size
+        return size
+
+    def fields_size(self, fields: List[SusField]) -> WireSize:
+        size = fixed(0)
+        optional = [f for f in fields if f.optional is not None]
+        for field in fields:
+            if field.optional is None:
+                size += self.type_size(field.type_)
+        if optional:
+            size += fixed(OPT_COUNT)
+        for field in optional:
+            value = fixed(OPT_ID) + self.type_size(field.type_)
+            size += WireSize(0, value.max, value.typical * TYPICAL_OPT_PRESENCE)
+        return size
+
+    def method_sizes(self, method: SusMethod, entity: SusEntity=None) -> Tuple[WireSize, WireSize]:
+        # dynamic methods also carry the ID of the entity they're invoked on
+        request = self.fields_size(method.parameters)
+        if entity is not None and not method.static:
+            id_field = self.index.id_field(entity.name)
+            if id_field is not None:
+                request = self.type_size(id_field.type_) + request
+        return request, self.fields_size(method.returns)
+
+def analyze(index: ProjectIndex) -> List[dict]:
+    # sizes of every message that can be sent: entities, method requests and
+    # returns, and confirmation requests and responses
+    analyzer = SizeAnalyzer(index)
+    rows = []
+    def row(kind, name, part, size):
+        rows.append({"kind": kind, "name": name, "part": part, **size.to_json()})
+
+    for entity in index.of_kind(SusEntity):
+        row("entity", entity.name, "entity", analyzer.named_size(entity))
+    for method in index.of_kind(SusMethod):
+        request, returns = analyzer.method_sizes(method)
+        row("global method", method.name, "request", request)
+        row("global method", method.name, "returns", returns)
+    for entity in index.of_kind(SusEntity):
+        for method in entity.methods:
+            request, returns = analyzer.method_sizes(method, entity)
+            kind = "static method" if method.static else "method"
+            row(kind, f"{entity.name}.{method.name}", "request", request)
+            row(kind, f"{entity.name}.{method.name}", "returns", returns)
+    for conf in index.of_kind(SusConfirmation):
+        row("confirmation", conf.name, "request", analyzer.fields_size(conf.req_parameters))
+        row("confirmation", conf.name, "response", analyzer.fields_size(conf.resp_parameters))
+    return rows
+
+def encode_varint(value: int) -> bytes:
+    result = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        result.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(result)
+
+class Encoder():
+    # a reference implementation of the encoding described at the top of this
+    # file, byte for byte what the FieldArray of the driver writes. Values are
+    # Python objects: ints, bools, strs, bytes, lists, and dicts of field
+    # values for compounds and entities. Values of the `Entity` type name
+    # their entity in the "$entity" key. With `validate`, values that don't
+    # pass their validators raise a ValueError
+    def __init__(self, index: ProjectIndex, validate: bool=False):
+        self.index = index
+        self.validate = validate
+
+    def check(self, type_: SusType, value: Any):
+        for v in type_.validators:
+            if v.param == "val" and value not in v.restriction:
+                raise ValueError(f"{value} is out of range for {type_.name}")
+            if v.param == "len" and len(value) not in v.restriction:
+                raise ValueError(f"Length {len(value)} is out of range for {type_.name}")
+            if v.param == "match" and not v.restriction.search(value):
+                raise ValueError(f"'{value}' doesn't match /{v.restriction.pattern}/")
+
+    def encode(self, type_: SusType, value: Any) -> bytes:
+        name = type_.name
+        if self.validate:
+            self.check(type_, value)
+        if name in ("Int", "BigInteger"):
+            return value.to_bytes(type_.args[0], "big")
+        if name == "VarInt":
+            return encode_varint(value)
+        if name == "Bool":
+            return b"\1" if value else b"\0"
+        if name == "Str":
+            data = value.encode("utf8")
+            return len(data).to_bytes(STR_PREFIX, "big") + data
+        if name == "Bin":
+            return len(value).to_bytes(BIN_PREFIX, "big") + value
+        if name == "List":
+            return len(value).to_bytes(type_.args[1], "big") + \
+                b"".join(self.encode(type_.args[0], v) for v in value)
+        if name == "Array":
+            if len(value) != type_.args[1]:
+                raise ValueError(f"Array of {type_.args[1]} elements can't hold {len(value)}")
+            return b"".join(self.encode(type_.args[0], v) for v in value)
+        if name == "Entity":
+            return self.encode_named(self.index.find(value["$entity"], SusEntity), value)
+        thing = self.index.find(name)
+        if thing is None:
+            raise ValueError(f"Unknown type '{name}'")
+        return self.encode_named(thing, value)
+
+    def encode_named(self, thing: SusThing, value: Any) -> bytes:
+        if isinstance(thing, (SusEnum, SusBitfield)):
+            return value.to_bytes(thing.size, "big")
+        if isinstance(thing, SusEntity):
+            return thing.value.to_bytes(ENTITY_PREFIX, "big") + self.encode_fields(thing.fields, value)
+        return self.encode_fields(thing.fields, value)
+
+    def encode_fields(self, fields: List[SusField], values: Dict[str, Any]) -> bytes:
+        # optional fields that are missing from `values` or None are absent
+        result = b""
+        for field in fields:
+            if field.optional is None:
+                result += self.encode(field.type_, values[field.name])
+
+        optional = sorted((f for f in fields if f.optional is not None), key=lambda f: f.optional)
+        present = [f for f in optional if values.get(f.name) is not None]
+        if optional:
+            result += len(present).to_bytes(OPT_COUNT, "big")
+        for field in present:
+            result += field.optional.to_bytes(OPT_ID, "big") + self.encode(field.type_, values[field.name])
+        return result